@@ -4,15 +4,26 @@ import bpy
 import os
 import math
 import random
-import uuid
+import sys
+import numpy as np
 from mathutils import Vector
-from bpy_extras.object_utils import world_to_camera_view
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from labeling import mesh_vertices, bound_box_corners, camera_view_matrix, spin_world_matrices, frame_boxes, index_boxes
+from geometry_cache import hull_index
+from manifest import Manifest, file_hash, unit_key, source_tag, temp_path, commit_file, write_text_atomic
+from render_farm import plan_tasks, task_seed, apply_config_overrides, apply_render_settings, list_blend_files, class_of
+from metrics import Metrics
+from mesh_library import load_meshes, unload_meshes, clear_meshes, source_name
+from viewpoints import camera_directions
+from index_pass import enable_index_pass, read_index_pass
+from quality import TIERS, render_gated, label_region
 
 # CONFIG
 BLEND_DIR = "path/to/blend/files"
 OUTPUT_DIR = r"path/to/output/dir" 
-CLASS_NAME = 'propeller'
-CLASS_ID = 0
+# Class name -> YOLO id. Files in BLEND_DIR/<class name>/ get that class, files directly in BLEND_DIR the first
+CLASS_MAP = {'propeller': 0}
 IMG_SIZE = 512
 TRAIN_RATIO = 0.8
 FRAMES_PER_MODEL = 40
@@ -20,21 +31,47 @@ TOTAL_ROTATION = 360
 ROTATION_SPEEDS = [0.5, 1.0, 1.5, 2.0]
 ROTATION_AXES = ['X', 'Y', 'Z']
 RANDOM_CAMERA_POSITIONS = True
+# How RANDOM_CAMERA_POSITIONS spreads cameras over objects: 'random', 'fibonacci', 'stratified' or 'sobol'
+VIEW_SAMPLER = 'random'
 MULTI_ENVIRONMENT = True
-USE_BOUNDING_BOX = True
+# 'bound_box': 8 bound_box corners (fast, loose); 'vertices': every vertex inside the frame (slow);
+# 'hull': convex-hull vertices cached per mesh, box clipped to the frame (fast; unlike 'vertices' it
+# reaches the frame edge for objects crossing it);
+# 'index': pixel-exact, occlusion-aware boxes from the object-index pass (Cycles; frames pre-checked with the hull)
+LABEL_MODE = 'bound_box'
+MIN_BOX_SIZE = 0.05  # Frames whose box is smaller than this are skipped before rendering
+MAX_CAMERA_ATTEMPTS = 10
 RANDOM_SEED = 42  # <- Consistency for repeatability
+METRICS = True  # Stage timings and counters -> OUTPUT_DIR/metrics.jsonl
+PROFILE_RATE = 0.0  # Fraction of blend files run under PROFILER ('cprofile' or 'pyinstrument')
+PROFILER = 'cprofile'
+RENDER_ENGINE = 'CYCLES'
+RENDER_SAMPLES = 64
+# Quality ladder (tiers in quality.py), e.g. ['preview', 'medium', 'final']: a frame is re-rendered one
+# tier up only if it fails the noise/sharpness gate. None renders once with RENDER_ENGINE/RENDER_SAMPLES
+QUALITY_TIERS = None
+QUALITY_MAX_NOISE = 0.02
+QUALITY_MIN_SHARPNESS = None
+# 'open': open_mainfile per input; 'template': keep one prepared scene and append only each file's meshes
+LOAD_MODE = 'open'
+apply_config_overrides(globals())
 
 random.seed(RANDOM_SEED)
 
+GEOMETRY_CACHE = os.path.join(OUTPUT_DIR, 'cache/geometry')
 IMG_TRAIN = os.path.join(OUTPUT_DIR, 'images/train')
 IMG_VAL = os.path.join(OUTPUT_DIR, 'images/val')
 LBL_TRAIN = os.path.join(OUTPUT_DIR, 'labels/train')
 LBL_VAL = os.path.join(OUTPUT_DIR, 'labels/val')
 for d in [IMG_TRAIN, IMG_VAL, LBL_TRAIN, LBL_VAL]:
     os.makedirs(d, exist_ok=True)
+metrics = Metrics(OUTPUT_DIR, 'Animation.py', METRICS, PROFILE_RATE, PROFILER)
+
+
+CAMERA_PHI_RANGE = (math.radians(30), math.radians(150))
 
 
-def setup_camera(target=None):
+def setup_camera(target=None, direction=None):
     if 'Camera' in bpy.data.objects:
         cam = bpy.data.objects['Camera']
     else:
@@ -44,8 +81,11 @@ def setup_camera(target=None):
 
     if RANDOM_CAMERA_POSITIONS:
         radius = random.uniform(3.0, 5.0)
-        theta = random.uniform(0, 2 * math.pi)
-        phi = random.uniform(math.radians(30), math.radians(150))
+        if direction is None:
+            theta = random.uniform(0, 2 * math.pi)
+            phi = random.uniform(*CAMERA_PHI_RANGE)
+        else:
+            theta, phi = direction
         cam.location = (
             radius * math.sin(phi) * math.cos(theta),
             radius * math.sin(phi) * math.sin(theta),
@@ -98,94 +138,212 @@ def setup_animation(obj, frames):
     obj.rotation_mode = 'XYZ'
     axis_idx = {'X': 0, 'Y': 1, 'Z': 2}[axis]
 
-    for frame in range(frames + 1):
-        angle = math.radians((frame / frames) * TOTAL_ROTATION * speed)
-        rot = [0, 0, 0]
-        rot[axis_idx] = angle
-        obj.rotation_euler = rot
-        bpy.context.scene.frame_set(frame + 1)
-        obj.keyframe_insert(data_path="rotation_euler", frame=frame + 1)
-
-    for fcurve in obj.animation_data.action.fcurves:
+    # Write all keyframes in bulk instead of frame_set + keyframe_insert per frame
+    frame_numbers = np.arange(1, frames + 2)
+    angles = spin_angles(speed, frames, frame_numbers)
+    for i in range(3):
+        values = angles if i == axis_idx else np.zeros_like(angles)
+        fcurve = action.fcurves.new(data_path="rotation_euler", index=i)
+        fcurve.keyframe_points.add(len(frame_numbers))
+        co = np.column_stack([frame_numbers, values]).astype(np.float32).ravel()
+        fcurve.keyframe_points.foreach_set('co', co)
         for kf in fcurve.keyframe_points:
             kf.interpolation = 'LINEAR'
+        fcurve.update()
 
-    bpy.context.scene.frame_set(1)
+    obj.rotation_euler = (0.0, 0.0, 0.0)  # frame 1 of the spin
     return axis, speed
 
 
-def save_yolo_label(obj, cam, filepath):
-    scene = bpy.context.scene
-    mat_world = obj.matrix_world
-    if USE_BOUNDING_BOX:
-        corners = [mat_world @ Vector(corner) for corner in obj.bound_box]
-    else:
-        corners = [mat_world @ v.co for v in obj.data.vertices]
+def spin_angles(speed, frames, frame_numbers):
+    """Closed-form spin angle (radians) at each frame number, matching the keyframes."""
+    return np.radians((np.asarray(frame_numbers, dtype=np.float64) - 1) / frames * TOTAL_ROTATION * speed)
 
-    coords_2d = [world_to_camera_view(scene, cam, c) for c in corners]
-    coords_2d = [(p.x, p.y) for p in coords_2d if 0 <= p.x <= 1 and 0 <= p.y <= 1]
-    if not coords_2d:
-        return False
 
-    x_vals = [p[0] for p in coords_2d]
-    y_vals = [p[1] for p in coords_2d]
-    x_min, x_max = min(x_vals), max(x_vals)
-    y_min, y_max = min(y_vals), max(y_vals)
-    x_center = (x_min + x_max) / 2
-    y_center = (y_min + y_max) / 2
-    w = x_max - x_min
-    h = y_max - y_min
-    if w < 0.05 or h < 0.05:
-        return False
+def label_points(obj, blend_hash):
+    # Local-space points to project; the spin animation never changes them
+    if LABEL_MODE == 'bound_box':
+        return bound_box_corners(obj)
+    vertices = mesh_vertices(obj.data)
+    if LABEL_MODE in ('hull', 'index'):
+        return vertices[hull_index(obj, blend_hash, GEOMETRY_CACHE)]
+    return vertices
 
-    with open(filepath, 'w') as f:
-        f.write(f"{CLASS_ID} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
-    return True
+
+def compute_yolo_labels(obj, cam, points, axis, speed, frame_numbers):
+    """YOLO boxes for many frames in one vectorized pass; None for rejected frames."""
+    scene = bpy.context.scene
+    matrices = spin_world_matrices(obj, 'XYZ'.index(axis), spin_angles(speed, FRAMES_PER_MODEL, frame_numbers))
+    boxes = frame_boxes(points, matrices, camera_view_matrix(scene, cam), clipped=LABEL_MODE in ('hull', 'index'))
+    return yolo_labels(boxes, frame_numbers)
+
+
+def yolo_labels(boxes, frame_numbers):
+    w = boxes[:, 1] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 2]
+    x_center = (boxes[:, 0] + boxes[:, 1]) / 2
+    y_center = (boxes[:, 2] + boxes[:, 3]) / 2
+    accepted = (w >= MIN_BOX_SIZE) & (h >= MIN_BOX_SIZE)  # False for NaN rows too
+    return {int(frame): (x_center[k], y_center[k], w[k], h[k]) if accepted[k] else None
+            for k, frame in enumerate(frame_numbers)}
+
+
+def index_label(obj, frame):
+    """Box of obj in the object-index pass of the render just done, or None."""
+    boxes, _ = index_boxes(read_index_pass(), [obj.pass_index])
+    return yolo_labels(boxes, [frame])[frame]
+
+
+def render_frame(path, label):
+    """Render the current frame to path, climbing QUALITY_TIERS until it passes the quality gate."""
+    if not QUALITY_TIERS:
+        bpy.ops.render.render(write_still=True)
+        return
+    x_center, y_center, w, h = label
+    # Labels here keep the camera-frame y axis (up); image rows run down
+    region = label_region([(x_center, 1 - y_center, w, h)], IMG_SIZE)
+    tier, passed, stats = render_gated(bpy.context.scene, QUALITY_TIERS,
+                                       lambda: bpy.ops.render.render(write_still=True),
+                                       path, region, QUALITY_MAX_NOISE, QUALITY_MIN_SHARPNESS)
+    metrics.count('tier', tier=tier, passed=passed, **stats)
+
+
+def save_yolo_label(label, filepath, class_id):
+    x_center, y_center, w, h = label
+    write_text_atomic(filepath, f"{class_id} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
+
+
+def place_camera(obj, points, axis, speed, direction=None):
+    # Resample the camera until the first frame yields a label; later frames are checked as a batch.
+    # A sampled direction gets the first attempt, retries are random.
+    for attempt in range(MAX_CAMERA_ATTEMPTS):
+        cam = setup_camera(obj, direction if attempt == 0 else None)
+        bpy.context.view_layer.update()
+        if compute_yolo_labels(obj, cam, points, axis, speed, [1])[1] is not None:
+            break
+    return cam
 
 
 def main():
-    bpy.context.scene.render.engine = 'CYCLES'
-    bpy.context.scene.cycles.samples = 64
-    blend_files = [f for f in os.listdir(BLEND_DIR) if f.endswith('.blend')]
-    random.shuffle(blend_files)
-    train_cutoff = int(len(blend_files) * TRAIN_RATIO)
+    if LABEL_MODE == 'index' and any(TIERS[tier]['engine'] != 'CYCLES' for tier in QUALITY_TIERS or []):
+        raise ValueError("LABEL_MODE 'index' needs Cycles, so QUALITY_TIERS may only hold Cycles tiers")
+    blend_files = list_blend_files(BLEND_DIR, CLASS_MAP)
+    tasks = plan_tasks(blend_files, TRAIN_RATIO, RANDOM_SEED)
+    manifest = Manifest(OUTPUT_DIR)
 
     total_renders = 0
     total_labels = 0
-
-    for i, blend_file in enumerate(blend_files):
-        is_train = i < train_cutoff
+    total_skipped = 0
+    directions = None
+    if VIEW_SAMPLER != 'random':
+        # One camera per object, taken in plan order; sized for one mesh per file and reused cyclically
+        directions = list(zip(*camera_directions(VIEW_SAMPLER, max(len(tasks), 1), RANDOM_SEED, CAMERA_PHI_RANGE)))
+    camera_index = 0
+    if LOAD_MODE == 'template':
+        clear_meshes(bpy.context.scene)
+        apply_render_settings(bpy.context.scene, RENDER_ENGINE, RENDER_SAMPLES)
+        if LABEL_MODE == 'index':
+            enable_index_pass(bpy.context.scene, bpy.context.view_layer)
+
+    for task in tasks:
+        blend_file, is_train = task["blend_file"], task["is_train"]
         path = os.path.join(BLEND_DIR, blend_file)
+        class_name, class_id = class_of(path, CLASS_MAP)
+        loaded = []
 
         try:
-            bpy.ops.wm.open_mainfile(filepath=path)
-            objs = [o for o in bpy.context.scene.objects if o.type == 'MESH']
-            if not objs:
-                print(f"⚠️ {blend_file}: No mesh objects.")
-                continue
-
-            uid = uuid.uuid4().hex[:8]
-            for j, obj in enumerate(objs):
-                cam = setup_camera(obj)
-                setup_lighting()
-                axis, speed = setup_animation(obj, FRAMES_PER_MODEL)
-
-                for frame in range(1, FRAMES_PER_MODEL + 1):
-                    bpy.context.scene.frame_set(frame)
-                    img_name = f"{uid}_{CLASS_NAME}_{j}_f{frame:03d}_a{axis}_s{speed:.1f}.png"
-                    img_path = os.path.join(IMG_TRAIN if is_train else IMG_VAL, img_name)
-                    lbl_path = os.path.join(LBL_TRAIN if is_train else LBL_VAL, img_name.replace('.png', '.txt'))
-                    bpy.context.scene.render.filepath = img_path
-                    bpy.ops.render.render(write_still=True)
-                    total_renders += 1
-                    if save_yolo_label(obj, cam, lbl_path):
+            with metrics.profile(blend_file), metrics.stage('blend_file', blend_file=blend_file):
+                blend_hash = file_hash(path)
+                if LOAD_MODE == 'template':
+                    with metrics.stage('load_meshes', blend_file=blend_file):
+                        objs = loaded = load_meshes(path, bpy.context.scene.collection)
+                else:
+                    with metrics.stage('open_mainfile', blend_file=blend_file):
+                        bpy.ops.wm.open_mainfile(filepath=path)
+                    # Opening a file replaces the scene, so its render settings are set per file
+                    apply_render_settings(bpy.context.scene, RENDER_ENGINE, RENDER_SAMPLES)
+                    if LABEL_MODE == 'index':
+                        enable_index_pass(bpy.context.scene, bpy.context.view_layer)
+                    objs = [o for o in bpy.context.scene.objects if o.type == 'MESH']
+                if not objs:
+                    print(f"⚠️ {blend_file}: No mesh objects.")
+                    continue
+
+                for j, obj in enumerate(objs):
+                    obj.pass_index = j + 1  # 0 is the background in the object-index pass
+                for j, obj in enumerate(objs):
+                    direction = directions[camera_index % len(directions)] if directions else None
+                    camera_index += 1
+                    # Everything random about an object comes from its own seed, so a rerun
+                    # rebuilds the same lighting, spin and camera and renders only missing frames
+                    name = source_name(obj)  # as in the file: appending may have renamed obj
+                    seed = task_seed(RANDOM_SEED, blend_file, name)
+                    keys = {frame: unit_key(blend_hash, name, frame, seed)
+                            for frame in range(1, FRAMES_PER_MODEL + 1)}
+                    todo = [frame for frame, key in keys.items() if not manifest.is_done(key)]
+                    if not todo:
+                        continue
+
+                    random.seed(seed)
+                    with metrics.stage('setup', object=name):
+                        setup_lighting()
+                        axis, speed = setup_animation(obj, FRAMES_PER_MODEL)
+                    with metrics.stage('label', object=name, frames=len(todo)):
+                        points = label_points(obj, blend_hash)
+                        cam = place_camera(obj, points, axis, speed, direction)
+                        labels = compute_yolo_labels(obj, cam, points, axis, speed, todo)
+
+                    for frame in todo:
+                        label = labels[frame]
+                        if label is None:
+                            total_skipped += 1
+                            metrics.count('skipped', blend_file=blend_file)
+                            manifest.record(keys[frame], [], blend_file=blend_file, object=name,
+                                            frame=frame, seed=seed)
+                            continue
+
+                        img_name = (f"{source_tag(blend_hash, blend_file)}_{class_name}_{j}_f{frame:03d}"
+                                    f"_a{axis}_s{speed:.1f}.png")
+                        img_path = os.path.join(IMG_TRAIN if is_train else IMG_VAL, img_name)
+                        lbl_path = os.path.join(LBL_TRAIN if is_train else LBL_VAL, img_name.replace('.png', '.txt'))
+                        tmp_path = temp_path(img_path)
+                        # The render evaluates its own depsgraph at the current frame, so no frame_set
+                        bpy.context.scene.frame_current = frame
+                        bpy.context.scene.render.filepath = tmp_path
+                        with metrics.stage('render'):
+                            render_frame(tmp_path, label)
+                        if LABEL_MODE == 'index':
+                            with metrics.stage('index_label'):
+                                label = index_label(obj, frame)
+                            if label is None:
+                                # Hidden behind another mesh of the file, or too small once rendered
+                                os.remove(tmp_path)
+                                total_skipped += 1
+                                metrics.count('skipped', blend_file=blend_file)
+                                manifest.record(keys[frame], [], blend_file=blend_file, object=name,
+                                                frame=frame, seed=seed)
+                                continue
+                        with metrics.stage('write'):
+                            commit_file(tmp_path, img_path)
+                            save_yolo_label(label, lbl_path, class_id)
+                        total_renders += 1
                         total_labels += 1
+                        metrics.count('images', blend_file=blend_file)
+                        manifest.record(keys[frame], [img_path, lbl_path], blend_file=blend_file,
+                                        object=name, frame=frame, seed=seed)
 
             print(f"✅ {blend_file} done.")
         except Exception as e:
             print(f"❌ {blend_file}: {e}")
-
-    print(f"🎬 Done. Rendered: {total_renders}, Labeled: {total_labels}")
+        finally:
+            # Removes the meshes and purges their materials, actions and the per-object lights
+            if loaded:
+                unload_meshes(loaded)
+
+    candidates = total_renders + total_skipped
+    acceptance = total_renders / candidates if candidates else 0.0
+    print(f"🎬 Done. Rendered: {total_renders}, Labeled: {total_labels}, "
+          f"Skipped before render: {total_skipped}, Acceptance: {acceptance:.1%}")
 
 
 if __name__ == "__main__":
@@ -1,24 +1,58 @@
 import bpy
 import os
+import sys
+import json
 import math
+import argparse
 import random
+import shutil
 import uuid
+import numpy as np
 from bpy_extras.object_utils import world_to_camera_view
 from mathutils import Euler, Vector
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from manifest import Manifest, file_hash, unit_key, temp_path, commit_file
+from geometry_cache import normalize_object, hull_index
+from labeling import mesh_vertices, camera_view_matrix, spin_world_matrices, frame_boxes
+from render_farm import task_seed, report_progress, apply_config_overrides, apply_render_settings
+from quality import apply_tier
+from metrics import Metrics
+
 # ---------- CONFIG ----------
 BLEND_DIR = r"C:/Users/Admin/Machine Learning/Propeller/blender"
 OUTPUT_DIR = r"C:/Users/Admin/Machine Learning/Propeller/Output"
 CLASS_NAME = 'propeller'
+CLASS_ID = 0  # YOLO id written to the label sidecar
 IMG_SIZE = 512
 BUBBLE_COUNT = 80  # Reduced bubble count to make the object clearer
+BUBBLE_MODE = 'instanced'  # 'instanced': one point cloud + geometry nodes; 'objects': one sphere object each
+RANDOM_SEED = 42  # Per-file seeds make reruns rebuild the same scene
+METRICS = True  # Stage timings and counters -> OUTPUT_DIR/metrics.jsonl
+RENDER_ENGINE = None  # e.g. 'BLENDER_WORKBENCH'; None keeps each file's engine
+RENDER_SAMPLES = None  # None keeps the per-engine defaults below
+RENDER_TIER = None  # A quality.py tier ('draft', 'preview', 'medium', 'final'); replaces the two settings above
+# Per-frame boxes next to each video: 'npz' (one columnar <video>.labels.npz), 'yolo'
+# (<video>_labels/frame_0001.txt, ...; empty where the propeller is not visible) or None
+LABEL_SIDECAR = 'npz'
+MIN_BOX_SIZE = 0.01  # Frames whose box is narrower than this get no label
 
 # Video settings - explicitly defined
 FPS = 30
 VIDEO_DURATION_SECONDS = 10
-TOTAL_FRAMES = FPS * VIDEO_DURATION_SECONDS  # 300 frames for 10 seconds at 30fps
 RPM = 1000  # 1000 RPM as requested
+# FFMPEG output, also used when chunked frame renders are muxed by render_farm.py --video
+VIDEO_FORMAT = 'MPEG4'
+VIDEO_CODEC = 'H264'
+VIDEO_CRF = 'MEDIUM'
+VIDEO_GOPSIZE = 18
+VIDEO_BITRATE = 8000
 CAMERA_ANGLE_OFFSET = 0  # Removed angle offset to get a clean side view
+apply_config_overrides(globals())
+
+TOTAL_FRAMES = FPS * VIDEO_DURATION_SECONDS  # 300 frames for 10 seconds at 30fps
+GEOMETRY_CACHE = os.path.join(OUTPUT_DIR, 'cache/geometry')
+metrics = Metrics(OUTPUT_DIR, 'Animation_2.py', METRICS)
 
 # ---------- UTILS ----------
 def clear_scene():
@@ -139,6 +173,117 @@ def add_bubbles(count=80):
         
         b.keyframe_insert(data_path="location", frame=TOTAL_FRAMES)
 
+# ---------- INSTANCED BUBBLES ----------
+# One point-cloud mesh carries each bubble's start position, radius and rise
+# velocity as attributes; a geometry-nodes modifier moves the points with the
+# scene frame and instances one shared sphere with one shared material on
+# them. Setup cost no longer grows with the bubble count.
+def get_bubble_material():
+    mat = bpy.data.materials.get("BubbleMat")
+    if mat:
+        return mat
+    mat = bpy.data.materials.new(name="BubbleMat")
+    mat.use_nodes = True
+    principled = mat.node_tree.nodes.get("Principled BSDF")
+    if principled:
+        principled.inputs["Base Color"].default_value = (0.8, 0.9, 1.0, 1.0)
+        try:
+            principled.inputs["Metallic"].default_value = 0.0
+            principled.inputs["Roughness"].default_value = 0.1
+            principled.inputs["Transmission"].default_value = 0.95
+            principled.inputs["IOR"].default_value = 1.33
+        except:
+            pass
+    return mat
+
+def enabled_output(node):
+    # Named Attribute has one output per data type in Blender 3.x
+    return next(socket for socket in node.outputs if socket.enabled)
+
+def get_bubble_node_group():
+    group = bpy.data.node_groups.get("BubbleInstancer")
+    if group:
+        return group
+    group = bpy.data.node_groups.new("BubbleInstancer", 'GeometryNodeTree')
+    if hasattr(group, "interface"):  # Blender 4.x
+        group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+        group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+    else:
+        group.inputs.new('NodeSocketGeometry', "Geometry")
+        group.outputs.new('NodeSocketGeometry', "Geometry")
+
+    nodes = group.nodes
+    links = group.links
+    group_in = nodes.new('NodeGroupInput')
+    group_out = nodes.new('NodeGroupOutput')
+
+    # offset = velocity * (frame - 1)
+    time = nodes.new('GeometryNodeInputSceneTime')
+    elapsed = nodes.new('ShaderNodeMath')
+    elapsed.operation = 'SUBTRACT'
+    elapsed.inputs[1].default_value = 1.0
+    links.new(time.outputs['Frame'], elapsed.inputs[0])
+    velocity = nodes.new('GeometryNodeInputNamedAttribute')
+    velocity.data_type = 'FLOAT_VECTOR'
+    velocity.inputs['Name'].default_value = "velocity"
+    offset = nodes.new('ShaderNodeVectorMath')
+    offset.operation = 'SCALE'
+    links.new(enabled_output(velocity), offset.inputs[0])
+    links.new(elapsed.outputs[0], offset.inputs['Scale'])
+    move = nodes.new('GeometryNodeSetPosition')
+    links.new(group_in.outputs[0], move.inputs['Geometry'])
+    links.new(offset.outputs['Vector'], move.inputs['Offset'])
+
+    # One shared unit sphere, scaled per point by its radius
+    sphere = nodes.new('GeometryNodeMeshUVSphere')
+    sphere.inputs['Segments'].default_value = 16
+    sphere.inputs['Rings'].default_value = 8
+    sphere.inputs['Radius'].default_value = 1.0
+    material = nodes.new('GeometryNodeSetMaterial')
+    material.inputs['Material'].default_value = get_bubble_material()
+    links.new(sphere.outputs['Mesh'], material.inputs['Geometry'])
+    radius = nodes.new('GeometryNodeInputNamedAttribute')
+    radius.data_type = 'FLOAT'
+    radius.inputs['Name'].default_value = "radius"
+    instance = nodes.new('GeometryNodeInstanceOnPoints')
+    links.new(move.outputs['Geometry'], instance.inputs['Points'])
+    links.new(material.outputs['Geometry'], instance.inputs['Instance'])
+    links.new(enabled_output(radius), instance.inputs['Scale'])
+    links.new(instance.outputs['Instances'], group_out.inputs[0])
+    return group
+
+def add_bubbles_instanced(count=80):
+    if "Bubbles" not in bpy.data.collections:
+        bubbles_collection = bpy.data.collections.new("Bubbles")
+        bpy.context.scene.collection.children.link(bubbles_collection)
+    else:
+        bubbles_collection = bpy.data.collections["Bubbles"]
+
+    # Same distributions as add_bubbles, but rising at a constant velocity
+    frames = max(TOTAL_FRAMES - 1, 1)
+    positions, radii, velocities = [], [], []
+    for _ in range(count):
+        radii.append(random.uniform(0.003, 0.01))
+        positions.extend((random.uniform(-1, 1), random.uniform(0.5, 2), random.uniform(0, 2)))
+        rise_speed = random.uniform(0.5, 2.0)
+        velocities.extend((random.uniform(-0.3, 0.3) / frames,
+                           random.uniform(-0.3, 0.3) / frames,
+                           rise_speed * VIDEO_DURATION_SECONDS / frames))
+
+    mesh = bpy.data.meshes.new("Bubbles")
+    mesh.vertices.add(count)
+    mesh.vertices.foreach_set('co', positions)
+    mesh.attributes.new("radius", 'FLOAT', 'POINT').data.foreach_set('value', radii)
+    mesh.attributes.new("velocity", 'FLOAT_VECTOR', 'POINT').data.foreach_set('vector', velocities)
+    mesh.update()
+
+    # Named "Bubbles" so the propeller search in main() skips it
+    cloud = bpy.data.objects.new("Bubbles", mesh)
+    bubbles_collection.objects.link(cloud)
+    modifier = cloud.modifiers.new("BubbleInstancer", 'NODES')
+    modifier.node_group = get_bubble_node_group()
+    return cloud
+
 # ---------- TEXTURE VARIATION ----------
 def assign_enhanced_material(obj):
     mat = bpy.data.materials.new(name=f"Mat_{uuid.uuid4().hex[:4]}")
@@ -168,9 +313,54 @@ def assign_enhanced_material(obj):
     obj.data.materials.clear()
     obj.data.materials.append(mat)
 
+# ---------- LABEL SIDECAR ----------
+# The spin is two LINEAR keyframes about X, so every frame's pose is known in
+# closed form: all TOTAL_FRAMES boxes come from one NumPy pass over the cached
+# convex hull (see labeling.frame_boxes) instead of frame_set per frame.
+def spin_frame_angles(total_rotation):
+    """Blender frame numbers and their spin angle (radians), as the keyframes interpolate it."""
+    frames = np.arange(1, TOTAL_FRAMES + 1)
+    return frames, np.radians((frames - 1) / max(TOTAL_FRAMES - 1, 1) * total_rotation)
+
+def frame_labels(obj, cam, blend_hash, total_rotation):
+    """(frames, (F, 4) YOLO x_center, y_center, w, h with y down); NaN rows where obj is not visible."""
+    bpy.context.view_layer.update()  # camera and object transforms were just set
+    points = mesh_vertices(obj.data)[hull_index(obj, blend_hash, GEOMETRY_CACHE)]
+    frames, angles = spin_frame_angles(total_rotation)
+    boxes = frame_boxes(points, spin_world_matrices(obj, 0, angles),
+                        camera_view_matrix(bpy.context.scene, cam), clipped=True)
+    labels = np.stack([(boxes[:, 0] + boxes[:, 1]) / 2, 1 - (boxes[:, 2] + boxes[:, 3]) / 2,
+                       boxes[:, 1] - boxes[:, 0], boxes[:, 3] - boxes[:, 2]], axis=1)
+    labels[~((labels[:, 2] >= MIN_BOX_SIZE) & (labels[:, 3] >= MIN_BOX_SIZE))] = np.nan  # also NaN rows
+    return frames, labels
+
+def sidecar_path(video_path):
+    root = os.path.splitext(video_path)[0]
+    return f"{root}.labels.npz" if LABEL_SIDECAR == 'npz' else f"{root}_labels"
+
+def write_sidecar(path, frames, labels):
+    """Frame k of the video (0-based) is Blender frame frames[k], in both formats."""
+    if LABEL_SIDECAR == 'npz':
+        tmp = temp_path(path)
+        np.savez(tmp, frame=frames.astype(np.int32), visible=~np.isnan(labels[:, 0]),
+                 class_id=np.full(len(frames), CLASS_ID, dtype=np.int32), box=labels.astype(np.float32),
+                 fps=np.array(FPS))
+        commit_file(tmp, path)
+        return
+    tmp = path + '.partial'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for frame, (x_center, y_center, w, h) in zip(frames, labels):
+        with open(os.path.join(tmp, f"frame_{frame:04d}.txt"), 'w') as f:
+            if not np.isnan(x_center):
+                f.write(f"{CLASS_ID} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
 # ---------- MAIN ----------
 def configure_video_settings():
     """Set up the render settings specifically for video output"""
+    apply_render_settings(bpy.context.scene, RENDER_ENGINE)
     # Basic render settings
     bpy.context.scene.render.resolution_x = IMG_SIZE
     bpy.context.scene.render.resolution_y = IMG_SIZE
@@ -181,11 +371,11 @@ def configure_video_settings():
     
     # FFMPEG settings
     ffmpeg = bpy.context.scene.render.ffmpeg
-    ffmpeg.format = 'MPEG4'
-    ffmpeg.codec = 'H264'
-    ffmpeg.constant_rate_factor = 'MEDIUM'
-    ffmpeg.gopsize = 18
-    ffmpeg.video_bitrate = 8000
+    ffmpeg.format = VIDEO_FORMAT
+    ffmpeg.codec = VIDEO_CODEC
+    ffmpeg.constant_rate_factor = VIDEO_CRF
+    ffmpeg.gopsize = VIDEO_GOPSIZE
+    ffmpeg.video_bitrate = VIDEO_BITRATE
     
     # Frame range settings
     bpy.context.scene.frame_start = 1
@@ -202,8 +392,50 @@ def configure_video_settings():
     elif bpy.context.scene.render.engine == 'CYCLES':
         bpy.context.scene.cycles.samples = 128
         bpy.context.scene.cycles.use_denoising = True
+    apply_render_settings(bpy.context.scene, samples=RENDER_SAMPLES)
+    if RENDER_TIER:
+        apply_tier(bpy.context.scene, RENDER_TIER)
+
+# ---------- CHUNKED RENDERING ----------
+# With `-- --blend FILE --chunk START END --frames-dir DIR` only frames
+# START..END of FILE are rendered, as a lossless PNG sequence. Every chunk
+# worker seeds and builds the identical scene, so the chunks join seamlessly
+# when render_farm.py muxes them with the settings written to DIR/video.json.
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='Animation_2.py')
+    parser.add_argument('--plan', help='write the list of videos to render to this JSON file and exit')
+    parser.add_argument('--blend', help='only process this .blend file')
+    parser.add_argument('--chunk', type=int, nargs=2, metavar=('START', 'END'),
+                        help='render only this frame range to a PNG sequence')
+    parser.add_argument('--frames-dir', help='where chunk frames and video.json are written')
+    return parser.parse_args(argv)
+
+def write_video_job(frames_dir, job):
+    # Every chunk of a video writes the same job; per-process temp names keep the writes atomic
+    path = os.path.join(frames_dir, 'video.json')
+    tmp = f"{path}.{os.getpid()}.partial"
+    with open(tmp, 'w') as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp, path)
+
+def render_chunk(frame_range, frames_dir):
+    scene = bpy.context.scene
+    scene.frame_start, scene.frame_end = frame_range
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGB'
+    scene.render.filepath = os.path.join(frames_dir, "frame_####")
+    bpy.ops.render.render(animation=True)
 
 def main():
+    args = parse_args()
+    if args.plan:
+        blend_files = sorted(f for f in os.listdir(BLEND_DIR) if f.endswith('.blend'))
+        with open(args.plan, 'w') as f:
+            json.dump({"blend_dir": BLEND_DIR, "total_frames": TOTAL_FRAMES,
+                       "tasks": [{"blend_file": b} for b in blend_files]}, f, indent=2)
+        return
+
     # Ensure compatible render engine
     try:
         if bpy.context.scene.render.engine not in {'BLENDER_EEVEE', 'CYCLES'}:
@@ -217,39 +449,52 @@ def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     blend_files = [f for f in os.listdir(BLEND_DIR) if f.endswith('.blend')]
+    if args.blend:
+        blend_files = [args.blend]
+    manifest = Manifest(OUTPUT_DIR)
     
     for blend_file in blend_files:
         try:
+            blend_path = os.path.join(BLEND_DIR, blend_file)
+            blend_hash = file_hash(blend_path)
+            seed = task_seed(RANDOM_SEED, blend_file)
+            random.seed(seed)
+
             # Try to open the file
-            bpy.ops.wm.open_mainfile(filepath=os.path.join(BLEND_DIR, blend_file))
+            with metrics.stage('open_mainfile', blend_file=blend_file):
+                bpy.ops.wm.open_mainfile(filepath=blend_path)
             
             # Set up render settings - MUST be done after loading each file
             configure_video_settings()
             
-            setup_lighting()
-            cam = setup_camera()
-            setup_clear_underwater_world()
-            add_bubbles(BUBBLE_COUNT)
+            with metrics.stage('environment', blend_file=blend_file):
+                setup_lighting()
+                cam = setup_camera()
+                setup_clear_underwater_world()
+                if BUBBLE_MODE == 'instanced':
+                    add_bubbles_instanced(BUBBLE_COUNT)
+                else:
+                    add_bubbles(BUBBLE_COUNT)
 
             propeller_found = False
             for obj in bpy.context.scene.objects:
                 if obj.type == 'MESH' and "Bubbles" not in obj.name:
                     # Skip collection objects by checking name
+                    key = unit_key(blend_hash, obj.name, 'video', seed)
+                    if manifest.is_done(key):
+                        print(f"Skipping {blend_file}: video already rendered")
+                        if args.chunk:
+                            write_video_job(args.frames_dir, {"done": True})
+                            report_progress('chunk_done', blend_file=blend_file, chunk=args.chunk)
+                        propeller_found = True
+                        break
+
                     assign_enhanced_material(obj)
 
-                    # Center object, normalize size
-                    bpy.ops.object.select_all(action='DESELECT')
-                    obj.select_set(True)
-                    bpy.context.view_layer.objects.active = obj
-                    
+                    # Center object, normalize size (cached per blend file hash)
                     try:
-                        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-                        
-                        # Avoid division by zero
-                        max_dim = max(obj.dimensions) if max(obj.dimensions) > 0 else 1.0
-                        scale = 1.0 / max_dim
-                        obj.scale = (scale, scale, scale)
-                        bpy.ops.object.transform_apply(scale=True)
+                        with metrics.stage('normalize', object=obj.name):
+                            normalize_object(obj, blend_hash, GEOMETRY_CACHE)
                     except Exception as e:
                         print(f"Warning: Could not transform object: {str(e)}")
 
@@ -263,6 +508,7 @@ def main():
                     except: 
                         pass
                     
+                    obj.rotation_mode = 'XYZ'  # The keyframes (and the label sidecar) use rotation_euler
                     obj.rotation_euler = (0.0, 0.0, 0.0)
                     obj.keyframe_insert(data_path="rotation_euler", frame=1)
                     
@@ -297,10 +543,34 @@ def main():
 
                     # Set video output path - use blend file name as part of the output
                     blend_name = os.path.splitext(blend_file)[0]
-                    video_path = os.path.join(OUTPUT_DIR, f"{blend_name}_1000rpm_side_view_{CLASS_NAME}_{uuid.uuid4().hex[:4]}.mp4")
-                    
+                    video_path = os.path.join(OUTPUT_DIR, f"{blend_name}_1000rpm_side_view_{CLASS_NAME}_{blend_hash[:8]}.mp4")
+                    outputs = [video_path]
+                    if LABEL_SIDECAR:
+                        outputs.append(sidecar_path(video_path))
+                        # Chunks of one video would write the same sidecar; the first chunk does
+                        if not args.chunk or args.chunk[0] == 1:
+                            with metrics.stage('labels', blend_file=blend_file):
+                                write_sidecar(outputs[1], *frame_labels(obj, cam, blend_hash, total_rotation))
+
+                    if args.chunk:
+                        os.makedirs(args.frames_dir, exist_ok=True)
+                        with metrics.stage('render', blend_file=blend_file, chunk=args.chunk):
+                            render_chunk(args.chunk, args.frames_dir)
+                        metrics.count('frames', args.chunk[1] - args.chunk[0] + 1, blend_file=blend_file)
+                        write_video_job(args.frames_dir, {
+                            "video_path": os.path.abspath(video_path), "output_dir": os.path.abspath(OUTPUT_DIR),
+                            "fps": FPS, "frame_start": 1, "frame_end": TOTAL_FRAMES,
+                            "format": VIDEO_FORMAT, "codec": VIDEO_CODEC, "crf": VIDEO_CRF,
+                            "gopsize": VIDEO_GOPSIZE, "bitrate": VIDEO_BITRATE,
+                            "key": key, "blend_file": blend_file, "object": obj.name, "seed": seed,
+                            "sidecar": os.path.abspath(outputs[1]) if LABEL_SIDECAR else None})
+                        report_progress('chunk_done', blend_file=blend_file, chunk=args.chunk)
+                        propeller_found = True
+                        break
+
                     # CRITICAL: Make sure the output path explicitly includes the file extension
-                    bpy.context.scene.render.filepath = video_path
+                    tmp_path = temp_path(video_path)
+                    bpy.context.scene.render.filepath = tmp_path
                     
                     print(f"Rendering video: {video_path}")
                     print(f"Propeller RPM: {RPM}")
@@ -309,7 +579,13 @@ def main():
                     print(f"File format: {bpy.context.scene.render.image_settings.file_format}")
                     
                     # Render animation as video
-                    bpy.ops.render.render(animation=True)
+                    with metrics.stage('render', blend_file=blend_file):
+                        bpy.ops.render.render(animation=True)
+                    commit_file(tmp_path, video_path)
+                    metrics.count('frames', TOTAL_FRAMES, blend_file=blend_file)
+                    metrics.count('videos', blend_file=blend_file)
+                    manifest.record(key, outputs, blend_file=blend_file, object=obj.name,
+                                    view='video', seed=seed)
                     propeller_found = True
                     break  # Process only the first suitable mesh object
             
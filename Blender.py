@@ -1,19 +1,95 @@
 import bpy
 import os
+import sys
+import json
 import math
 import random
-import uuid
+import time
+import argparse
+import hashlib
+import socket
+import threading
+import concurrent.futures
 import cv2
 import numpy as np
-from bpy_extras.object_utils import world_to_camera_view
+from mathutils import Quaternion, Vector
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from render_farm import (plan_tasks, task_seed, report_progress, apply_config_overrides, apply_render_settings,
+                         list_blend_files, class_of)
+from labeling import (camera_view_matrix, project_points, frame_bounds, clipped_bounds, amodal_bounds, occlusion_clip,
+                      index_boxes, visible_fractions)
+from manifest import (Manifest, file_hash, unit_key, source_tag, temp_path, commit_file, write_text_atomic,
+                      write_bytes_atomic)
+from geometry_cache import normalize_object
+from shards import ShardWriter
+from metrics import Metrics, peak_rss_mb
+from mesh_library import load_meshes, unload_meshes, clear_meshes, mesh_geometry, source_name
+import spool
+import work_queue
+from viewpoints import view_poses, CoverageTracker
+from dedup import fingerprint, duplicate_groups, FingerprintCache
+from index_pass import enable_viewer, read_viewer, read_index_pass
+from async_writer import AsyncWriter, IMAGE_FORMATS, encode_image, gray_image
+from quality import TIERS, render_gated, label_region
 
 # ---------- CONFIG ----------
 BLEND_DIR = "path/to/blend/files"
 OUTPUT_DIR = "path/to/output/dir" 
-CLASS_NAME = 'propeller'
+# Class name -> YOLO id. Files in BLEND_DIR/<class name>/ get that class, files directly in BLEND_DIR the first
+CLASS_MAP = {'propeller': 0}
 IMG_SIZE = 512
 NUM_IMAGES_PER_FILE = 40
 TRAIN_RATIO = 0.8
+RANDOM_SEED = 42  # Fixes the train/val split and per-view poses across runs and workers
+MAX_POSE_ATTEMPTS = 10  # Poses resampled per view before it is skipped without rendering
+LABEL_MODE = 'hull'  # 'vertices': box of the vertices inside the frame; 'hull': the cached convex hull, clipped
+# to the frame (the full mesh's box cut at the frame edge). They differ only for objects crossing the edge
+# 'index': pixel-exact boxes from the render's object-index pass (Cycles only; poses are still checked with the hull)
+MIN_VISIBLE = 0.3  # Objects less visible than this get no label ('index' also counts frame truncation)
+BATCH_RENDER = False  # Render all views of an object as frames of one animation pass
+# (not with 'index', QUALITY_TIERS or the 'memory' handoff)
+# 'open': open_mainfile per input (rebuilds the world each time); 'template': build camera,
+# lights and world once and append only each file's meshes via bpy.data.libraries.load
+LOAD_MODE = 'open'
+VIEW_SAMPLER = 'random'  # 'random', 'fibonacci', 'stratified' or 'sobol' (see viewpoints.py)
+COVERAGE_TARGET = None  # e.g. 0.8: stop an object's views once this much of SO(3) is covered
+COVERAGE_RADIUS_DEG = 45.0  # A view covers every pose within this geodesic angle
+# K > 1: each render places K normalized meshes from different files (same split) without overlap
+# and writes one label line per visible object; see render_composites
+COMPOSITE_OBJECTS = 1
+COMPOSITE_POOL = 16  # Files loaded and normalized together; a composite draws its objects from one pool
+COMPOSITE_SCALE = (0.6, 1.0)  # Random per-object scale range
+COMPOSITE_SPREAD = 1.2  # Bounding-sphere centers lie within this distance of the origin along each axis
+COMPOSITE_CAMERA_DISTANCE = 5.5
+# Duplicate inputs (same geometry up to scale/translation, see dedup.py): 'off', 'group' renders
+# them all but keeps each group in one split, 'collapse' also renders only one file of each set
+# of exact (vertex hash) duplicates; near-duplicates are never dropped
+DEDUP = 'group'
+DEDUP_THRESHOLD = 0.05  # L1 distance between D2 shape histograms counted as a near-duplicate
+OUTPUT_BACKEND = 'files'  # 'files': one PNG + TXT per sample; 'shards': size-bounded tar shards
+SHARD_MAX_BYTES = 1 << 30
+# 'file': Blender encodes and writes each PNG on the render thread; 'memory': the pixels are read back
+# through a compositor Viewer node and encoded/written on WRITER_THREADS while the next view renders
+RENDER_HANDOFF = 'file'
+IMAGE_FORMAT = 'png'  # With 'memory': 'png', 'webp' (lossless) or 'jpg'
+PNG_COMPRESSION = 3  # 0 (fastest) to 9 (smallest)
+JPEG_QUALITY = 95
+WRITER_THREADS = 2
+WRITER_QUEUE = 8  # Rendered images waiting for a writer thread; rendering blocks beyond this
+METRICS = True  # Stage timings and counters -> OUTPUT_DIR/metrics.jsonl (python metrics.py summary OUTPUT_DIR)
+PROFILE_RATE = 0.0  # Fraction of blend files run under PROFILER ('cprofile' or 'pyinstrument')
+PROFILER = 'cprofile'
+RENDER_ENGINE = None  # e.g. 'CYCLES', 'BLENDER_EEVEE', 'BLENDER_WORKBENCH'; None keeps each file's engine
+RENDER_SAMPLES = None
+# Quality ladder (tiers in quality.py), e.g. ['preview', 'medium', 'final']: every image is rendered at
+# the first tier and again one tier up only if it fails the noise/sharpness gate. None renders once
+QUALITY_TIERS = None
+QUALITY_MAX_NOISE = 0.02  # Immerkaer noise sigma, intensities in [0, 1]
+QUALITY_MIN_SHARPNESS = None  # Laplacian variance inside the labeled box, e.g. 2e-4 against over-denoising
+WORKER_MAX_JOBS = 200  # Resident workers (--daemon) exit after this many jobs...
+WORKER_MAX_RSS_MB = 8000  # ...or once their peak RSS passes this, and are restarted fresh
+apply_config_overrides(globals())  # e.g. RENDERBOX_CONFIG='{"NUM_IMAGES_PER_FILE": 4}'
 
 # ---------- SETUP ----------
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -21,8 +97,14 @@ IMG_TRAIN = os.path.join(OUTPUT_DIR, 'images/train')
 IMG_VAL = os.path.join(OUTPUT_DIR, 'images/val')
 LBL_TRAIN = os.path.join(OUTPUT_DIR, 'labels/train')
 LBL_VAL = os.path.join(OUTPUT_DIR, 'labels/val')
+GEOMETRY_CACHE = os.path.join(OUTPUT_DIR, 'cache/geometry')
+FINGERPRINT_CACHE = os.path.join(OUTPUT_DIR, 'cache/fingerprints')
+BATCH_DIR = os.path.join(OUTPUT_DIR, 'tmp/batch')
+SHARD_DIR = os.path.join(OUTPUT_DIR, 'shards')
 for d in [IMG_TRAIN, IMG_VAL, LBL_TRAIN, LBL_VAL]:
     os.makedirs(d, exist_ok=True)
+metrics = Metrics(OUTPUT_DIR, 'Blender.py', METRICS, PROFILE_RATE, PROFILER)
+image_writer = AsyncWriter(WRITER_THREADS, WRITER_QUEUE) if RENDER_HANDOFF == 'memory' else None
 
 # ---------- CAMERA & LIGHT SETUP ----------
 def setup_camera():
@@ -64,89 +146,716 @@ def setup_underwater_environment():
     links.new(volume_node.outputs['Volume'], output_node.inputs['Volume'])
 
 # ---------- RENDER & LABEL ----------
-def render_and_save(obj, out_prefix, angle_idx, is_train):
-    bpy.ops.object.select_all(action='DESELECT')
-    obj.select_set(True)
-    bpy.context.view_layer.objects.active = obj
-
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-    dims = obj.dimensions
-    max_dim = max(dims)
-    if max_dim > 0:
-        scale_factor = 1.0 / max_dim
-        obj.scale = (scale_factor, scale_factor, scale_factor)
-        bpy.ops.object.transform_apply(scale=True)
-
-    obj.rotation_euler = (
-        math.radians(random.uniform(0, 360)),
-        math.radians(random.uniform(0, 360)),
-        math.radians(random.uniform(0, 360))
-    )
-
-    radius = 3.5
-    theta = random.uniform(0, 2 * math.pi)
-    phi = random.uniform(math.radians(45), math.radians(135))
+CAMERA_PHI_RANGE = (math.radians(45), math.radians(135))
+
+def sample_pose(obj, cam, pose=None):
+    """Random object rotation and camera position, or the given (quaternion, theta, phi) pose."""
+    if pose is None:
+        obj.rotation_euler = (
+            math.radians(random.uniform(0, 360)),
+            math.radians(random.uniform(0, 360)),
+            math.radians(random.uniform(0, 360))
+        )
+        theta = random.uniform(0, 2 * math.pi)
+        phi = random.uniform(*CAMERA_PHI_RANGE)
+    else:
+        quat, theta, phi = pose
+        obj.rotation_euler = Quaternion(quat).to_euler()
+    orbit_camera(cam, obj.location, theta, phi)
+
+def orbit_camera(cam, target, theta, phi, radius=3.5):
     x = radius * math.sin(phi) * math.cos(theta)
     y = radius * math.sin(phi) * math.sin(theta)
     z = radius * math.cos(phi)
 
-    cam = bpy.context.scene.camera
     cam.location = (x, y, z)
-    direction = obj.location - cam.location
+    direction = target - cam.location
     cam.rotation_euler = direction.to_track_quat('-Z', 'Y').to_euler()
+    bpy.context.view_layer.update()
 
-    img_name = f"{out_prefix}_{angle_idx}.png"
-    img_path = os.path.join(IMG_TRAIN if is_train else IMG_VAL, img_name)
-    bpy.context.scene.render.filepath = img_path
-    bpy.ops.render.render(write_still=True)
+def label_points(geom):
+    if LABEL_MODE != 'vertices':
+        return geom['vertices'][geom['hull']]
+    return geom['vertices']
 
-    mat_world = obj.matrix_world
-    coords_2d = [world_to_camera_view(bpy.context.scene, cam, mat_world @ v.co)
-                 for v in obj.data.vertices]
-    coords_2d = [(int(p.x * IMG_SIZE), int(IMG_SIZE - p.y * IMG_SIZE)) for p in coords_2d if
-                 0 <= p.x <= 1 and 0 <= p.y <= 1]
+def compute_label(obj, cam, points):
+    view_proj = camera_view_matrix(bpy.context.scene, cam)
+    coords = project_points(points, obj.matrix_world, view_proj)
+    bounds = frame_bounds(coords) if LABEL_MODE == 'vertices' else clipped_bounds(coords)
+    if bounds is None:
+        return None
+    return yolo_box(bounds)
 
-    if not coords_2d:
-        return
-
-    x_coords = [p[0] for p in coords_2d]
-    y_coords = [p[1] for p in coords_2d]
-    x_min, x_max = min(x_coords), max(x_coords)
-    y_min, y_max = min(y_coords), max(y_coords)
+def yolo_box(bounds):
+    # Pixel truncation is monotonic, so it can be applied to the extremes only
+    u_min, u_max, v_min, v_max = bounds
+    x_min, x_max = int(u_min * IMG_SIZE), int(u_max * IMG_SIZE)
+    y_min, y_max = int(IMG_SIZE - v_max * IMG_SIZE), int(IMG_SIZE - v_min * IMG_SIZE)
 
     x_center = ((x_min + x_max) / 2) / IMG_SIZE
     y_center = ((y_min + y_max) / 2) / IMG_SIZE
     box_w = (x_max - x_min) / IMG_SIZE
     box_h = (y_max - y_min) / IMG_SIZE
+    return x_center, y_center, box_w, box_h
+
+def relative_rotation(obj, cam):
+    # What the camera sees depends only on the object's rotation in camera space
+    return tuple(cam.matrix_world.to_quaternion().inverted() @ obj.matrix_world.to_quaternion())
+
+def covered(tracker):
+    return tracker is not None and tracker.coverage >= COVERAGE_TARGET
+
+def choose_pose(obj, cam, points, pose=None):
+    # Validate the pose before rendering so rejected views never cost a render;
+    # a sampled pose gets the first attempt, retries fall back to random draws
+    for attempt in range(1, MAX_POSE_ATTEMPTS + 1):
+        sample_pose(obj, cam, pose if attempt == 1 else None)
+        label = compute_label(obj, cam, points)
+        if label is not None:
+            return label, attempt
+    return None, MAX_POSE_ATTEMPTS
+
+def image_ext():
+    return IMAGE_FORMAT if RENDER_HANDOFF == 'memory' else 'png'
+
+def output_paths(out_prefix, angle_idx, is_train):
+    name = f"{out_prefix}_{angle_idx}"
+    img_path = os.path.join(IMG_TRAIN if is_train else IMG_VAL, f"{name}.{image_ext()}")
+    label_path = os.path.join(LBL_TRAIN if is_train else LBL_VAL, f"{name}.txt")
+    return img_path, label_path
+
+def label_text(labels):
+    return "".join(f"{class_id} {x_center:.6f} {y_center:.6f} {box_w:.6f} {box_h:.6f}\n"
+                   for class_id, (x_center, y_center, box_w, box_h) in labels)
+
+shard_writers = {}
+shard_lock = threading.Lock()  # Writer threads share the shard of each split
+
+def shard_writer(is_train):
+    split = 'train' if is_train else 'val'
+    if split not in shard_writers:
+        shard_writers[split] = ShardWriter(os.path.join(SHARD_DIR, split), 'renderbox', SHARD_MAX_BYTES)
+    return shard_writers[split]
+
+def close_shards():
+    for writer in shard_writers.values():
+        writer.close()
+    shard_writers.clear()
+
+def save_sample(image, out_prefix, angle_idx, is_train, labels):
+    """Move a rendered image file (or write encoded image bytes) and its (class_id, box) labels
+    into the output backend; returns the output paths."""
+    img_path, label_path = output_paths(out_prefix, angle_idx, is_train)
+    if OUTPUT_BACKEND != 'shards':
+        if isinstance(image, bytes):
+            write_bytes_atomic(img_path, image)
+        else:
+            commit_file(image, img_path)
+        write_text_atomic(label_path, label_text(labels))
+        return [img_path, label_path]
+
+    if not isinstance(image, bytes):
+        with open(image, 'rb') as f:
+            data = f.read()
+        os.remove(image)
+        image = data
+    key = os.path.splitext(os.path.basename(img_path))[0]
+    meta = {"classes": [class_id for class_id, _ in labels], "split": 'train' if is_train else 'val', "view": angle_idx}
+    # Recorded as the shard's final path: if the shard never closes, the unit is redone
+    with shard_lock:
+        return [shard_writer(is_train).write(key, {
+            image_ext(): image, 'txt': label_text(labels).encode(), 'json': json.dumps(meta).encode()})]
+
+def write_sample(pixels, out_prefix, angle_idx, is_train, labels):
+    """Encode handed-off render pixels and save them with their labels; runs on an image_writer thread."""
+    return save_sample(encode_image(pixels, IMAGE_FORMAT, PNG_COMPRESSION, JPEG_QUALITY),
+                       out_prefix, angle_idx, is_train, labels)
+
+def record_unit(manifest, key, outputs, file_outputs=None, **fields):
+    """Record a finished unit; outputs may be an image_writer Future, recorded once the files exist."""
+    def record(outputs):
+        manifest.record(key, outputs, **fields)
+        if file_outputs is not None:
+            file_outputs.update(outputs)
+    if isinstance(outputs, concurrent.futures.Future):
+        image_writer.then(outputs, record)
+    else:
+        record(outputs)
+
+def finish_writes():
+    if image_writer is not None:
+        with metrics.stage('write_drain'):
+            image_writer.drain()
+
+def render_and_save(obj, geom, out_prefix, angle_idx, is_train, pose=None, class_id=0):
+    """Render one view of a normalized object; returns (output_paths, poses_sampled)."""
+    cam = bpy.context.scene.camera
+    with metrics.stage('pose_label'):
+        label, attempts = choose_pose(obj, cam, label_points(geom), pose)
+    if label is None:
+        return [], attempts
+
+    targets = None
+    if LABEL_MODE == 'index':
+        coords = project_points(label_points(geom), obj.matrix_world, camera_view_matrix(bpy.context.scene, cam))
+        targets = [(obj, class_id, amodal_bounds(coords), 0.0)]
+    return render_still(out_prefix, angle_idx, is_train, [(class_id, label)], targets), attempts
+
+def render_still(out_prefix, angle_idx, is_train, labels, targets=None):
+    """Render and save one image. With LABEL_MODE 'index' the labels are replaced by
+    boxes read from this render's object-index pass for targets [(obj, class_id, amodal box, depth)].
+
+    Returns the output paths, or with RENDER_HANDOFF 'memory' a Future of them
+    (see record_unit).
+    """
+    img_path, _ = output_paths(out_prefix, angle_idx, is_train)
+    tmp_path = temp_path(img_path)
+    bpy.context.scene.render.filepath = tmp_path
+    with metrics.stage('render'):
+        pixels = render_image(tmp_path, labels)
+    if LABEL_MODE == 'index':
+        with metrics.stage('index_labels'):
+            labels = pass_labels(targets, pixels)
+        if not labels:
+            if pixels is None:
+                os.remove(tmp_path)
+            return []
+    with metrics.stage('write'):
+        if pixels is not None:
+            # Only blocks while WRITER_QUEUE images are already waiting
+            return image_writer.submit(write_sample, pixels, out_prefix, angle_idx, is_train, labels)
+        return save_sample(tmp_path, out_prefix, angle_idx, is_train, labels)
+
+def render_image(path, labels):
+    """Render one image, climbing QUALITY_TIERS until it passes the quality gate.
+
+    Blender writes it to path, or with RENDER_HANDOFF 'memory' its pixels are returned.
+    """
+    memory = RENDER_HANDOFF == 'memory'
+    render = bpy.ops.render.render if memory else lambda: bpy.ops.render.render(write_still=True)
+    if not QUALITY_TIERS:
+        render()
+        return read_viewer() if memory else None
+    last = {}
+
+    def gray():
+        last['pixels'] = read_viewer()
+        return gray_image(last['pixels'])
+
+    region = label_region([box for _, box in labels], IMG_SIZE)
+    tier, passed, stats = render_gated(bpy.context.scene, QUALITY_TIERS, render, path, region,
+                                       QUALITY_MAX_NOISE, QUALITY_MIN_SHARPNESS, gray if memory else None)
+    metrics.count('tier', tier=tier, passed=passed, **stats)
+    return last.get('pixels')
+
+def pass_labels(targets, pixels=None):
+    """(class_id, box) of every target at least MIN_VISIBLE visible in the last render's index pass
+    (the alpha channel of pixels, when the render was handed off in memory)."""
+    index_map = read_index_pass(pixels)
+    ids = [obj.pass_index for obj, _, _, _ in targets]
+    boxes, counts = index_boxes(index_map, ids)
+    amodal = [bounds if bounds is not None else (np.nan,) * 4 for _, _, bounds, _ in targets]
+    visible = visible_fractions(index_map, ids, counts, amodal, [depth for _, _, _, depth in targets])
+    return [(class_id, yolo_box(boxes[i])) for i, (_, class_id, _, _) in enumerate(targets)
+            if visible[i] >= MIN_VISIBLE]
+
+def render_views_batched(obj, geom, out_prefix, views, is_train, poses=None, tracker=None, class_id=0):
+    """Render (angle_idx, seed) views as consecutive frames of one animation pass.
+
+    Returns {angle_idx: (output_paths, poses_sampled)}.
+    """
+    scene = bpy.context.scene
+    cam = scene.camera
+    points = label_points(geom)
+
+    # Choose every pose (and its label) before any keyframe exists, so the
+    # depsgraph updates in sample_pose are not overridden by the animation
+    results, chosen = {}, []
+    with metrics.stage('pose_label', views=len(views)):
+        for angle_idx, seed in views:
+            if covered(tracker):
+                results[angle_idx] = ([], 0)
+                continue
+            random.seed(seed)
+            label, attempts = choose_pose(obj, cam, points, poses.get(angle_idx) if poses else None)
+            if label is None:
+                results[angle_idx] = ([], attempts)
+                continue
+            if tracker is not None:
+                tracker.add(relative_rotation(obj, cam))
+            chosen.append((angle_idx, attempts, label, tuple(obj.rotation_euler),
+                          tuple(cam.location), tuple(cam.rotation_euler)))
+
+    if chosen:
+        for frame, (_, _, _, obj_rot, cam_loc, cam_rot) in enumerate(chosen, start=1):
+            obj.rotation_euler = obj_rot
+            cam.location = cam_loc
+            cam.rotation_euler = cam_rot
+            obj.keyframe_insert(data_path="rotation_euler", frame=frame)
+            cam.keyframe_insert(data_path="location", frame=frame)
+            cam.keyframe_insert(data_path="rotation_euler", frame=frame)
+        for animated in (obj, cam):
+            for fcurve in animated.animation_data.action.fcurves:
+                for kp in fcurve.keyframe_points:
+                    kp.interpolation = 'CONSTANT'
 
-    label_dir = LBL_TRAIN if is_train else LBL_VAL
-    label_path = os.path.join(label_dir, img_name.replace('.png', '.txt'))
-    with open(label_path, 'w') as f:
-        f.write(f"0 {x_center:.6f} {y_center:.6f} {box_w:.6f} {box_h:.6f}\n")
+        # Only the camera and object transforms change between frames, so
+        # persistent data keeps the BVH and kernels for the whole pass
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        scene.frame_start = 1
+        scene.frame_end = len(chosen)
+        scene.render.use_persistent_data = True
+        scene.render.filepath = os.path.join(BATCH_DIR, f"{out_prefix}_####.png")
+        with metrics.stage('render', views=len(chosen)):
+            bpy.ops.render.render(animation=True)
+
+        with metrics.stage('write', views=len(chosen)):
+            for frame, (angle_idx, attempts, label, *_) in enumerate(chosen, start=1):
+                frame_path = os.path.join(BATCH_DIR, f"{out_prefix}_{frame:04d}.png")
+                outputs = save_sample(frame_path, out_prefix, angle_idx, is_train, [(class_id, label)])
+                results[angle_idx] = (outputs, attempts)
+
+    obj.animation_data_clear()
+    cam.animation_data_clear()
+    return results
 
 # ---------- MAIN PROCESS ----------
-def main():
-    bpy.context.scene.render.resolution_x = IMG_SIZE
-    bpy.context.scene.render.resolution_y = IMG_SIZE
-    bpy.context.scene.render.image_settings.file_format = 'PNG'
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='Blender.py')
+    parser.add_argument('--plan', help='write the task plan to this JSON file and exit')
+    parser.add_argument('--tasks', help='render only the tasks listed in this JSON file')
+    parser.add_argument('--daemon', metavar='SPOOL', help='stay resident and render jobs from this spool directory')
+    parser.add_argument('--queue', metavar='QUEUE', help='render units from this work_queue.py queue until it is empty')
+    parser.add_argument('--worker-id', default=str(os.getpid()))
+    parser.add_argument('--max-jobs', type=int, default=WORKER_MAX_JOBS)
+    parser.add_argument('--max-rss-mb', type=float, default=WORKER_MAX_RSS_MB)
+    return parser.parse_args(argv)
+
+def load_tasks(args):
+    if args.tasks:
+        with open(args.tasks) as f:
+            return json.load(f)["tasks"]
+    blend_files = list_blend_files(BLEND_DIR, CLASS_MAP)
+    if DEDUP == 'off':
+        return plan_tasks(blend_files, TRAIN_RATIO, RANDOM_SEED)
+    with metrics.stage('dedup', files=len(blend_files)):
+        fingerprints = fingerprint_files(blend_files)
+        groups = duplicate_groups(fingerprints, DEDUP_THRESHOLD)
+    groups = [group for group in groups if len(group) > 1]
+    collapsed = {}
+    if DEDUP == 'collapse':
+        # Only identical geometry is dropped: D2 groups link by single linkage, so
+        # similar but distinct meshes can chain into one group
+        for group in duplicate_groups(fingerprints, 0):
+            collapsed.update((f, group[0]) for f in group[1:])
+        blend_files = [f for f in blend_files if f not in collapsed]
+        groups = [[f for f in group if f not in collapsed] for group in groups]
+        groups = [group for group in groups if len(group) > 1]
+    write_text_atomic(os.path.join(OUTPUT_DIR, 'duplicates.json'),
+                      json.dumps({"groups": groups, "collapsed": collapsed}, indent=2))
+    for dropped, kept in sorted(collapsed.items()):
+        print(f"♻️ Skipping {dropped}: same geometry as {kept}")
+    if groups:
+        print(f"♻️ {sum(map(len, groups))} files in {len(groups)} duplicate groups, each kept in one split "
+              f"(see {os.path.join(OUTPUT_DIR, 'duplicates.json')})")
+    return plan_tasks(blend_files, TRAIN_RATIO, RANDOM_SEED, groups)
+
+def fingerprint_files(blend_files):
+    """{blend_file: fingerprint} of each file's meshes, cached by content hash."""
+    cache = FingerprintCache(FINGERPRINT_CACHE)
+    fingerprints = {}
+    for blend_file in sorted(blend_files):
+        blend_path = os.path.join(BLEND_DIR, blend_file)
+        blend_hash = file_hash(blend_path)
+        fp = cache.get(blend_hash)
+        if fp is None:
+            meshes = load_meshes(blend_path, bpy.context.scene.collection)
+            try:
+                vertices, triangles = mesh_geometry(meshes)
+            finally:
+                unload_meshes(meshes)
+            if not len(vertices):
+                continue  # no meshes, nothing to render either
+            fp = fingerprint(vertices, triangles)
+            cache.put(blend_hash, fp)
+        fingerprints[blend_file] = fp
+    return fingerprints
+
+def render_blend_file(blend_file, is_train, manifest, num_views=NUM_IMAGES_PER_FILE, base_seed=RANDOM_SEED,
+                      template=False, blend_path=None, view_range=None):
+    """Render num_views views of every mesh in blend_file; returns (rendered, poses_sampled).
+
+    With template=True the meshes are appended into the current (template)
+    scene and removed afterwards, instead of opening the file. view_range
+    (start, stop) renders only those of the num_views views.
+    """
+    blend_path = blend_path or os.path.join(BLEND_DIR, blend_file)
+    blend_hash = file_hash(blend_path)
+    view_range = view_range or (0, num_views)
+    # File-level marker so finished files are not even reopened on a rerun
+    views = num_views if tuple(view_range) == (0, num_views) else f"{view_range[0]}-{view_range[1]}/{num_views}"
+    file_key = unit_key(blend_hash, f"*{blend_file}", views, base_seed)  # per file: copies differ by name
+    if manifest.is_done(file_key):
+        return 0, 0
+
+    if template:
+        with metrics.stage('load_meshes', blend_file=blend_file):
+            meshes = load_meshes(blend_path, bpy.context.scene.collection)
+    else:
+        with metrics.stage('open_mainfile', blend_file=blend_file):
+            bpy.ops.wm.open_mainfile(filepath=blend_path)
+        apply_render_settings(bpy.context.scene, RENDER_ENGINE, RENDER_SAMPLES)
+        setup_viewer(bpy.context.scene)
+        with metrics.stage('environment'):
+            setup_underwater_environment()
+        meshes = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    try:
+        rendered, sampled, file_outputs = render_meshes(blend_file, blend_hash, meshes, is_train, manifest,
+                                                        num_views, base_seed, class_of(blend_path, CLASS_MAP),
+                                                        view_range)
+    finally:
+        if template:
+            unload_meshes(meshes)
+    finish_writes()  # file_outputs is complete once every pending write is recorded
+    manifest.record(file_key, sorted(file_outputs), blend_file=blend_file)
+    metrics.count('images', rendered, blend_file=blend_file)
+    metrics.count('poses', sampled, blend_file=blend_file)
+    return rendered, sampled
+
+def render_meshes(blend_file, blend_hash, meshes, is_train, manifest, num_views, base_seed, class_info,
+                  view_range):
+    class_name, class_id = class_info
+    rendered, sampled = 0, 0
+    file_outputs = set()
+    for k, obj in enumerate(meshes):
+        obj.pass_index = k + 1  # Object-index pass id; 0 is the background
+    # The index pass and the Viewer node only hold the last frame and the quality
+    # gate checks single images, so each of them needs one render per view
+    batched = BATCH_RENDER and LABEL_MODE != 'index' and not QUALITY_TIERS and RENDER_HANDOFF != 'memory'
+    for k, obj in enumerate(meshes):
+        out_prefix = f"{source_tag(blend_hash, blend_file)}_{k}_{class_name}"
+        name = source_name(obj)  # as in the file: appending may have renamed obj
+        views = []
+        for j in range(*view_range):
+            seed = task_seed(base_seed, blend_file, name, j)
+            key = unit_key(blend_hash, name, j, seed)
+            if not manifest.is_done(key):
+                views.append((j, seed, key))
+        if not views:
+            continue
+
+        # Normalize once per object; views only change the object transform
+        with metrics.stage('normalize', object=name):
+            geom = normalize_object(obj, blend_hash, GEOMETRY_CACHE)
+        poses = {}
+        if VIEW_SAMPLER != 'random':
+            # View j always gets point j of the object's sequence, so reruns resume it
+            poses = dict(enumerate(view_poses(VIEW_SAMPLER, num_views, task_seed(base_seed, blend_file, name),
+                                              CAMERA_PHI_RANGE)))
+        tracker = CoverageTracker(COVERAGE_RADIUS_DEG) if COVERAGE_TARGET else None
+        if batched:
+            results = render_views_batched(obj, geom, out_prefix, [(j, seed) for j, seed, _ in views], is_train,
+                                           poses, tracker, class_id)
+        for j, seed, key in views:
+            if batched:
+                outputs, attempts = results[j]
+            elif covered(tracker):
+                outputs, attempts = [], 0
+            else:
+                random.seed(seed)
+                outputs, attempts = render_and_save(obj, geom, out_prefix, j, is_train, poses.get(j), class_id)
+                if outputs and tracker is not None:
+                    tracker.add(relative_rotation(obj, bpy.context.scene.camera))
+            record_unit(manifest, key, outputs, file_outputs, blend_file=blend_file, object=name, view=j, seed=seed)
+            rendered += bool(outputs)
+            sampled += attempts
+            report_progress('view', blend_file=blend_file, object=name, view=j,
+                            rendered=bool(outputs), poses=attempts)
+            if active_lease is not None:
+                active_lease.heartbeat()  # raises LeaseLost once another worker has reclaimed the unit
+    return rendered, sampled, file_outputs
+
+def check_config():
+    if LABEL_MODE == 'index' and any(TIERS[tier]['engine'] != 'CYCLES' for tier in QUALITY_TIERS or []):
+        raise ValueError("LABEL_MODE 'index' needs Cycles, so QUALITY_TIERS may only hold Cycles tiers")
+    if RENDER_HANDOFF not in ('file', 'memory'):
+        raise ValueError(f"RENDER_HANDOFF must be 'file' or 'memory', not {RENDER_HANDOFF!r}")
+    if RENDER_HANDOFF == 'memory' and IMAGE_FORMAT not in IMAGE_FORMATS:
+        raise ValueError(f"IMAGE_FORMAT must be one of {IMAGE_FORMATS}, not {IMAGE_FORMAT!r}")
+
+def setup_viewer(scene):
+    """Compositor Viewer node for the object-index pass and/or the in-memory image handoff."""
+    if LABEL_MODE == 'index' or RENDER_HANDOFF == 'memory':
+        enable_viewer(scene, bpy.context.view_layer, image=RENDER_HANDOFF == 'memory', index=LABEL_MODE == 'index')
+
+def setup_template():
+    scene = bpy.context.scene
+    clear_meshes(scene)
+    scene.render.resolution_x = IMG_SIZE
+    scene.render.resolution_y = IMG_SIZE
+    scene.render.image_settings.file_format = 'PNG'
+    apply_render_settings(scene, RENDER_ENGINE, RENDER_SAMPLES)
+    setup_viewer(scene)
     setup_lighting()
-    cam = setup_camera()
+    setup_camera()
     setup_underwater_environment()
 
-    blend_files = [f for f in os.listdir(BLEND_DIR) if f.endswith('.blend')]
-    random.shuffle(blend_files)
-    total_files = len(blend_files)
-    train_cutoff = int(TRAIN_RATIO * total_files)
+# ---------- COMPOSITE SCENES ----------
+# With COMPOSITE_OBJECTS = K > 1 the files of each split are taken in pools of
+# COMPOSITE_POOL. A pool's meshes are appended into the template scene and
+# normalized once; every render then shows K of them at random poses, kept
+# apart by their bounding spheres. Each box is clipped by the boxes of nearer
+# objects and every object still visible gets its own label line. A pool gets
+# enough renders for each file to appear about NUM_IMAGES_PER_FILE times.
+def composite_pools(tasks):
+    for is_train in (True, False):
+        files = sorted(task["blend_file"] for task in tasks if task["is_train"] == is_train)
+        random.Random(task_seed(RANDOM_SEED, 'composite', is_train)).shuffle(files)
+        for start in range(0, len(files), COMPOSITE_POOL):
+            yield files[start:start + COMPOSITE_POOL], is_train
 
-    for i, blend_file in enumerate(blend_files):
-        is_train = i < train_cutoff
-        blend_path = os.path.join(BLEND_DIR, blend_file)
-        bpy.ops.wm.open_mainfile(filepath=blend_path)
-        setup_underwater_environment()
-        for obj in bpy.context.scene.objects:
-            if obj.type == 'MESH':
-                uid = uuid.uuid4().hex[:8]
-                for j in range(NUM_IMAGES_PER_FILE):
-                    render_and_save(obj, f"{uid}_{CLASS_NAME}", j, is_train)
-
-main()
+def place_objects(items):
+    """Random rotation, scale and position for each (obj, geom, class_id), without
+    bounding-sphere overlap. Objects that find no free spot are hidden; returns the placed items."""
+    placed, spheres = [], []
+    for obj, geom, class_id in items:
+        obj.rotation_euler = [math.radians(random.uniform(0, 360)) for _ in range(3)]
+        scale = random.uniform(*COMPOSITE_SCALE)
+        obj.scale = (scale, scale, scale)
+        radius = float(geom['sphere_radius']) * scale
+        for _ in range(100):
+            center = Vector([random.uniform(-COMPOSITE_SPREAD, COMPOSITE_SPREAD) for _ in range(3)])
+            if all((center - c).length >= radius + r for c, r in spheres):
+                break
+        else:
+            obj.hide_render = True
+            continue
+        # The bounding-sphere center, not the object origin, goes to center
+        offset = obj.rotation_euler.to_matrix() @ Vector(geom['sphere_center'].tolist())
+        obj.location = center - offset * scale
+        obj.hide_render = False
+        spheres.append((center, radius))
+        placed.append((obj, geom, class_id))
+    bpy.context.view_layer.update()
+    return placed
+
+def composite_labels(placed, cam):
+    """Labels of the placed objects, and their (obj, class_id, amodal box, depth) index-pass targets."""
+    if not placed:
+        return [], []
+    view_proj = camera_view_matrix(bpy.context.scene, cam)
+    boxes, depths, targets = [], [], []
+    for obj, geom, class_id in placed:
+        coords = project_points(label_points(geom), obj.matrix_world, view_proj)
+        bounds = frame_bounds(coords) if LABEL_MODE == 'vertices' else clipped_bounds(coords)
+        boxes.append(bounds if bounds is not None else (np.nan,) * 4)
+        depths.append(project_points(geom['sphere_center'][None], obj.matrix_world, view_proj)[0, 2])
+        targets.append((obj, class_id, amodal_bounds(coords), depths[-1]))
+    clipped, visible = occlusion_clip(boxes, depths)
+    # Box occlusion over-estimates; with the index pass it only pre-screens for anything visible
+    keep = visible > 0 if LABEL_MODE == 'index' else visible >= MIN_VISIBLE
+    labels = [(class_id, yolo_box(clipped[i])) for i, (_, _, class_id) in enumerate(placed) if keep[i]]
+    return labels, targets
+
+def compose_scene(items, cam):
+    """Pose K random items and the camera until some object gets a label; returns (labels, targets, attempts)."""
+    chosen = random.sample(items, min(COMPOSITE_OBJECTS, len(items)))
+    for obj, _, _ in items:
+        obj.hide_render = True
+    for attempt in range(1, MAX_POSE_ATTEMPTS + 1):
+        placed = place_objects(chosen)
+        orbit_camera(cam, Vector((0.0, 0.0, 0.0)), random.uniform(0, 2 * math.pi),
+                     random.uniform(*CAMERA_PHI_RANGE), COMPOSITE_CAMERA_DISTANCE)
+        labels, targets = composite_labels(placed, cam)
+        if labels:
+            return labels, targets, attempt
+    return [], [], MAX_POSE_ATTEMPTS
+
+def render_composites(files, is_train, manifest):
+    """Render the composites of one pool of files; returns (rendered, poses_sampled)."""
+    hashes = {f: file_hash(os.path.join(BLEND_DIR, f)) for f in files}
+    pool_id = hashlib.sha1("".join(hashes[f] for f in files).encode()).hexdigest()
+    renders = []
+    for r in range(-(-len(files) * NUM_IMAGES_PER_FILE // COMPOSITE_OBJECTS)):
+        seed = task_seed(RANDOM_SEED, pool_id, r)
+        key = unit_key(pool_id, 'composite', r, seed)
+        if not manifest.is_done(key):
+            renders.append((r, seed, key))
+    if not renders:
+        return 0, 0
+
+    loaded, items = [], []
+    rendered, sampled = 0, 0
+    try:
+        for f in files:
+            blend_path = os.path.join(BLEND_DIR, f)
+            with metrics.stage('load_meshes', blend_file=f):
+                meshes = load_meshes(blend_path, bpy.context.scene.collection)
+            loaded += meshes
+            _, class_id = class_of(blend_path, CLASS_MAP)
+            for obj in meshes:
+                with metrics.stage('normalize', object=source_name(obj)):
+                    items.append((obj, normalize_object(obj, hashes[f], GEOMETRY_CACHE), class_id))
+                obj.pass_index = len(items)
+        if not items:
+            return 0, 0
+
+        cam = bpy.context.scene.camera
+        out_prefix = f"{pool_id[:8]}_composite"
+        for r, seed, key in renders:
+            random.seed(seed)
+            with metrics.stage('pose_label'):
+                labels, targets, attempts = compose_scene(items, cam)
+            outputs = render_still(out_prefix, r, is_train, labels, targets) if labels else []
+            record_unit(manifest, key, outputs, blend_files=files, view=r, seed=seed, objects=len(labels))
+            metrics.count('labels', len(labels))
+            rendered += bool(outputs)
+            sampled += attempts
+            report_progress('view', blend_file=out_prefix, view=r, rendered=bool(outputs), poses=attempts)
+    finally:
+        unload_meshes(loaded)
+    metrics.count('images', rendered)
+    metrics.count('poses', sampled)
+    return rendered, sampled
+
+# ---------- RESIDENT WORKER ----------
+# `-- --daemon SPOOL` keeps this Blender process alive: the template scene is
+# built once and every job (a .blend, a view count, a seed) only appends its
+# meshes. render_farm.py --daemon restarts workers that recycle themselves.
+def serve(spool_dir, worker_id, max_jobs, max_rss_mb, poll_seconds=0.5):
+    setup_template()
+    manifest = Manifest(OUTPUT_DIR)
+    jobs = 0
+    try:
+        while jobs < max_jobs:
+            job = spool.claim(spool_dir, worker_id)
+            if job is None:
+                time.sleep(poll_seconds)
+                continue
+            name, spec = job
+            blend_file = os.path.basename(spec["blend_file"])
+            start = time.time()
+            try:
+                with metrics.stage('job', blend_file=blend_file):
+                    rendered, sampled = render_blend_file(blend_file, spec["is_train"], manifest, spec["views"],
+                                                          spec["seed"], template=True, blend_path=spec["blend_file"])
+            except Exception as e:
+                print(f"❌ {blend_file}: {e}")
+                spool.fail(spool_dir, name, str(e), worker_id)
+            else:
+                spool.finish(spool_dir, name, {"rendered": rendered, "poses": sampled,
+                                               "seconds": time.time() - start}, worker_id)
+                report_progress('job_done', blend_file=blend_file, rendered=rendered, poses=sampled)
+            jobs += 1
+
+            rss = peak_rss_mb()
+            if max_rss_mb and rss and rss > max_rss_mb:
+                print(f"♻️ Peak RSS {rss:.0f} MB is over {max_rss_mb:.0f} MB, recycling worker {worker_id}")
+                break
+    finally:
+        try:
+            finish_writes()
+        finally:
+            close_shards()
+    print(f"♻️ Worker {worker_id} exiting after {jobs} jobs")
+
+# ---------- SHARED WORK QUEUE ----------
+# `-- --queue QUEUE` pulls (blend file, view range) units from a work_queue.py
+# queue that workers on every node share; the lease protocol, the train/val
+# split and the view count all come from the queue, not from this node.
+active_lease = None
+
+def serve_queue(queue_dir, worker_id, poll_seconds=10.0):
+    global active_lease
+    if COMPOSITE_OBJECTS > 1:
+        raise ValueError("--queue renders single-object units, so COMPOSITE_OBJECTS must be 1")
+    plan = work_queue.load_plan(queue_dir)
+    worker = f"{socket.gethostname()}-{worker_id}"
+    setup_template()
+    manifest = Manifest(OUTPUT_DIR)
+    units = 0
+    try:
+        while True:
+            lease = work_queue.claim(queue_dir, worker, plan)
+            if lease is None:
+                if work_queue.finished(queue_dir):
+                    break
+                time.sleep(poll_seconds)  # the remaining units are leased; wait in case one expires
+                continue
+            unit = lease.unit
+            active_lease = lease
+            try:
+                with metrics.stage('unit', blend_file=unit["blend_file"]):
+                    rendered, sampled = render_blend_file(
+                        unit["blend_file"], unit["is_train"], manifest, plan["views"], plan["seed"],
+                        template=LOAD_MODE == 'template',
+                        blend_path=os.path.join(plan["blend_dir"], unit["blend_file"]),
+                        view_range=(unit["view_start"], unit["view_stop"]))
+            except work_queue.LeaseLost as e:
+                print(f"⚠️ {e}")
+            except Exception as e:
+                print(f"❌ {unit['blend_file']}: {e}")
+                lease.fail(str(e))
+            else:
+                lease.finish({"rendered": rendered, "poses": sampled})
+                report_progress('job_done', blend_file=unit["blend_file"], rendered=rendered, poses=sampled)
+                units += 1
+            finally:
+                active_lease = None
+    finally:
+        try:
+            finish_writes()
+        finally:
+            close_shards()
+    print(f"🎬 Worker {worker} done after {units} units")
+
+def main():
+    args = parse_args()
+    check_config()
+    if args.daemon:
+        serve(args.daemon, args.worker_id, args.max_jobs, args.max_rss_mb)
+        return
+    if args.queue:
+        serve_queue(args.queue, args.worker_id)
+        return
+    tasks = load_tasks(args)
+    if args.plan:
+        with open(args.plan, 'w') as f:
+            json.dump({"blend_dir": BLEND_DIR, "views": NUM_IMAGES_PER_FILE, "seed": RANDOM_SEED, "tasks": tasks},
+                      f, indent=2)
+        return
+
+    setup_template()
+
+    manifest = Manifest(OUTPUT_DIR)
+    total_rendered, total_sampled = 0, 0
+    try:
+        if COMPOSITE_OBJECTS > 1:
+            for files, is_train in composite_pools(tasks):
+                with metrics.stage('composite_pool', files=len(files)):
+                    rendered, sampled = render_composites(files, is_train, manifest)
+                total_rendered += rendered
+                total_sampled += sampled
+                for blend_file in files:
+                    report_progress('file_done', blend_file=blend_file)
+        else:
+            for task in tasks:
+                with metrics.profile(task["blend_file"]), metrics.stage('blend_file', blend_file=task["blend_file"]):
+                    rendered, sampled = render_blend_file(task["blend_file"], task["is_train"], manifest,
+                                                          template=LOAD_MODE == 'template')
+                total_rendered += rendered
+                total_sampled += sampled
+                report_progress('file_done', blend_file=task["blend_file"])
+    finally:
+        try:
+            finish_writes()
+        finally:
+            close_shards()
+
+    acceptance = total_rendered / total_sampled if total_sampled else 0.0
+    print(f"🎬 Done. Rendered: {total_rendered}, Poses sampled: {total_sampled}, "
+          f"Acceptance: {acceptance:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# --- ASYNCHRONOUS ENCODE/WRITE BEHIND A BOUNDED QUEUE ---
+# With write_still=True Blender compresses every PNG on the render thread
+# before the next view can start. Handed off as a NumPy buffer instead (see
+# index_pass.read_viewer), an image is encoded and written by a few writer
+# threads while the next view renders; cv2 releases the GIL while it encodes.
+# submit() blocks once max_pending images are waiting, so a slow disk stalls
+# rendering instead of filling memory.
+
+import concurrent.futures
+import threading
+
+import cv2
+import numpy as np
+
+IMAGE_FORMATS = ('png', 'webp', 'jpg')
+
+
+def to_uint8(pixels):
+    """Scene-linear (H, W, 3+) float RGB(A) -> (H, W, 3) uint8 BGR, with the sRGB curve."""
+    rgb = np.clip(pixels[..., :3], 0.0, 1.0)
+    srgb = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1 / 2.4) - 0.055)
+    return (srgb[..., ::-1] * 255 + 0.5).astype(np.uint8)
+
+
+def encode_image(pixels, fmt='png', png_compression=3, jpeg_quality=95):
+    """Encoded bytes of read_viewer() pixels; 'webp' is lossless."""
+    if fmt == 'png':
+        params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    elif fmt == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, 101]  # above 100 is lossless
+    elif fmt == 'jpg':
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    else:
+        raise ValueError(f"unknown image format {fmt!r}, expected one of {IMAGE_FORMATS}")
+    ok, data = cv2.imencode('.' + fmt, to_uint8(pixels), params)
+    if not ok:
+        raise RuntimeError(f"cv2 could not encode a {fmt} image")
+    return data.tobytes()
+
+
+def gray_image(pixels):
+    """Grayscale in [0, 1] as quality.load_gray would read the encoded image."""
+    return cv2.cvtColor(to_uint8(pixels), cv2.COLOR_BGR2GRAY).astype(np.float64) / 255.0
+
+
+class AsyncWriter:
+    """Runs write jobs on background threads with at most max_pending unfinished."""
+
+    def __init__(self, threads=2, max_pending=8):
+        self.pool = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='writer')
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.idle = threading.Condition()
+        self.pending = 0  # jobs and then() continuations not finished yet
+        self.errors = []
+
+    def submit(self, fn, *args):
+        """Queue fn(*args), blocking while the queue is full; returns its Future."""
+        self.slots.acquire()
+        self._start()
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(self._job_done)
+        return future
+
+    def then(self, future, fn):
+        """Run fn(result) once future succeeds; drain() waits for it as well."""
+        self._start()
+        future.add_done_callback(lambda f: self._finish(fn, f))
+
+    def drain(self):
+        """Wait for every job and continuation; re-raises the first failure."""
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending == 0)
+            errors, self.errors = self.errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.drain()
+        finally:
+            self.pool.shutdown()
+
+    def _start(self):
+        with self.idle:
+            self.pending += 1
+
+    def _job_done(self, future):
+        self.slots.release()
+        self._settle(future.exception())
+
+    def _finish(self, fn, future):
+        error = None
+        if future.exception() is None:  # a failed job is reported once, by _job_done
+            try:
+                fn(future.result())
+            except Exception as e:
+                error = e
+        self._settle(error)
+
+    def _settle(self, error):
+        with self.idle:
+            if error is not None:
+                self.errors.append(error)
+            self.pending -= 1
+            self.idle.notify_all()
@@ -0,0 +1,242 @@
+# --- POST-RENDER AUGMENTATION: SEVERAL TRAINING SAMPLES PER RENDER ---
+# Runs next to the renderers as its own process pool, following
+# OUTPUT_DIR/manifest.jsonl. Every newly rendered training image gets RATIO
+# variants with underwater color cast, turbidity haze, blur, noise and a
+# label-aware crop/scale/flip; each variant is written with its own YOLO label
+# and recorded in the same manifest, so reruns skip finished variants.
+# Animation.py labels (manifest entries with a 'frame') keep the camera's y
+# axis pointing up, unlike image rows: their y is flipped before the crop and
+# back again in the variant's label, which keeps its source's convention.
+# Blender's bundled Python stays out of multiprocessing: the renderers only
+# ever append to the manifest.
+#
+#   python augment.py path/to/output --ratio 6 --workers 8 --follow
+#   python augment.py path/to/output --splits train val
+
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from manifest import Manifest, MANIFEST_NAME, unit_key, temp_path, commit_file, write_text_atomic
+from render_farm import task_seed
+
+AUGMENT_VIEW = 'augment'
+IMAGE_EXTS = ('.png', '.webp', '.jpg')
+WATER_CAST = {'b': (1.0, 1.2), 'g': (0.9, 1.1), 'r': (0.55, 0.9)}  # per-channel gains
+HAZE_TRANSMISSION = (0.6, 0.95)
+MIN_CROP = 0.6  # Smallest crop side as a fraction of the image
+MIN_BOX_SIDE = 0.01  # Boxes narrower than this after cropping are dropped
+
+
+# ---------- LABELS ----------
+def read_labels(path):
+    """(N, 5) array of class_id, x_center, y_center, w, h."""
+    with open(path) as f:
+        rows = [line.split() for line in f if line.strip()]
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def label_lines(labels):
+    return "".join(f"{int(c)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for c, x, y, w, h in labels)
+
+
+def to_corners(labels):
+    _, x, y, w, h = labels.T
+    return np.stack([x - w / 2, y - h / 2, x + w / 2, y + h / 2], axis=1)
+
+
+def from_corners(classes, corners):
+    x0, y0, x1, y1 = corners.T
+    return np.stack([classes, (x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0], axis=1)
+
+
+# ---------- TRANSFORMS ----------
+def crop_window(corners, rng):
+    """Random square-ish crop (x0, y0, side_x, side_y), normalized, that keeps every box whole."""
+    side = rng.uniform(MIN_CROP, 1.0)
+    lo = corners[:, :2].min(axis=0) if len(corners) else np.full(2, 0.5)
+    hi = corners[:, 2:].max(axis=0) if len(corners) else np.full(2, 0.5)
+    side = np.maximum(side, np.minimum(hi - lo, 1.0))  # boxes larger than the crop widen it
+    start_lo = np.clip(hi - side, 0.0, 1.0 - side)
+    start_hi = np.clip(lo, 0.0, 1.0 - side)
+    start = start_lo + rng.random(2) * np.maximum(start_hi - start_lo, 0.0)
+    return start, side
+
+
+def crop_scale_flip(image, labels, rng):
+    h, w = image.shape[:2]
+    corners = to_corners(labels)
+    start, side = crop_window(corners, rng)
+    x0, y0 = int(start[0] * w), int(start[1] * h)
+    x1, y1 = x0 + max(1, int(side[0] * w)), y0 + max(1, int(side[1] * h))
+    image = cv2.resize(image[y0:y1, x0:x1], (w, h), interpolation=cv2.INTER_LINEAR)
+    # The crop is an affine map of normalized coordinates, so boxes map corner for corner
+    scale = np.array([w / (x1 - x0), h / (y1 - y0)])
+    offset = np.array([x0 / w, y0 / h])
+    corners = np.clip((corners.reshape(-1, 2, 2) - offset) * scale, 0.0, 1.0).reshape(-1, 4)
+    if rng.random() < 0.5:
+        image = image[:, ::-1]
+        corners = np.stack([1 - corners[:, 2], corners[:, 1], 1 - corners[:, 0], corners[:, 3]], axis=1)
+    labels = from_corners(labels[:, 0], corners)
+    keep = (labels[:, 3] >= MIN_BOX_SIDE) & (labels[:, 4] >= MIN_BOX_SIDE)
+    return np.ascontiguousarray(image), labels[keep]
+
+
+def underwater(image, rng):
+    """Color cast, haze, blur and noise on a BGR uint8 image; boxes are unaffected."""
+    img = image.astype(np.float32) / 255.0
+    gains = np.array([rng.uniform(*WATER_CAST[c]) for c in 'bgr'], dtype=np.float32)
+    img *= gains
+    # Turbidity: scattered light of the water's own color replaces part of the signal
+    t = rng.uniform(*HAZE_TRANSMISSION)
+    airlight = np.array([rng.uniform(0.35, 0.6), rng.uniform(0.25, 0.45), rng.uniform(0.0, 0.15)], dtype=np.float32)
+    img = img * t + airlight * (1 - t)
+    if rng.random() < 0.5:
+        img = cv2.GaussianBlur(img, (0, 0), rng.uniform(0.5, 1.5))
+    img += rng.normal(0.0, rng.uniform(0.0, 0.03), img.shape).astype(np.float32)
+    return (np.clip(img, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+
+
+def flip_y(labels):
+    flipped = labels.copy()
+    flipped[:, 2] = 1 - flipped[:, 2]
+    return flipped
+
+
+def augment_sample(img_path, label_path, variants, y_up=False):
+    """Write each (seed, out_img, out_label) variant of one image; returns (seed, outputs) per variant.
+
+    y_up: the labels' y runs up the image (Animation.py), not down.
+    """
+    image = cv2.imread(img_path, cv2.IMREAD_COLOR)
+    labels = read_labels(label_path)
+    if y_up:
+        labels = flip_y(labels)
+    written = []
+    for seed, out_img, out_label in variants:
+        rng = np.random.default_rng(seed)
+        aug_image, aug_labels = crop_scale_flip(image, labels, rng)
+        if not len(aug_labels):
+            written.append((seed, []))  # every box cropped too thin; recorded so reruns skip it
+            continue
+        tmp = temp_path(out_img)
+        cv2.imwrite(tmp, underwater(aug_image, rng))
+        commit_file(tmp, out_img)
+        write_text_atomic(out_label, label_lines(flip_y(aug_labels) if y_up else aug_labels))
+        written.append((seed, [out_img, out_label]))
+    return written
+
+
+# ---------- MANIFEST FOLLOWER ----------
+def read_new_entries(path, offset):
+    """Complete manifest lines after byte offset; returns (entries, new offset)."""
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1  # a line still being appended waits for the next poll
+    entries = []
+    for line in data[:end].splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries, offset + end
+
+
+def source_pair(entry, splits):
+    """(image, label, y_up) of a rendered sample in one of splits (relative paths), else None."""
+    if entry.get("view") == AUGMENT_VIEW:
+        return None
+    images = [p for p in entry.get("outputs", []) if p.endswith(IMAGE_EXTS)]
+    labels = [p for p in entry.get("outputs", []) if p.endswith('.txt')]
+    if len(images) != 1 or len(labels) != 1:
+        return None  # file-level markers, skipped views, tar shards
+    if os.path.basename(os.path.dirname(images[0])) not in splits:
+        return None
+    return images[0], labels[0], "frame" in entry  # Animation.py records frames, Blender.py views
+
+
+def plan_variants(output_dir, manifest, entry, pair, ratio, seed):
+    img_rel, label_rel, _ = pair
+    stem, ext = os.path.splitext(os.path.basename(img_rel))
+    variants = []
+    for k in range(ratio):
+        variant_seed = task_seed(seed, stem, k)
+        key = unit_key(entry["key"], AUGMENT_VIEW, k, variant_seed)
+        if manifest.is_done(key):
+            continue
+        out_img = os.path.join(output_dir, os.path.dirname(img_rel), f"{stem}_aug{k}{ext}")
+        out_label = os.path.join(output_dir, os.path.dirname(label_rel), f"{stem}_aug{k}.txt")
+        variants.append((key, variant_seed, out_img, out_label))
+    return variants
+
+
+def run(output_dir, ratio, seed, workers, splits, follow, poll_seconds=2.0):
+    manifest = Manifest(output_dir)
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    offset, written, pending = 0, 0, {}
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        while True:
+            entries, offset = read_new_entries(path, offset)
+            for entry in entries:
+                pair = source_pair(entry, splits)
+                if pair is None:
+                    continue
+                variants = plan_variants(output_dir, manifest, entry, pair, ratio, seed)
+                if not variants:
+                    continue
+                keys = {variant_seed: key for key, variant_seed, _, _ in variants}
+                future = pool.submit(augment_sample, os.path.join(output_dir, pair[0]),
+                                     os.path.join(output_dir, pair[1]), [v[1:] for v in variants], pair[2])
+                pending[future] = (entry["key"], keys)
+                # Bound the queue so a long manifest does not load every image at once
+                while len(pending) >= workers * 4:
+                    written += collect(manifest, pending, concurrent.futures.FIRST_COMPLETED)
+            written += collect(manifest, pending, concurrent.futures.FIRST_COMPLETED, timeout=0)
+            if not follow and not entries:
+                written += collect(manifest, pending, concurrent.futures.ALL_COMPLETED)
+                break
+            if not entries:
+                time.sleep(poll_seconds)
+    print(f"🎬 Done. Augmented samples written: {written}")
+
+
+def collect(manifest, pending, return_when, timeout=None):
+    if not pending:
+        return 0
+    done, _ = concurrent.futures.wait(pending, timeout=timeout, return_when=return_when)
+    written = 0
+    for future in done:
+        source_key, keys = pending.pop(future)
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"❌ {source_key}: {e}")
+            continue
+        for variant_seed, outputs in results:
+            manifest.record(keys[variant_seed], outputs, source=source_key, view=AUGMENT_VIEW, seed=variant_seed)
+            written += bool(outputs)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write augmented variants of rendered samples.")
+    parser.add_argument('output_dir', help='OUTPUT_DIR of the renderers (holds manifest.jsonl)')
+    parser.add_argument('--ratio', type=int, default=6, help='variants per rendered image')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--splits', nargs='+', default=['train'], help='image splits to augment')
+    parser.add_argument('--follow', action='store_true', help='keep following the manifest until interrupted')
+    args = parser.parse_args()
+    run(args.output_dir, args.ratio, args.seed, args.workers, set(args.splits), args.follow)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# --- BENCHMARK: PER-CALL STILL RENDERS VS ONE BATCHED ANIMATION PASS (Blender.py) ---
+#
+#   blender --background model.blend --python benchmarks/batch_render.py -- --views 40
+#
+# Both modes render the same seeded poses of the first mesh in the open file
+# and report images per minute. One untimed render warms up the engine, and
+# the modes alternate order over --rounds with the scene reset in between, so
+# neither mode is timed against the other's warm caches.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import bpy
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_DIR)
+from render_farm import CONFIG_ENV
+
+# Blender.py creates its OUTPUT_DIR tree on import, so point it at a temp dir first
+OUT_DIR = tempfile.mkdtemp(prefix='renderbox_bench_')
+os.environ[CONFIG_ENV] = json.dumps(dict(json.loads(os.environ.get(CONFIG_ENV) or '{}'), OUTPUT_DIR=OUT_DIR))
+import Blender as pipeline
+
+MODES = ('per-call', 'batched')
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='batch_render.py')
+    parser.add_argument('--views', type=int, default=pipeline.NUM_IMAGES_PER_FILE)
+    parser.add_argument('--engine', help='e.g. CYCLES, BLENDER_EEVEE, BLENDER_WORKBENCH')
+    parser.add_argument('--samples', type=int, help='Cycles samples')
+    parser.add_argument('--rounds', type=int, default=2, help='timed runs per mode, in alternating order')
+    return parser.parse_args(argv)
+
+
+def scene_state(scene):
+    return scene.render.use_persistent_data, scene.render.filepath, scene.frame_start, scene.frame_end
+
+
+def reset_scene(scene, state):
+    # The batched pass turns on persistent data and changes the frame range
+    (scene.render.use_persistent_data, scene.render.filepath, scene.frame_start, scene.frame_end) = state
+    for animated in (scene.camera, *(o for o in scene.objects if o.type == 'MESH')):
+        animated.animation_data_clear()
+    scene.frame_set(scene.frame_start)
+
+
+def run(mode, obj, geom, views):
+    start = time.perf_counter()
+    if mode == 'batched':
+        results = pipeline.render_views_batched(obj, geom, f"bench_{mode}", views, True)
+    else:
+        results = {}
+        for j, seed in views:
+            random.seed(seed)
+            results[j] = pipeline.render_and_save(obj, geom, f"bench_{mode}", j, True)
+    elapsed = time.perf_counter() - start
+    images = sum(bool(outputs) for outputs, _ in results.values())
+    return images, elapsed
+
+
+def main():
+    args = parse_args()
+    scene = bpy.context.scene
+    if args.engine:
+        scene.render.engine = args.engine
+    if args.samples and scene.render.engine == 'CYCLES':
+        scene.cycles.samples = args.samples
+    scene.render.resolution_x = pipeline.IMG_SIZE
+    scene.render.resolution_y = pipeline.IMG_SIZE
+    scene.render.image_settings.file_format = 'PNG'
+    pipeline.setup_lighting()
+    pipeline.setup_camera()
+    pipeline.setup_underwater_environment()
+
+    obj = next(o for o in scene.objects if o.type == 'MESH')
+    geom = pipeline.normalize_object(obj, 'bench', pipeline.GEOMETRY_CACHE)
+    views = [(j, pipeline.task_seed(pipeline.RANDOM_SEED, 'bench', obj.name, j)) for j in range(args.views)]
+
+    print(f"Engine: {scene.render.engine}, mesh: {obj.name} ({len(obj.data.vertices)} vertices), "
+          f"views: {len(views)}, rounds: {args.rounds}, output: {OUT_DIR}")
+    state = scene_state(scene)
+    bpy.ops.render.render()  # warm-up: kernels, shaders and textures load outside the timings
+    totals = {mode: [0, 0.0] for mode in MODES}
+    for r in range(args.rounds):
+        for mode in MODES if r % 2 == 0 else MODES[::-1]:
+            reset_scene(scene, state)
+            images, elapsed = run(mode, obj, geom, views)
+            totals[mode][0] += images
+            totals[mode][1] += elapsed
+            print(f"  round {r + 1} {mode:>9}: {images} images in {elapsed:.1f}s")
+    reset_scene(scene, state)
+
+    rates = {}
+    for mode, (images, elapsed) in totals.items():
+        rates[mode] = images / elapsed * 60 if elapsed else 0.0
+        print(f"{mode:>9}: {images} images in {elapsed:.1f}s -> {rates[mode]:.1f} images/min")
+    if rates['per-call']:
+        print(f"Speedup: {rates['batched'] / rates['per-call']:.2f}x")
+
+
+main()
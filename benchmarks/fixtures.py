@@ -0,0 +1,92 @@
+# --- BENCHMARK FIXTURES: PROCEDURAL PROPELLER .BLEND FILES AT FIXED VERTEX COUNTS ---
+#
+#   blender --background --factory-startup --python benchmarks/fixtures.py -- --out bench/fixtures
+#
+# Each fixture is a three-blade propeller (flattened UV spheres around a hub)
+# with roughly the requested vertex count, plus the camera, light and world
+# the scripts expect to find. Nothing is random, so every run of the suite
+# measures identical geometry.
+
+import argparse
+import math
+import os
+import sys
+
+import bmesh
+import bpy
+from mathutils import Matrix
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='fixtures.py')
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--resolution', type=int, default=512)
+    return parser.parse_args(argv)
+
+
+def fixture_path(out_dir, vertices):
+    return os.path.join(out_dir, f"fixture_{vertices}.blend")
+
+
+def add_sphere(bm, vertices, matrix):
+    # A UV sphere has segments * (rings - 1) + 2 vertices; use segments = 2 * rings
+    rings = max(3, round(math.sqrt(vertices / 2)))
+    bmesh.ops.create_uvsphere(bm, u_segments=2 * rings, v_segments=rings, radius=1.0, matrix=matrix)
+
+
+def build_propeller(vertices):
+    bm = bmesh.new()
+    hub = vertices // 10
+    add_sphere(bm, hub, Matrix.Diagonal((0.25, 0.25, 0.25, 1.0)))
+    for k in range(3):
+        blade = (Matrix.Rotation(k * 2 * math.pi / 3, 4, 'Z') @ Matrix.Translation((1.1, 0.0, 0.0))
+                 @ Matrix.Rotation(math.radians(20), 4, 'X') @ Matrix.Diagonal((1.0, 0.25, 0.05, 1.0)))
+        add_sphere(bm, (vertices - hub) // 3, blade)
+
+    mesh = bpy.data.meshes.new("Propeller")
+    bm.to_mesh(mesh)
+    bm.free()
+    return bpy.data.objects.new("Propeller", mesh)
+
+
+def build_fixture(vertices, resolution):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.render.resolution_x = resolution
+    scene.render.resolution_y = resolution
+    scene.world = bpy.data.worlds.new("World")
+
+    obj = build_propeller(vertices)
+    scene.collection.objects.link(obj)
+
+    cam = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    cam.location = (0.0, -3.5, 1.5)
+    cam.rotation_euler = (math.radians(67), 0.0, 0.0)
+    scene.collection.objects.link(cam)
+    scene.camera = cam
+
+    light = bpy.data.objects.new("Light", bpy.data.lights.new("Light", type='SUN'))
+    light.location = (5.0, -5.0, 5.0)
+    scene.collection.objects.link(light)
+    return len(obj.data.vertices)
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    for size in args.sizes:
+        path = fixture_path(args.out, size)
+        if os.path.exists(path):
+            print(f"✅ {path} (cached)")
+            continue
+        actual = build_fixture(size, args.resolution)
+        bpy.ops.wm.save_as_mainfile(filepath=path + '.partial.blend')
+        os.replace(path + '.partial.blend', path)
+        print(f"✅ {path}: {actual} vertices")
+
+
+main()
@@ -0,0 +1,94 @@
+# --- MICRO-BENCHMARK: LABEL PROJECTION WITHOUT BLENDER ---
+#
+#   python benchmarks/labels.py --sizes 1000 1000000 --frames 40
+#
+# Times the labeling.py code paths the scripts use on synthetic point clouds:
+# one view at a time (Blender.py) and a whole spin at once (Animation.py),
+# against the per-frame loop it replaced. Runs in plain Python + NumPy.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_DIR)
+from labeling import project_points, frame_bounds, axis_rotations, frame_boxes
+
+DEFAULT_SIZES = [8, 1_000, 10_000, 100_000, 1_000_000]  # 8: Animation.py's 'bound_box' corners
+
+
+def synthetic_points(n, seed=0):
+    # Unit-size, propeller-flat cloud, like a normalized mesh
+    points = np.random.default_rng(seed).normal(size=(n, 3))
+    points *= (0.5, 0.15, 0.03) / np.abs(points).max(axis=0)
+    return points.astype(np.float32)
+
+
+def look_at_view_proj(location=(0.0, -3.5, 1.5), lens=50.0, sensor=36.0):
+    # Same layout as labeling.camera_view_matrix for a perspective camera aimed at the origin
+    eye = np.array(location)
+    back = eye / np.linalg.norm(eye)
+    right = np.cross((0.0, 0.0, 1.0), back)
+    right /= np.linalg.norm(right)
+    up = np.cross(back, right)
+    view = np.identity(4)
+    view[:3, :3] = np.stack([right, up, back])
+    view[:3, 3] = -view[:3, :3] @ eye
+
+    half = sensor / lens / 2  # frame extent at unit distance
+    fz, span = -1.0, 2 * half
+    proj = np.zeros((4, 4))
+    proj[0] = (fz / span, 0.0, half / span, 0.0)
+    proj[1] = (0.0, fz / span, half / span, 0.0)
+    proj[2] = (0.0, 0.0, -1.0, 0.0)
+    proj[3] = (0.0, 0.0, 1.0, 0.0)
+    return proj @ view
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_label_benchmarks(sizes=DEFAULT_SIZES, frames=40, repeat=3):
+    """Seconds per case, keyed 'labels/<case>/<vertices>'."""
+    view_proj = look_at_view_proj()
+    matrices = axis_rotations(2, np.linspace(0, 2 * np.pi, frames, endpoint=False))
+    results = {}
+    for n in sizes:
+        points = synthetic_points(n)
+        results[f"labels/per_view/{n}"] = best_of(
+            lambda: frame_bounds(project_points(points, matrices[0], view_proj)), repeat)
+        results[f"labels/frame_loop/{n}"] = best_of(
+            lambda: [frame_bounds(project_points(points, m, view_proj)) for m in matrices], repeat)
+        results[f"labels/frame_boxes/{n}"] = best_of(
+            lambda: frame_boxes(points, matrices, view_proj), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time label projection on synthetic meshes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--frames', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run_label_benchmarks(args.sizes, args.frames, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for case, seconds in results.items():
+        print(f"{case:<32}{seconds * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# --- BENCHMARK SUITE: ALL THREE PIPELINES ON PROCEDURAL FIXTURES, WITH A BASELINE ---
+#
+#   python benchmarks/run.py --blender /opt/blender/blender --out bench/results.json
+#   python benchmarks/run.py --blender blender --save-baseline        # record benchmarks/baseline.json
+#   python benchmarks/run.py --labels-only                            # no Blender needed
+#
+# Builds the fixtures (benchmarks/fixtures.py), runs Blender.py, Animation.py
+# and Animation_2.py on each one with a handful of views and a fast engine
+# (RENDERBOX_CONFIG overrides), and collects the per-stage timings from their
+# metrics.jsonl. Results are compared with the stored baseline: a case slower
+# than the baseline by more than --threshold fails the run.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(REPO_DIR)
+from metrics import load_records
+from render_farm import CONFIG_ENV, blender_cmd
+from labels import run_label_benchmarks
+
+PIPELINES = ['Blender.py', 'Animation.py', 'Animation_2.py']
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_ENGINES = ['BLENDER_WORKBENCH', 'BLENDER_EEVEE']
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+MIN_DELTA = 0.01  # seconds; smaller slowdowns are timer noise
+
+
+def pipeline_config(pipeline, views, blend_dir, output_dir, engine, samples, img_size):
+    config = {"BLEND_DIR": blend_dir, "OUTPUT_DIR": output_dir, "IMG_SIZE": img_size,
+              "RENDER_ENGINE": engine, "RENDER_SAMPLES": samples, "METRICS": True}
+    if pipeline == 'Blender.py':
+        config.update(NUM_IMAGES_PER_FILE=views, PROFILE_RATE=0.0)
+    elif pipeline == 'Animation.py':
+        config.update(FRAMES_PER_MODEL=views, PROFILE_RATE=0.0)
+    else:
+        # TOTAL_FRAMES = FPS * VIDEO_DURATION_SECONDS
+        config.update(FPS=views, VIDEO_DURATION_SECONDS=1)
+    return config
+
+
+def summarize_case(records, wall):
+    stages = {}
+    for r in records:
+        if r["kind"] == 'stage':
+            s = stages.setdefault(r["stage"], {"calls": 0, "self": 0.0})
+            s["calls"] += 1
+            s["self"] += r["self"]
+    counts = {}
+    for r in records:
+        if r["kind"] == 'count':
+            counts[r["name"]] = counts.get(r["name"], 0) + r["value"]
+    images = counts.get('images', 0) or counts.get('frames', 0)
+    return {"wall": wall, "images": images, "images_per_hour": images / wall * 3600 if wall else 0.0,
+            "seconds_per_image": wall / images if images else None, "stages": stages}
+
+
+def run_case(blender, pipeline, fixture, engine, args, work_dir):
+    case_dir = tempfile.mkdtemp(prefix='case_', dir=work_dir)
+    blend_dir = os.path.join(case_dir, 'blend')
+    output_dir = os.path.join(case_dir, 'output')
+    os.makedirs(blend_dir)
+    os.makedirs(output_dir)
+    os.symlink(os.path.abspath(fixture), os.path.join(blend_dir, os.path.basename(fixture)))
+
+    config = pipeline_config(pipeline, args.views, blend_dir, output_dir, engine, args.samples, args.img_size)
+    env = dict(os.environ, **{CONFIG_ENV: json.dumps(config)})
+    start = time.perf_counter()
+    proc = subprocess.run(blender_cmd(blender, os.path.join(REPO_DIR, pipeline)), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:])
+        raise RuntimeError(f"{pipeline} exited with code {proc.returncode}")
+
+    metrics_path = os.path.join(output_dir, 'metrics.jsonl')
+    records = load_records(metrics_path) if os.path.exists(metrics_path) else []
+    return summarize_case(records, wall)
+
+
+def build_fixtures(blender, sizes, fixture_dir):
+    subprocess.run([blender, '--background', '--factory-startup', '--python-exit-code', '1',
+                    '--python', os.path.join(BENCH_DIR, 'fixtures.py'), '--',
+                    '--out', fixture_dir, '--sizes', *map(str, sizes)], check=True)
+    return {size: os.path.join(fixture_dir, f"fixture_{size}.blend") for size in sizes}
+
+
+# ---------- BASELINE ----------
+def case_seconds(result):
+    """Comparable timings of one case: seconds per image and per stage call."""
+    if isinstance(result, (int, float)):
+        return {"seconds": result}
+    timings = {"seconds_per_image": result["seconds_per_image"]}
+    for stage, s in result["stages"].items():
+        timings[f"{stage}_per_call"] = s["self"] / s["calls"]
+    return timings
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        base = case_seconds(baseline[case])
+        for name, seconds in case_seconds(result).items():
+            before = base.get(name)
+            if seconds is None or not before:
+                continue
+            if seconds > before * (1 + threshold) and seconds - before > MIN_DELTA:
+                regressions.append((case, name, before, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the render pipelines on procedural fixtures.")
+    parser.add_argument('--blender', default='blender', help='Blender executable')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='fixture vertex counts')
+    parser.add_argument('--engines', nargs='+', default=DEFAULT_ENGINES)
+    parser.add_argument('--pipelines', nargs='+', default=PIPELINES, choices=PIPELINES)
+    parser.add_argument('--views', type=int, default=4, help='images (or video frames) per case')
+    parser.add_argument('--samples', type=int, default=1, help='EEVEE/Cycles samples')
+    parser.add_argument('--img-size', type=int, default=256)
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'renderbox_fixtures'))
+    parser.add_argument('--labels-only', action='store_true', help='only the label micro-benchmarks')
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown, e.g. 0.15 = 15%%')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args()
+
+    results = run_label_benchmarks(args.sizes)
+    if not args.labels_only:
+        fixtures = build_fixtures(args.blender, args.sizes, args.fixtures)
+        work_dir = tempfile.mkdtemp(prefix='renderbox_bench_')
+        for size, fixture in fixtures.items():
+            for engine in args.engines:
+                for pipeline in args.pipelines:
+                    case = f"{pipeline}/{engine}/{size}"
+                    results[case] = run_case(args.blender, pipeline, fixture, engine, args, work_dir)
+                    r = results[case]
+                    print(f"✅ {case}: {r['images']} images in {r['wall']:.1f}s "
+                          f"({r['images_per_hour']:.0f} images/hour)")
+
+    report = {"created": time.strftime('%Y-%m-%d %H:%M:%S'), "machine": platform.platform(),
+              "python": platform.python_version(), "args": vars(args), "results": results}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results: {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for case, name, before, after in regressions:
+        print(f"❌ {case} {name}: {before:.3f}s -> {after:.3f}s (+{after / before - 1:.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"✅ No regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
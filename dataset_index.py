@@ -0,0 +1,388 @@
+# --- STREAMING DATASET INDEX & VECTORIZED LABEL CHECKS ---
+# Walks images/ + labels/ (or shards/) with os.scandir, reads label files on a
+# thread pool in batches and parses each batch with one NumPy call into two
+# columnar tables: one row per sample and one per box. Tables are saved as
+# .npy parts under OUTPUT_DIR/index and memory-mapped when loaded; an update
+# only reads labels that are new or changed since the last one and appends a
+# part, and the newest row of a sample wins. A sample that is both in the
+# files and in a shard exported from them counts once, from the shard.
+# Statistics and anomaly checks are plain array operations over the whole index.
+#
+#   python dataset_index.py update path/to/output            # add what landed since the last update
+#   python dataset_index.py update path/to/output --follow   # ...and keep doing so
+#   python dataset_index.py stats path/to/output --num-classes 3
+#   python dataset_index.py export path/to/output index.npz  # one file a training job loads at once
+
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+from shards import closed_indexes
+
+INDEX_DIR = 'index'
+SPLITS = ['train', 'val']
+IMAGE_EXTS = ('.png', '.webp', '.jpg')
+BATCH = 1 << 16  # label files read and parsed per batch
+MIN_BOX_SIDE = 1e-4  # boxes narrower than this are reported as degenerate
+EDGE_TOLERANCE = 1e-3  # boxes may overhang the frame by this much before they are reported
+
+OK, MALFORMED, UNREADABLE = 0, 1, 2
+SAMPLE_FIELDS = [('split', 'u1'), ('has_image', '?'), ('has_label', '?'), ('status', 'u1'),
+                 ('label_mtime', 'i8'), ('shard', 'i4'), ('n_boxes', 'i4')]
+BOX_DTYPE = np.dtype([('sample', 'i8'), ('class_id', 'i4'), ('x', 'f4'), ('y', 'f4'), ('w', 'f4'), ('h', 'f4')])
+
+
+def sample_dtype(name_len):
+    return np.dtype([('name', f'S{max(name_len, 1)}')] + SAMPLE_FIELDS)
+
+
+# ---------- PARSING ----------
+def parse_labels(texts):
+    """(n_boxes, status, (N, 5) values) for a list of label file contents, in one np.fromstring call."""
+    counts = np.array([len(t.split()) for t in texts], dtype=np.int64)
+    status = np.where(counts % 5 == 0, OK, MALFORMED).astype(np.uint8)
+    good = [t for t, s in zip(texts, status) if s == OK]
+    try:
+        values = np.fromstring(b" ".join(good), sep=" ") if good else np.empty(0)
+    except ValueError:
+        values = None  # a non-numeric token somewhere in the batch
+    if values is None or len(values) != counts[status == OK].sum():
+        values = []
+        for i, t in enumerate(texts):
+            if status[i] != OK:
+                continue
+            try:
+                values.append(np.array(t.split(), dtype=np.float64))
+            except ValueError:
+                status[i] = MALFORMED
+        values = np.concatenate(values) if values else np.empty(0)
+    n_boxes = np.where(status == OK, counts // 5, 0).astype(np.int32)
+    return n_boxes, status, values.reshape(-1, 5)
+
+
+def read_bytes(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def build_part(rows, texts, shard=-1):
+    """Sample and box tables for rows [(name, split, has_image, has_label, label_mtime)] and their label texts."""
+    samples = np.zeros(len(rows), dtype=sample_dtype(max((len(r[0]) for r in rows), default=1)))
+    if not rows:
+        return samples, np.zeros(0, dtype=BOX_DTYPE)
+    names, splits, has_image, has_label, mtimes = zip(*rows)
+    samples['name'] = [n.encode() for n in names]
+    samples['split'] = splits
+    samples['has_image'] = has_image
+    samples['has_label'] = has_label
+    samples['label_mtime'] = mtimes
+    samples['shard'] = shard
+    unreadable = np.array([t is None for t in texts])
+    n_boxes, status, values = parse_labels([t or b"" for t in texts])
+    status[unreadable] = UNREADABLE
+    samples['status'] = status
+    samples['n_boxes'] = n_boxes
+    boxes = np.zeros(len(values), dtype=BOX_DTYPE)
+    boxes['sample'] = np.repeat(np.arange(len(rows)), n_boxes)
+    boxes['class_id'] = values[:, 0]
+    for k, col in enumerate('xywh', start=1):
+        boxes[col] = values[:, k]
+    return samples, boxes
+
+
+# ---------- SCANNING ----------
+def scan_dir(path, exts):
+    """{stem: mtime_ns or None} of the files in path with one of exts (mtimes only for labels)."""
+    found = {}
+    if not os.path.isdir(path):
+        return found
+    with os.scandir(path) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext not in exts or stem.endswith('.partial'):
+                continue
+            found[stem] = entry.stat().st_mtime_ns if ext == '.txt' else None
+    return found
+
+
+def file_changes(output_dir, known):
+    """Rows of samples that are new, changed or gone since known {(split, name): (has_image, label_mtime)}."""
+    rows = []
+    for split_id, split in enumerate(SPLITS):
+        images = scan_dir(os.path.join(output_dir, 'images', split), IMAGE_EXTS)
+        labels = scan_dir(os.path.join(output_dir, 'labels', split), ('.txt',))
+        names = set(images) | set(labels) | {name for s, name in known if s == split_id}
+        for name in names:
+            state = (name in images, labels.get(name, -1))
+            if known.get((split_id, name)) != state:
+                rows.append((name, split_id, state[0], state[1] >= 0, state[1]))
+    return rows
+
+
+def shard_parts(output_dir, indexed_shards):
+    """(shard name, rows, label texts) of every closed shard not indexed yet."""
+    for split_id, split in enumerate(SPLITS):
+        shard_dir = os.path.join(output_dir, 'shards', split)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in closed_indexes(shard_dir):
+            if f"{split}/{name}" in indexed_shards:
+                continue
+            with open(os.path.join(shard_dir, name)) as f:
+                index = json.load(f)
+            rows, texts = [], []
+            with open(os.path.join(shard_dir, index["shard"]), 'rb') as tar:
+                for entry in index["samples"]:
+                    members = entry["members"]
+                    text = None
+                    if 'txt' in members:
+                        offset, size = members['txt']
+                        tar.seek(offset)
+                        text = tar.read(size)
+                    has_image = any(ext in members for ext in ('png', 'webp', 'jpg'))
+                    rows.append((entry["key"], split_id, has_image, text is not None, 0))
+                    texts.append(text)
+            yield f"{split}/{name}", rows, texts
+
+
+# ---------- INDEX ON DISK ----------
+def index_dir(output_dir):
+    return os.path.join(output_dir, INDEX_DIR)
+
+
+def load_state(output_dir):
+    path = os.path.join(index_dir(output_dir), 'state.json')
+    if not os.path.exists(path):
+        return {"parts": 0, "shards": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_part(output_dir, state, samples, boxes):
+    part_dir = os.path.join(index_dir(output_dir), f"part-{state['parts']:06d}")
+    os.makedirs(part_dir, exist_ok=True)
+    np.save(os.path.join(part_dir, 'samples.npy'), samples)
+    np.save(os.path.join(part_dir, 'boxes.npy'), boxes)
+    state['parts'] += 1
+    # The part only counts once the state names it, so a crash mid-save is redone
+    tmp = os.path.join(index_dir(output_dir), 'state.json.partial')
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(index_dir(output_dir), 'state.json'))
+
+
+def newest_rows(samples):
+    """Mask of the newest row per (source, split, name), where the source is files or shards."""
+    keys = np.zeros(len(samples), dtype=[('from_shard', '?'), ('split', 'u1'), ('name', samples.dtype['name'])])
+    keys['from_shard'] = samples['shard'] >= 0
+    keys['split'] = samples['split']
+    keys['name'] = samples['name']
+    # np.unique on the reversed keys finds last occurrences
+    _, last = np.unique(keys[::-1], return_index=True)
+    newest = np.zeros(len(samples), dtype=bool)
+    newest[len(samples) - 1 - last] = True
+    return newest
+
+
+def load_rows(output_dir):
+    """(samples, boxes, shards): every row ever written, boxes pointing into them."""
+    state = load_state(output_dir)
+    parts = []
+    for p in range(state["parts"]):
+        part_dir = os.path.join(index_dir(output_dir), f"part-{p:06d}")
+        parts.append((np.load(os.path.join(part_dir, 'samples.npy'), mmap_mode='r'),
+                      np.load(os.path.join(part_dir, 'boxes.npy'), mmap_mode='r')))
+    if not parts:
+        return np.zeros(0, dtype=sample_dtype(1)), np.zeros(0, dtype=BOX_DTYPE), state["shards"]
+    dtype = sample_dtype(max(s.dtype['name'].itemsize for s, _ in parts))
+    samples = np.concatenate([s.astype(dtype) for s, _ in parts])
+    starts = np.cumsum([0] + [len(s) for s, _ in parts])
+    boxes = np.concatenate([np.asarray(b) for _, b in parts])
+    boxes['sample'] += np.repeat(starts[:-1], [len(b) for _, b in parts])
+    return samples, boxes, state["shards"]
+
+
+def load_index(output_dir):
+    """(samples, boxes, shards): the newest row of every sample that still exists, boxes pointing into it.
+
+    A sample exported to shards from the files it was rendered to is counted once, from the shards.
+    """
+    samples, boxes, shards = load_rows(output_dir)
+    keep = newest_rows(samples)
+    keep &= samples['has_image'] | samples['has_label']  # both files gone: a tombstone
+    in_shards = np.zeros(len(samples), dtype=bool)
+    shard_keys = samples[keep & (samples['shard'] >= 0)][['split', 'name']]
+    if len(shard_keys):
+        file_rows = np.flatnonzero(keep & (samples['shard'] < 0))
+        in_shards[file_rows] = np.isin(samples[file_rows][['split', 'name']], shard_keys)
+    keep &= ~in_shards
+    remap = np.full(len(samples), -1, dtype=np.int64)
+    remap[keep] = np.arange(keep.sum())
+    boxes['sample'] = remap[boxes['sample']]
+    return samples[keep], boxes[boxes['sample'] >= 0], shards
+
+
+def update(output_dir, threads=16, batch=BATCH):
+    """Index what changed since the last update; returns the number of sample rows written."""
+    os.makedirs(index_dir(output_dir), exist_ok=True)
+    state = load_state(output_dir)
+    samples, _, _ = load_rows(output_dir)
+    # Files are compared against the newest file rows, even for samples whose shard copy is current
+    file_rows = samples[newest_rows(samples) & (samples['shard'] < 0)]
+    known = dict(zip(zip(file_rows['split'].tolist(), np.char.decode(file_rows['name']).tolist()),
+                     zip(file_rows['has_image'].tolist(),
+                         np.where(file_rows['has_label'], file_rows['label_mtime'], -1).tolist())))
+    rows = sorted(file_changes(output_dir, known))
+    written = 0
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            paths = [os.path.join(output_dir, 'labels', SPLITS[split], name + '.txt') if has_label else None
+                     for name, split, _, has_label, _ in chunk]
+            # File reads dominate on network storage, so they overlap on threads
+            texts = list(pool.map(lambda p: read_bytes(p) if p else b"", paths))
+            save_part(output_dir, state, *build_part(chunk, texts))
+            written += len(chunk)
+    for shard, shard_rows, texts in shard_parts(output_dir, set(state["shards"])):
+        state["shards"].append(shard)
+        save_part(output_dir, state, *build_part(shard_rows, texts, shard=len(state["shards"]) - 1))
+        written += len(shard_rows)
+    return written
+
+
+# ---------- STATISTICS & ANOMALIES ----------
+def box_anomalies(boxes, num_classes=None):
+    """{name: boolean mask over boxes}."""
+    x, y, w, h = (boxes[c].astype(np.float64) for c in 'xywh')
+    finite = np.isfinite(x) & np.isfinite(y) & np.isfinite(w) & np.isfinite(h)
+    checks = {
+        "non_finite": ~finite,
+        "degenerate": finite & ((w < MIN_BOX_SIDE) | (h < MIN_BOX_SIDE)),
+        "out_of_frame": finite & ((x - w / 2 < -EDGE_TOLERANCE) | (x + w / 2 > 1 + EDGE_TOLERANCE)
+                                  | (y - h / 2 < -EDGE_TOLERANCE) | (y + h / 2 > 1 + EDGE_TOLERANCE)),
+        "negative_class": boxes['class_id'] < 0,
+    }
+    if num_classes is not None:
+        checks["unknown_class"] = boxes['class_id'] >= num_classes
+    return checks
+
+
+def sample_anomalies(samples):
+    has_image, has_label = samples['has_image'], samples['has_label']
+    return {
+        "image_without_label": has_image & ~has_label,
+        "label_without_image": has_label & ~has_image,
+        "empty_label": has_image & has_label & (samples['status'] == OK) & (samples['n_boxes'] == 0),
+        "malformed_label": samples['status'] == MALFORMED,
+        "unreadable_label": samples['status'] == UNREADABLE,
+    }
+
+
+def statistics(samples, boxes, num_classes=None):
+    images = samples['has_image']
+    split_of_box = samples['split'][boxes['sample']]
+    stats = {"samples": int(len(samples)), "boxes": int(len(boxes))}
+    for split_id, split in enumerate(SPLITS):
+        in_split = samples['split'] == split_id
+        classes = boxes['class_id'][(split_of_box == split_id) & (boxes['class_id'] >= 0)]
+        stats[split] = {"images": int((images & in_split).sum()),
+                        "classes": np.bincount(classes, minlength=num_classes or 0).tolist()}
+    stats["train_ratio"] = stats["train"]["images"] / max(int(images.sum()), 1)
+    per_image = samples['n_boxes'][images & samples['has_label']]
+    stats["boxes_per_image"] = {"mean": float(per_image.mean()) if len(per_image) else 0.0,
+                                "max": int(per_image.max(initial=0))}
+    area = (boxes['w'].astype(np.float64) * boxes['h'])[np.isfinite(boxes['w']) & np.isfinite(boxes['h'])]
+    if len(area):
+        stats["box_area_percentiles"] = dict(zip(['p1', 'p5', 'p50', 'p95', 'p99'],
+                                                 np.percentile(area, [1, 5, 50, 95, 99]).round(6).tolist()))
+        # COCO-style size buckets, as a share of a 640x640 frame
+        small, medium = (32 / 640) ** 2, (96 / 640) ** 2
+        stats["box_sizes"] = {"small": int((area < small).sum()),
+                              "medium": int(((area >= small) & (area < medium)).sum()),
+                              "large": int((area >= medium).sum())}
+    return stats
+
+
+def anomaly_report(samples, boxes, num_classes=None):
+    """{check: sample names} over sample- and box-level checks."""
+    names = np.char.decode(samples['name'])
+    split = np.array(SPLITS)[samples['split']]
+    label = np.char.add(np.char.add(split, '/'), names)
+    report = {name: label[mask].tolist() for name, mask in sample_anomalies(samples).items()}
+    for name, mask in box_anomalies(boxes, num_classes).items():
+        report[name + "_box"] = label[np.unique(boxes['sample'][mask])].tolist()
+    return report
+
+
+# ---------- EXPORT ----------
+def export(output_dir, path, compress=False):
+    """One .npz with column arrays; a sample's boxes are box_* rows box_start[i]:box_start[i + 1]."""
+    samples, boxes, shards = load_index(output_dir)
+    order = np.argsort(boxes['sample'], kind='stable')
+    boxes = boxes[order]
+    box_start = np.zeros(len(samples) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(boxes['sample'], minlength=len(samples)), out=box_start[1:])
+    columns = {f"sample_{name}": samples[name] for name in samples.dtype.names}
+    columns.update({f"box_{name}": boxes[name] for name in BOX_DTYPE.names if name != 'sample'})
+    columns["box_start"] = box_start
+    columns["splits"] = np.array(SPLITS)
+    columns["shards"] = np.array(shards, dtype=str)
+    tmp = path + '.partial.npz'
+    (np.savez_compressed if compress else np.savez)(tmp, **columns)
+    os.replace(tmp, path)
+    return len(samples), len(boxes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar index, statistics and checks of a generated dataset.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    up = sub.add_parser('update', help='index outputs that are new or changed')
+    up.add_argument('output_dir')
+    up.add_argument('--threads', type=int, default=16, help='concurrent label file reads')
+    up.add_argument('--follow', type=float, nargs='?', const=60.0, metavar='SECONDS',
+                    help='keep updating every SECONDS (default 60)')
+    st = sub.add_parser('stats', help='statistics and anomaly counts')
+    st.add_argument('output_dir')
+    st.add_argument('--num-classes', type=int, default=None, help='class ids at or above this are anomalies')
+    st.add_argument('--show', type=int, default=5, help='sample names listed per anomaly')
+    st.add_argument('--report', help='write every anomalous sample name to this JSON file')
+    ex = sub.add_parser('export', help='write the index as one .npz')
+    ex.add_argument('output_dir')
+    ex.add_argument('path')
+    ex.add_argument('--compress', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'update':
+        while True:
+            start = time.time()
+            written = update(args.output_dir, args.threads)
+            print(f"📇 {written} sample rows indexed in {time.time() - start:.1f}s")
+            if args.follow is None:
+                break
+            time.sleep(args.follow)
+    elif args.command == 'stats':
+        samples, boxes, _ = load_index(args.output_dir)
+        print(json.dumps(statistics(samples, boxes, args.num_classes), indent=2))
+        report = anomaly_report(samples, boxes, args.num_classes)
+        for name, found in report.items():
+            if found:
+                print(f"⚠️ {name}: {len(found)} (e.g. {', '.join(found[:args.show])})")
+        if not any(report.values()):
+            print("✅ No anomalies")
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+    else:
+        n_samples, n_boxes = export(args.output_dir, args.path, args.compress)
+        print(f"📦 {n_samples} samples, {n_boxes} boxes -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
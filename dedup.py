@@ -0,0 +1,123 @@
+# --- GEOMETRY FINGERPRINTS FOR DUPLICATE .BLEND INPUTS ---
+# Two fingerprints per file, both blind to translation and uniform scale:
+#   hash  SHA1 of the vertex set after centering, scaling to unit size and
+#         quantizing -- equal for exact copies, rescales and re-exports
+#   d2    Osada's D2 shape distribution: a histogram of distances between
+#         random surface points, divided by their mean -- close for
+#         near-duplicates, even retessellated or rotated ones
+# Files are grouped when their hashes match or their D2 histograms are within
+# an L1 distance threshold (threshold 0: hashes only). D2 matches link by single
+# linkage, so a chain of similar meshes can form one group. Fingerprints are
+# cached by blend content hash.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FINGERPRINT_VERSION = 1
+D2_BINS = 64
+D2_POINTS = 1024
+D2_RANGE = 3.0  # histogram covers distances up to 3x the mean
+
+
+def unit_normalize(vertices):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    size = (hi - lo).max()
+    return (vertices - (lo + hi) / 2) / (size if size > 0 else 1.0)
+
+
+def vertex_hash(vertices, decimals=3):
+    quantized = np.round(unit_normalize(vertices) * 10 ** decimals).astype(np.int64)
+    return hashlib.sha1(np.unique(quantized, axis=0).tobytes()).hexdigest()
+
+
+def surface_samples(vertices, triangles, n, seed=0):
+    """n points spread uniformly over the triangle surface (vertices if there are no faces)."""
+    rng = np.random.default_rng(seed)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    if len(triangles) == 0:
+        return vertices[rng.integers(0, len(vertices), n)]
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    area = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    if area.sum() == 0:
+        return vertices[rng.integers(0, len(vertices), n)]
+    pick = rng.choice(len(area), n, p=area / area.sum())
+    r1, r2 = np.sqrt(rng.random(n))[:, None], rng.random(n)[:, None]
+    return (1 - r1) * a[pick] + r1 * (1 - r2) * b[pick] + r1 * r2 * c[pick]
+
+
+def d2_descriptor(vertices, triangles, points=D2_POINTS, bins=D2_BINS, seed=0):
+    samples = surface_samples(vertices, np.asarray(triangles, dtype=np.int64).reshape(-1, 3), points, seed)
+    diff = samples[:, None, :] - samples[None, :, :]
+    dist = np.sqrt((diff ** 2).sum(axis=-1))[np.triu_indices(points, k=1)]
+    mean = dist.mean()
+    hist, _ = np.histogram(dist / (mean if mean > 0 else 1.0), bins=bins, range=(0.0, D2_RANGE))
+    return hist / max(hist.sum(), 1)
+
+
+def fingerprint(vertices, triangles):
+    return {"version": FINGERPRINT_VERSION, "vertices": len(vertices),
+            "hash": vertex_hash(vertices), "d2": d2_descriptor(vertices, triangles).round(6).tolist()}
+
+
+# ---------- CACHE ----------
+class FingerprintCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, blend_hash):
+        return os.path.join(self.cache_dir, f"{blend_hash}.json")
+
+    def get(self, blend_hash):
+        try:
+            with open(self.path(blend_hash)) as f:
+                fp = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return fp if fp.get("version") == FINGERPRINT_VERSION else None
+
+    def put(self, blend_hash, fp):
+        # Farm workers fingerprint the same files; per-process temp names keep the writes atomic
+        tmp = f"{self.path(blend_hash)}.{os.getpid()}.partial"
+        with open(tmp, 'w') as f:
+            json.dump(fp, f)
+        os.replace(tmp, self.path(blend_hash))
+
+
+# ---------- GROUPING ----------
+def duplicate_groups(fingerprints, threshold=0.05):
+    """Partition {name: fingerprint} into sorted groups of duplicates, largest group first."""
+    names = sorted(fingerprints)
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        parent[find(i)] = find(j)
+
+    by_hash = {}
+    for i, name in enumerate(names):
+        h = fingerprints[name]["hash"]
+        if h in by_hash:
+            union(i, by_hash[h])
+        by_hash.setdefault(h, i)
+
+    if threshold > 0 and names:
+        d2 = np.array([fingerprints[name]["d2"] for name in names])
+        for i in range(len(names)):
+            near = np.flatnonzero(np.abs(d2[i + 1:] - d2[i]).sum(axis=1) <= threshold) + i + 1
+            for j in near:
+                union(i, j)
+
+    groups = {}
+    for i, name in enumerate(names):
+        groups.setdefault(find(i), []).append(name)
+    return sorted(groups.values(), key=lambda g: (-len(g), g[0]))
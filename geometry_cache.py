@@ -0,0 +1,127 @@
+# --- NORMALIZED GEOMETRY CACHE ---
+# Each mesh is normalized (transforms baked, scaled to unit size) once per
+# object instead of once per view. The result -- normalized vertices,
+# dimensions, convex-hull vertex indices and a bounding sphere -- is stored as
+# an .npz keyed by the .blend content hash, so reruns skip the operators and
+# labels can be computed without reopening the source file. Entries are named
+# after the object's name in the file (mesh_library.source_name), which an
+# appended copy keeps even when the template scene renames it.
+#
+# The hull index is also stored on its own: it is invariant under the affine
+# normalization, so it serves both normalized and untouched meshes.
+
+import os
+import re
+
+import bmesh
+import bpy
+import numpy as np
+
+from labeling import mesh_vertices
+from mesh_library import source_name
+
+
+def cache_path(cache_dir, blend_hash, obj_name):
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', obj_name)
+    return os.path.join(cache_dir, f"{blend_hash}_{safe_name}.npz")
+
+
+def load_geometry(cache_dir, blend_hash, obj_name):
+    path = cache_path(cache_dir, blend_hash, obj_name)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+def save_geometry(cache_dir, blend_hash, obj_name, geom):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(cache_dir, blend_hash, obj_name)
+    # Chunk workers of one video all cache the same object; per-process temp names keep the writes atomic
+    tmp = f"{path}.{os.getpid()}.partial"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **geom)
+    os.replace(tmp, path)
+
+
+def hull_cache_path(cache_dir, blend_hash, obj_name):
+    return cache_path(cache_dir, blend_hash, obj_name)[:-len('.npz')] + '.hull.npy'
+
+
+def convex_hull_index(mesh):
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(mesh)
+        bm.verts.index_update()
+        result = bmesh.ops.convex_hull(bm, input=bm.verts)
+        index = sorted({e.index for e in result['geom'] if isinstance(e, bmesh.types.BMVert)})
+    except (RuntimeError, ValueError):
+        index = []  # flat or degenerate mesh
+    finally:
+        bm.free()
+    if not index:
+        return np.arange(len(mesh.vertices), dtype=np.int32)
+    return np.array(index, dtype=np.int32)
+
+
+def hull_index(obj, blend_hash, cache_dir):
+    path = hull_cache_path(cache_dir, blend_hash, source_name(obj))
+    if os.path.exists(path):
+        index = np.load(path)
+        if len(index) and index.max() < len(obj.data.vertices):
+            return index
+
+    index = convex_hull_index(obj.data)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.partial"
+    with open(tmp, 'wb') as f:
+        np.save(f, index)
+    os.replace(tmp, path)
+    return index
+
+
+def describe_geometry(obj, blend_hash, cache_dir):
+    vertices = mesh_vertices(obj.data)
+    hull = hull_index(obj, blend_hash, cache_dir)
+    hull_points = vertices[hull].astype(np.float64)
+    lo, hi = hull_points.min(axis=0), hull_points.max(axis=0)
+    center = (lo + hi) / 2
+    radius = np.linalg.norm(hull_points - center, axis=1).max()
+    return {
+        'vertices': vertices,
+        'dimensions': np.array(obj.dimensions, dtype=np.float64),
+        'hull': hull,
+        'sphere_center': center,
+        'sphere_radius': np.array(radius),
+    }
+
+
+def reset_transform(obj):
+    obj.location = (0.0, 0.0, 0.0)
+    obj.rotation_euler = (0.0, 0.0, 0.0)
+    obj.scale = (1.0, 1.0, 1.0)
+
+
+def normalize_object(obj, blend_hash, cache_dir):
+    """Bake transforms and scale obj to unit size, once; returns its cached geometry."""
+    geom = load_geometry(cache_dir, blend_hash, source_name(obj))
+    if geom is not None and len(geom['vertices']) == len(obj.data.vertices):
+        obj.data.vertices.foreach_set('co', geom['vertices'].ravel())
+        obj.data.update()
+        reset_transform(obj)
+        return geom
+
+    bpy.ops.object.select_all(action='DESELECT')
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+
+    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    max_dim = max(obj.dimensions)
+    if max_dim > 0:
+        scale_factor = 1.0 / max_dim
+        obj.scale = (scale_factor, scale_factor, scale_factor)
+        bpy.ops.object.transform_apply(scale=True)
+
+    geom = describe_geometry(obj, blend_hash, cache_dir)
+    save_geometry(cache_dir, blend_hash, source_name(obj), geom)
+    return geom
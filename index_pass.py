@@ -0,0 +1,72 @@
+# --- OBJECT-INDEX PASS AND RENDER PIXELS READ BACK THROUGH THE COMPOSITOR ---
+# Cycles writes every object's pass_index into the IndexOB render pass. A
+# Viewer node wired to that pass leaves it in bpy.data.images['Viewer Node']
+# after each render, so labels come from the render that is being done anyway:
+# one foreach_get into an (H, W) array, no extra files, and the same cost for
+# a 10-vertex mesh as for a 10-million-vertex one (see labeling.index_boxes).
+# The same Viewer node can carry the rendered image itself (RENDER_HANDOFF
+# 'memory' in Blender.py); with both, the index rides in the alpha channel.
+
+import bpy
+import numpy as np
+
+VIEWER_NAME = 'RenderBox Index'
+SET_ALPHA_NAME = 'RenderBox Index Alpha'
+
+
+def enable_viewer(scene, view_layer, image=False, index=True):
+    """Wire the rendered image and/or the object-index pass into the Viewer node."""
+    if index and scene.render.engine != 'CYCLES':
+        raise ValueError(f"the object-index pass needs Cycles, not {scene.render.engine}")
+    if index:
+        view_layer.use_pass_object_index = True
+    scene.use_nodes = True
+    tree = scene.node_tree
+    layers = next((n for n in tree.nodes if n.type == 'R_LAYERS'), None) or tree.nodes.new('CompositorNodeRLayers')
+    if not any(n.type == 'COMPOSITE' for n in tree.nodes):
+        # A fresh tree needs its Composite node, or nothing is saved
+        composite = tree.nodes.new('CompositorNodeComposite')
+        tree.links.new(layers.outputs['Image'], composite.inputs['Image'])
+    viewer = tree.nodes.get(VIEWER_NAME) or tree.nodes.new('CompositorNodeViewer')
+    viewer.name = VIEWER_NAME
+    viewer.use_alpha = image and index
+    if image and index:
+        set_alpha = tree.nodes.get(SET_ALPHA_NAME) or tree.nodes.new('CompositorNodeSetAlpha')
+        set_alpha.name = SET_ALPHA_NAME
+        set_alpha.mode = 'REPLACE_ALPHA'  # 'APPLY' would also multiply the color by the index
+        tree.links.new(layers.outputs['Image'], set_alpha.inputs['Image'])
+        tree.links.new(layers.outputs['IndexOB'], set_alpha.inputs['Alpha'])
+        tree.links.new(set_alpha.outputs['Image'], viewer.inputs['Image'])
+    else:
+        tree.links.new(layers.outputs['Image' if image else 'IndexOB'], viewer.inputs['Image'])
+    if image:
+        # read_viewer returns scene-linear pixels; the Standard view transform is
+        # the plain sRGB curve that async_writer.to_uint8 applies to them
+        scene.view_settings.view_transform = 'Standard'
+        scene.view_settings.look = 'None'
+    tree.nodes.active = viewer
+
+
+def enable_index_pass(scene, view_layer):
+    enable_viewer(scene, view_layer, image=False, index=True)
+
+
+def read_viewer():
+    """The last render's Viewer node pixels as an (H, W, 4) float32 array, row 0 at the top."""
+    image = bpy.data.images['Viewer Node']
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    # Image pixels start at the bottom row
+    return pixels.reshape(height, width, 4)[::-1]
+
+
+def read_index_pass(pixels=None):
+    """The last render's object-index pass as an (H, W) int32 array, row 0 at the top.
+
+    pixels: a read_viewer() array from enable_viewer(image=True, index=True),
+    whose alpha channel holds the index.
+    """
+    if pixels is not None:
+        return np.rint(pixels[..., 3]).astype(np.int32)
+    return np.rint(read_viewer()[..., 0]).astype(np.int32)
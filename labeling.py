@@ -0,0 +1,242 @@
+# --- VECTORIZED 2D BOX PROJECTION ---
+# NumPy replacement for calling world_to_camera_view once per vertex. The
+# combined world -> view -> projection matrix reproduces world_to_camera_view
+# exactly: x, y are normalized frame coordinates and z is the depth in front
+# of the camera.
+
+import numpy as np
+
+# frame_boxes handles up to this many points for all frames at once; beyond it
+# the (F, N) temporaries cost more than one project_points call per frame
+# (benchmarks/labels.py: the crossover is at about 1-2k points)
+BATCH_MAX_POINTS = 1024
+
+
+def mesh_vertices(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    return co.reshape(-1, 3)
+
+
+def bound_box_corners(obj):
+    return np.array([tuple(c) for c in obj.bound_box], dtype=np.float64)
+
+
+def camera_view_matrix(scene, cam):
+    frame = cam.data.view_frame(scene=scene)
+    min_x, max_x = frame[2].x, frame[1].x
+    min_y, max_y = frame[1].y, frame[0].y
+    span_x, span_y = max_x - min_x, max_y - min_y
+
+    proj = np.zeros((4, 4))
+    if cam.data.type != 'ORTHO':
+        # x = (fz * cx / cz - min_x) / span_x, divided through by w = cz
+        fz = frame[0].z
+        proj[0] = (fz / span_x, 0.0, -min_x / span_x, 0.0)
+        proj[1] = (0.0, fz / span_y, -min_y / span_y, 0.0)
+        proj[3] = (0.0, 0.0, 1.0, 0.0)
+    else:
+        proj[0] = (1.0 / span_x, 0.0, 0.0, -min_x / span_x)
+        proj[1] = (0.0, 1.0 / span_y, 0.0, -min_y / span_y)
+        proj[3] = (0.0, 0.0, 0.0, 1.0)
+    proj[2] = (0.0, 0.0, -1.0, 0.0)
+
+    view = np.array(cam.matrix_world.normalized().inverted(), dtype=np.float64)
+    return proj @ view
+
+
+def _divide(clip):
+    w = clip[..., 3:]
+    coords = np.empty(clip.shape[:-1] + (3,))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(clip[..., :2], w, out=coords[..., :2])
+    coords[..., 2] = clip[..., 2]
+    on_plane = w[..., 0] == 0.0
+    if on_plane.any():
+        coords[on_plane, :2] = 0.5  # world_to_camera_view maps these to the frame center
+    return coords
+
+
+def project_points(points, matrix_world, view_proj):
+    m = view_proj @ np.array(matrix_world, dtype=np.float64)
+    clip = np.asarray(points, dtype=np.float64) @ m[:, :3].T + m[:, 3]
+    return _divide(clip)
+
+
+def frame_bounds(coords):
+    x, y = coords[:, 0], coords[:, 1]
+    inside = (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1)
+    if not inside.any():
+        return None
+    x, y = x[inside], y[inside]
+    return x.min(), x.max(), y.min(), y.max()
+
+
+def clipped_bounds(coords):
+    # Box of the points in front of the camera, clipped to the frame. Fed the
+    # convex-hull vertices this is exactly the full mesh's box.
+    in_front = coords[:, 2] > 0
+    if not in_front.any():
+        return None
+    x, y = coords[in_front, 0], coords[in_front, 1]
+    x_min, x_max = max(x.min(), 0.0), min(x.max(), 1.0)
+    y_min, y_max = max(y.min(), 0.0), min(y.max(), 1.0)
+    if x_min >= x_max or y_min >= y_max:
+        return None
+    return x_min, x_max, y_min, y_max
+
+
+def amodal_bounds(coords):
+    """Box of the points in front of the camera, not clipped to the frame."""
+    in_front = coords[:, 2] > 0
+    if not in_front.any():
+        return None
+    x, y = coords[in_front, 0], coords[in_front, 1]
+    return x.min(), x.max(), y.min(), y.max()
+
+
+def occlusion_clip(boxes, depths):
+    """Clip (N, 4) boxes (x_min, x_max, y_min, y_max) by every box nearer the camera.
+
+    Returns the bounds of what is left of each box (NaN rows if nothing) and its
+    visible area fraction. Boxes stand in for silhouettes, so occlusion is
+    over-estimated where the nearer object does not fill its box.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    clipped = np.full_like(boxes, np.nan)
+    visible = np.zeros(len(boxes))
+    valid = ~np.isnan(boxes).any(axis=1)
+    order = [i for i in np.argsort(depths, kind='stable') if valid[i]]
+    for rank, i in enumerate(order):
+        box, occluders = boxes[i], boxes[order[:rank]]
+        # Cut the box along every occluder edge inside it; each cell is then
+        # either fully covered or fully visible
+        xs = np.unique(np.clip(np.concatenate([box[:2], occluders[:, :2].ravel()]), box[0], box[1]))
+        ys = np.unique(np.clip(np.concatenate([box[2:], occluders[:, 2:].ravel()]), box[2], box[3]))
+        mx, my = (xs[:-1] + xs[1:]) / 2, (ys[:-1] + ys[1:]) / 2
+        covered = np.zeros((len(mx), len(my)), dtype=bool)
+        for o in occluders:
+            covered |= ((mx > o[0]) & (mx < o[1]))[:, None] & ((my > o[2]) & (my < o[3]))[None, :]
+        area = np.diff(xs)[:, None] * np.diff(ys)[None, :]
+        if area.sum() <= 0 or covered.all():
+            continue
+        visible[i] = area[~covered].sum() / area.sum()
+        fx, fy = np.nonzero(~covered)
+        clipped[i] = xs[fx].min(), xs[fx + 1].max(), ys[fy].min(), ys[fy + 1].max()
+    return clipped, visible
+
+
+# ---------- OBJECT-INDEX PASS ----------
+def index_boxes(index_map, ids):
+    """Tight boxes of each id in an (H, W) object-index map, row 0 at the top.
+
+    Returns (len(ids), 4) bounds in frame coordinates (x right, y up, as
+    frame_bounds), NaN rows for ids without pixels, and each id's pixel count.
+    The cost is O(H * W) however many vertices the meshes have.
+    """
+    index_map = np.asarray(index_map, dtype=np.int64)
+    h, w = index_map.shape
+    ids = np.asarray(ids, dtype=np.int64)
+    lut = np.full(max(int(index_map.max(initial=0)), int(ids.max(initial=0))) + 1, -1, dtype=np.int64)
+    lut[ids] = np.arange(len(ids))
+    slot = lut[index_map]
+    rows, cols = np.nonzero(slot >= 0)
+    slot = slot[rows, cols]
+    counts = np.bincount(slot, minlength=len(ids))
+
+    in_row = np.zeros((len(ids), h), dtype=bool)
+    in_col = np.zeros((len(ids), w), dtype=bool)
+    in_row[slot, rows] = True
+    in_col[slot, cols] = True
+    top, bottom = in_row.argmax(axis=1), h - 1 - in_row[:, ::-1].argmax(axis=1)
+    left, right = in_col.argmax(axis=1), w - 1 - in_col[:, ::-1].argmax(axis=1)
+    boxes = np.stack([left / w, (right + 1) / w, 1 - (bottom + 1) / h, 1 - top / h], axis=1)
+    boxes[counts == 0] = np.nan
+    return boxes, counts
+
+
+def visible_fractions(index_map, ids, counts, amodal, depths):
+    """Share of each object that made it into the image.
+
+    The pixels of an object are weighed against themselves plus the pixels of
+    nearer ids inside its projected, unclipped (amodal) box, and the result is
+    scaled by the share of that box inside the frame.
+    """
+    index_map = np.asarray(index_map)
+    h, w = index_map.shape
+    ids, depths = np.asarray(ids), np.asarray(depths, dtype=np.float64)
+    fractions = np.zeros(len(ids))
+    for i, (x0, x1, y0, y1) in enumerate(np.asarray(amodal, dtype=np.float64)):
+        if not counts[i] or not (x1 > x0 and y1 > y0):  # also False for NaN
+            continue
+        cx0, cx1, cy0, cy1 = np.clip((x0, x1, y0, y1), 0.0, 1.0)
+        in_frame = (cx1 - cx0) * (cy1 - cy0) / ((x1 - x0) * (y1 - y0))
+        window = index_map[int((1 - cy1) * h):int(np.ceil((1 - cy0) * h)), int(cx0 * w):int(np.ceil(cx1 * w))]
+        hidden = np.isin(window, ids[depths < depths[i]]).sum()
+        fractions[i] = in_frame * counts[i] / (counts[i] + hidden)
+    return fractions
+
+
+# ---------- MANY FRAMES AT ONCE ----------
+def axis_rotations(axis_idx, angles):
+    """4x4 rotation matrices about X, Y or Z (0, 1, 2) for each angle."""
+    angles = np.asarray(angles, dtype=np.float64)
+    c, s = np.cos(angles), np.sin(angles)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis_idx]
+    rot = np.zeros((len(angles), 4, 4))
+    rot[:, axis_idx, axis_idx] = 1.0
+    rot[:, 3, 3] = 1.0
+    rot[:, i, i] = c
+    rot[:, i, j] = -s
+    rot[:, j, i] = s
+    rot[:, j, j] = c
+    return rot
+
+
+def spin_world_matrices(obj, axis_idx, angles):
+    """obj's matrix_world with rotation_euler = angle about axis_idx, for each angle.
+
+    matrix_world = parent chain @ T @ R(angle) @ S, without the depsgraph.
+    """
+    prefix = np.identity(4)
+    if obj.parent:
+        prefix = np.array(obj.parent.matrix_world) @ np.array(obj.matrix_parent_inverse)
+    loc = np.identity(4)
+    loc[:3, 3] = tuple(obj.location)
+    scale = np.diag(tuple(obj.scale) + (1.0,))
+    return prefix @ loc @ axis_rotations(axis_idx, angles) @ scale
+
+
+def frame_boxes(points, matrices_world, view_proj, clipped=False, max_elements=1 << 18):
+    """Bounds of points under each of F world matrices, as an (F, 4) array of
+    (x_min, x_max, y_min, y_max). Rows are NaN where frame_bounds (or
+    clipped_bounds, if clipped) would return None."""
+    points = np.asarray(points, dtype=np.float64)
+    boxes = np.full((len(matrices_world), 4), np.nan)
+    if len(points) > BATCH_MAX_POINTS:
+        bounds = clipped_bounds if clipped else frame_bounds
+        for f, matrix_world in enumerate(matrices_world):
+            box = bounds(project_points(points, matrix_world, view_proj))
+            if box is not None:
+                boxes[f] = box
+        return boxes
+    step = max(1, max_elements // max(len(points), 1))
+    for start in range(0, len(matrices_world), step):
+        m = view_proj @ matrices_world[start:start + step]
+        clip = points @ m[:, :, :3].transpose(0, 2, 1) + m[:, None, :, 3]
+        coords = _divide(clip)
+        x, y = coords[..., 0], coords[..., 1]
+        if clipped:
+            keep = coords[..., 2] > 0
+        else:
+            keep = (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1)
+
+        box = np.stack([np.where(keep, x, np.inf).min(axis=1), np.where(keep, x, -np.inf).max(axis=1),
+                        np.where(keep, y, np.inf).min(axis=1), np.where(keep, y, -np.inf).max(axis=1)], axis=1)
+        valid = keep.any(axis=1)
+        if clipped:
+            box = np.clip(box, 0.0, 1.0)
+            valid &= (box[:, 0] < box[:, 1]) & (box[:, 2] < box[:, 3])
+        box[~valid] = np.nan
+        boxes[start:start + step] = box
+    return boxes
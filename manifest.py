@@ -0,0 +1,92 @@
+# --- RESUMABLE RUNS: APPEND-ONLY JSONL MANIFEST OF COMPLETED UNITS ---
+# One line per finished unit (blend file hash, object, view/frame, seed) with
+# its output paths. Outputs are written to a temp path and renamed into place,
+# so a path that exists is complete and a crash costs at most one unit.
+
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_tag(blend_hash, blend_file):
+    """Short name for one input file in output names: content hash plus path hash.
+
+    The path part keeps byte-identical copies of a file (kept apart under
+    DEDUP = 'group') from writing to the same outputs.
+    """
+    return f"{blend_hash[:8]}{hashlib.sha1(blend_file.encode()).hexdigest()[:4]}"
+
+
+def unit_key(blend_hash, obj_name, view, seed):
+    return f"{blend_hash}:{obj_name}:{view}:{seed}"
+
+
+def temp_path(path):
+    # Keep the extension last so Blender doesn't append its own
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial{ext}"
+
+
+def commit_file(tmp, path):
+    os.replace(tmp, path)
+
+
+def write_text_atomic(path, text):
+    tmp = temp_path(path)
+    with open(tmp, 'w') as f:
+        f.write(text)
+    commit_file(tmp, path)
+
+
+def write_bytes_atomic(path, data):
+    tmp = temp_path(path)
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    commit_file(tmp, path)
+
+
+class Manifest:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.done = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                lines = f.readlines()
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-append
+                self.done[entry["key"]] = entry["outputs"]
+            if lines and not lines[-1].endswith("\n"):
+                self._append("\n")
+
+    def is_done(self, key):
+        outputs = self.done.get(key)
+        if outputs is None:
+            return False
+        return all(os.path.exists(os.path.join(self.output_dir, p)) for p in outputs)
+
+    def record(self, key, outputs, **fields):
+        outputs = [os.path.relpath(p, self.output_dir) for p in outputs]
+        self._append(json.dumps(dict(fields, key=key, outputs=outputs)) + "\n")
+        self.done[key] = outputs
+
+    def _append(self, text):
+        # A single O_APPEND write keeps lines intact when several workers share the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, text.encode())
+        finally:
+            os.close(fd)
@@ -0,0 +1,80 @@
+# --- TEMPLATE SCENES: APPEND ONLY THE MESHES OF A .BLEND ---
+# bpy.ops.wm.open_mainfile replaces the whole scene, so the camera, lights
+# and world have to be rebuilt for every input. Appending just the mesh
+# objects through bpy.data.libraries.load keeps a prepared template scene
+# alive; unload_meshes() removes them again and purges everything they
+# dragged in (mesh data, materials, node trees, actions).
+#
+# Appending renames an object whose name is already taken in the template
+# (Cube -> Cube.001), so each appended mesh keeps its name in the file as a
+# custom property; source_name() is what seeds and cache keys use.
+
+import bpy
+import numpy as np
+
+from labeling import mesh_vertices
+
+SOURCE_NAME = 'source_name'
+
+
+def load_meshes(blend_path, collection):
+    """Append the mesh objects of blend_path into collection; returns them."""
+    with bpy.data.libraries.load(blend_path, link=False) as (data_from, data_to):
+        names = list(data_from.objects)
+        data_to.objects = list(names)  # filled in place with the appended objects
+
+    objects = [obj for obj in data_to.objects if obj is not None]
+    meshes = [obj for obj in objects if obj.type == 'MESH']
+    for name, obj in zip(names, data_to.objects):
+        if obj is not None and obj.type == 'MESH':
+            obj[SOURCE_NAME] = name
+    # Parents are not kept, so bake their transform in as open_mainfile would show it
+    matrices = [obj.matrix_world.copy() for obj in meshes]
+    for obj in objects:
+        if obj.type != 'MESH':
+            bpy.data.objects.remove(obj, do_unlink=True)
+    for obj, matrix_world in zip(meshes, matrices):
+        obj.parent = None
+        obj.matrix_world = matrix_world
+        collection.objects.link(obj)
+    return meshes
+
+
+def source_name(obj):
+    """obj's name in its .blend file, whether it was opened or appended."""
+    return obj.get(SOURCE_NAME, obj.name)
+
+
+def clear_meshes(scene):
+    """Empty a template scene of meshes, e.g. the startup file's default cube."""
+    unload_meshes([obj for obj in scene.objects if obj.type == 'MESH'])
+
+
+def purge_orphans():
+    if hasattr(bpy.data, 'orphans_purge'):
+        bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+    else:
+        bpy.ops.outliner.orphans_purge(do_recursive=True)
+
+
+def unload_meshes(meshes):
+    for obj in meshes:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    purge_orphans()
+
+
+def mesh_geometry(meshes):
+    """World-space vertices and triangle indices of meshes, concatenated."""
+    vertices, triangles, offset = [], [], 0
+    for obj in meshes:
+        mesh = obj.data
+        m = np.array(obj.matrix_world, dtype=np.float64)
+        vertices.append(mesh_vertices(mesh).astype(np.float64) @ m[:3, :3].T + m[:3, 3])
+        mesh.calc_loop_triangles()
+        tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get('vertices', tris)
+        triangles.append(tris.reshape(-1, 3).astype(np.int64) + offset)
+        offset += len(mesh.vertices)
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(vertices), np.concatenate(triangles)
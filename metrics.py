@@ -0,0 +1,176 @@
+# --- STAGE TIMING & PROFILING: JSONL METRICS SHARED BY ALL SCRIPTS ---
+# Each `with metrics.stage(name):` block appends one line with its wall time,
+# self time (wall minus nested stages), CPU time and the process's peak RSS.
+# Counters (images, poses, ...) are appended the same way, so a farm of
+# workers can share one file. A sampled subset of units can also be run
+# under cProfile or pyinstrument.
+#
+#   python metrics.py summary path/to/output/metrics.jsonl
+
+import argparse
+import cProfile
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_NAME = 'metrics.jsonl'
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+def sampled(unit, rate):
+    if rate <= 0:
+        return False
+    return int(hashlib.sha1(str(unit).encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
+
+
+class Metrics:
+    def __init__(self, output_dir, script, enabled=True, profile_rate=0.0, profiler='cprofile'):
+        self.path = os.path.join(output_dir, METRICS_NAME)
+        self.profile_dir = os.path.join(output_dir, 'profiles')
+        self.script = script
+        self.enabled = enabled
+        self.profile_rate = profile_rate
+        self.profiler = profiler
+        self.stack = []
+
+    @contextmanager
+    def stage(self, name, **fields):
+        if not self.enabled:
+            yield
+            return
+        frame = {"children": 0.0}
+        self.stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1]["children"] += wall
+            self._append(dict(fields, kind='stage', stage=name, wall=wall, self=wall - frame["children"],
+                              cpu=cpu, peak_rss_mb=peak_rss_mb(), depth=len(self.stack)))
+
+    def count(self, name, value=1, **fields):
+        if self.enabled and value:
+            self._append(dict(fields, kind='count', name=name, value=value))
+
+    @contextmanager
+    def profile(self, unit):
+        """Run the block under the configured profiler for a sampled subset of units."""
+        if not self.enabled or not sampled(unit, self.profile_rate):
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{self.script}_{unit}")
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("⚠️ pyinstrument is not installed, falling back to cProfile")
+            else:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    with open(os.path.join(self.profile_dir, name + '.html'), 'w') as f:
+                        f.write(profiler.output_html())
+                return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(self.profile_dir, name + '.prof'))
+
+    def _append(self, record):
+        record = dict(record, ts=time.time(), script=self.script, pid=os.getpid())
+        # A single O_APPEND write keeps lines intact when several workers share the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record) + "\n").encode())
+        finally:
+            os.close(fd)
+
+
+# ---------- SUMMARY REPORT ----------
+def load_records(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # torn last line from a crash mid-append
+    return records
+
+
+def summarize(records, top=15):
+    stages, counts = {}, {}
+    first, last = float('inf'), float('-inf')
+    peak = 0.0
+    for r in records:
+        if r["kind"] == 'stage':
+            s = stages.setdefault((r["script"], r["stage"]), {"calls": 0, "wall": 0.0, "self": 0.0, "cpu": 0.0})
+            s["calls"] += 1
+            s["wall"] += r["wall"]
+            s["self"] += r["self"]
+            s["cpu"] += r["cpu"]
+            peak = max(peak, r.get("peak_rss_mb") or 0.0)
+            first = min(first, r["ts"] - r["wall"])
+        else:
+            counts[r["name"]] = counts.get(r["name"], 0) + r["value"]
+            first = min(first, r["ts"])
+        last = max(last, r["ts"])
+
+    total_self = sum(s["self"] for s in stages.values()) or 1.0
+    print(f"{'script':<16}{'stage':<20}{'calls':>8}{'self s':>10}{'share':>8}{'wall s':>10}{'cpu s':>10}{'mean ms':>10}")
+    for (script, name), s in sorted(stages.items(), key=lambda kv: -kv[1]["self"])[:top]:
+        print(f"{script:<16}{name:<20}{s['calls']:>8}{s['self']:>10.1f}{s['self'] / total_self:>8.1%}"
+              f"{s['wall']:>10.1f}{s['cpu']:>10.1f}{s['wall'] / s['calls'] * 1000:>10.1f}")
+
+    span_h = max(last - first, 1e-9) / 3600 if records else 0.0
+    for name, value in sorted(counts.items()):
+        print(f"📈 {name}: {value}")
+    if span_h:
+        print(f"⏱️ Span: {span_h * 60:.1f} min, Throughput: {counts.get('images', 0) / span_h:.0f} images/hour, "
+              f"Peak RSS: {peak:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize stage metrics written by the render scripts.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    summary = sub.add_parser('summary', help='hot stages and throughput')
+    summary.add_argument('path', help='metrics.jsonl (or the output dir containing it)')
+    summary.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    path = args.path
+    if os.path.isdir(path):
+        path = os.path.join(path, METRICS_NAME)
+    summarize(load_records(path), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+# --- RENDER FARM LAUNCHER: RUNS N HEADLESS BLENDER WORKERS OVER A SHARDED .BLEND QUEUE ---
+#
+#   python render_farm.py --workers 16
+#   python render_farm.py --video --workers 16
+#   python render_farm.py --daemon path/to/spool --workers 4
+#   python render_farm.py --queue path/to/queue --workers 4      # on each node
+#
+# The plan (file order, train/val split) is computed once by Blender.py itself
+# (`-- --plan`), so a farm run writes the same dataset as a serial run.
+#
+# With --video, each Animation_2.py video is split into frame-range chunks
+# that render in parallel as lossless PNG sequences; once all chunks of a
+# video are in, ffmpeg encodes them with the script's own FFMPEG settings.
+#
+# With --daemon, N resident Blender.py workers pull jobs from a spool
+# directory (spool.py submit) and are restarted whenever they recycle
+# themselves; jobs a crashed worker held are put back in the queue.
+#
+# With --queue, N Blender.py workers on this node pull units from a
+# work_queue.py queue shared with other nodes until it is finished.
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from manifest import Manifest, temp_path
+import spool
+import work_queue
+
+PROGRESS_PREFIX = "RENDERBOX_PROGRESS "
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Blender.py')
+VIDEO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Animation_2.py')
+
+# Blender's constant_rate_factor presets as libx264/libx265 -crf values
+CRF_VALUES = {'LOSSLESS': 0, 'PERC_LOSSLESS': 17, 'HIGH': 20, 'MEDIUM': 23,
+              'LOW': 26, 'VERYLOW': 29, 'LOWEST': 32}
+FFMPEG_CODECS = {'H264': 'libx264', 'H265': 'libx265', 'MPEG4': 'mpeg4', 'AV1': 'libaom-av1', 'WEBM': 'libvpx-vp9'}
+FFMPEG_FORMATS = {'MPEG4': 'mp4', 'MKV': 'matroska', 'QUICKTIME': 'mov', 'WEBM': 'webm', 'AVI': 'avi', 'OGG': 'ogg'}
+
+
+# ---------- PLANNING (shared with Blender.py) ----------
+def plan_tasks(blend_files, train_ratio, seed, groups=None):
+    """Shuffled train/val split. With groups (lists of duplicate files), whole
+    groups are assigned to one split; files outside every group stand alone."""
+    grouped = {f for group in groups or [] for f in group}
+    units = sorted([sorted(group) for group in groups or []] + [[f] for f in blend_files if f not in grouped])
+    random.Random(seed).shuffle(units)
+    train_cutoff = int(train_ratio * len(units))
+    return [{"blend_file": f, "is_train": i < train_cutoff} for i, unit in enumerate(units) for f in unit]
+
+
+def list_blend_files(blend_dir, class_map=None):
+    """.blend files in blend_dir, plus those in its per-class subdirectories (e.g. 'propeller/x.blend')."""
+    files = [f for f in os.listdir(blend_dir) if f.endswith('.blend')]
+    for name in class_map or {}:
+        class_dir = os.path.join(blend_dir, name)
+        if os.path.isdir(class_dir):
+            files += [f"{name}/{f}" for f in os.listdir(class_dir) if f.endswith('.blend')]
+    return files
+
+
+def class_of(blend_file, class_map):
+    """(name, YOLO id) of a file: its directory if that is a class, else the first class."""
+    name = os.path.basename(os.path.dirname(blend_file))
+    if name not in class_map:
+        name = next(iter(class_map))
+    return name, class_map[name]
+
+
+def task_seed(seed, *parts):
+    # e.g. task_seed(RANDOM_SEED, blend_file, obj.name, view_idx)
+    key = ":".join(str(p) for p in (seed, *parts)).encode()
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], 'little')
+
+
+def report_progress(event, **fields):
+    print(PROGRESS_PREFIX + json.dumps(dict(fields, event=event)), flush=True)
+
+
+# ---------- CONFIG OVERRIDES (shared with the Blender scripts) ----------
+CONFIG_ENV = 'RENDERBOX_CONFIG'
+
+
+def apply_config_overrides(namespace):
+    """Replace CONFIG values in a script's globals from JSON in $RENDERBOX_CONFIG."""
+    for name, value in json.loads(os.environ.get(CONFIG_ENV) or '{}').items():
+        if name not in namespace:
+            raise KeyError(f"{CONFIG_ENV}: unknown CONFIG value {name}")
+        namespace[name] = value
+
+
+def apply_render_settings(scene, engine=None, samples=None):
+    if engine:
+        try:
+            scene.render.engine = engine
+        except TypeError:
+            # Blender 4.2-4.4 name EEVEE 'BLENDER_EEVEE_NEXT'
+            scene.render.engine = engine + '_NEXT'
+    if samples:
+        if scene.render.engine == 'CYCLES':
+            scene.cycles.samples = samples
+        elif scene.render.engine.startswith('BLENDER_EEVEE'):
+            scene.eevee.taa_render_samples = samples
+
+
+def shard_tasks(tasks, num_shards):
+    shards = [tasks[i::num_shards] for i in range(num_shards)]
+    return [s for s in shards if s]
+
+
+# ---------- WORKERS ----------
+def blender_cmd(blender, script, *args):
+    return [blender, '--background', '--python-exit-code', '1', '--python', script, '--', *args]
+
+
+def make_plan(blender, script, work_dir):
+    plan_path = os.path.join(work_dir, 'plan.json')
+    subprocess.run(blender_cmd(blender, script, '--plan', plan_path), check=True)
+    with open(plan_path) as f:
+        return json.load(f)
+
+
+def start_worker(blender, script, worker_id, shard, work_dir, events, quiet):
+    tasks_path = os.path.join(work_dir, f'tasks_{worker_id}.json')
+    with open(tasks_path, 'w') as f:
+        json.dump({"tasks": shard}, f)
+    return spawn_worker(blender, script, worker_id, ['--tasks', tasks_path], events, quiet)
+
+
+def spawn_worker(blender, script, worker_id, script_args, events, quiet):
+    proc = subprocess.Popen(blender_cmd(blender, script, *script_args),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, bufsize=1)
+
+    def pump():
+        for line in proc.stdout:
+            if line.startswith(PROGRESS_PREFIX):
+                events.put(('progress', worker_id, json.loads(line[len(PROGRESS_PREFIX):])))
+            elif not quiet:
+                sys.stdout.write(f"[w{worker_id}] {line}")
+        events.put(('exit', worker_id, proc.wait()))
+
+    threading.Thread(target=pump, daemon=True).start()
+    return proc
+
+
+def run_farm(blender, script, num_workers, max_retries=2, quiet=False):
+    work_dir = tempfile.mkdtemp(prefix='renderbox_farm_')
+    plan = make_plan(blender, script, work_dir)
+    tasks = plan["tasks"]
+    pending = shard_tasks(tasks, num_workers)
+    attempts = {t["blend_file"]: 0 for t in tasks}
+    done, failed = set(), []
+    running = {}
+    events = queue.Queue()
+    next_id = 0
+    images, poses = 0, 0
+    start = time.time()
+
+    print(f"🚜 {len(tasks)} files, {len(pending)} shards, {num_workers} workers")
+    while pending or running:
+        while pending and len(running) < num_workers:
+            shard = pending.pop(0)
+            running[next_id] = shard
+            start_worker(blender, script, next_id, shard, work_dir, events, quiet)
+            next_id += 1
+
+        kind, worker_id, payload = events.get()
+        if kind == 'progress':
+            if payload["event"] == 'view':
+                images += payload["rendered"]
+                poses += payload["poses"]
+            elif payload["event"] == 'file_done':
+                done.add(payload["blend_file"])
+                rate = images / max(time.time() - start, 1e-9) * 60
+                print(f"✅ [w{worker_id}] {payload['blend_file']} "
+                      f"({len(done)}/{len(tasks)} files, {images} images, {rate:.1f} img/min)")
+            continue
+
+        shard = running.pop(worker_id)
+        remaining = [t for t in shard if t["blend_file"] not in done]
+        if not remaining:
+            continue
+        print(f"❌ [w{worker_id}] exited with code {payload}, {len(remaining)} files left in shard")
+        retry = []
+        for t in remaining:
+            attempts[t["blend_file"]] += 1
+            if attempts[t["blend_file"]] > max_retries:
+                failed.append(t["blend_file"])
+            else:
+                retry.append(t)
+        if retry:
+            pending.append(retry)
+
+    acceptance = images / poses if poses else 0.0
+    print(f"🎬 Done. Files: {len(done)}/{len(tasks)}, Images: {images}, "
+          f"Pose acceptance: {acceptance:.1%}, Elapsed: {time.time() - start:.0f}s")
+    for blend_file in failed:
+        print(f"⚠️ Gave up on {blend_file} after {max_retries} retries")
+    return not failed
+
+
+# ---------- VIDEO CHUNKS ----------
+def frame_chunks(first, last, num_chunks):
+    size = -(-(last - first + 1) // num_chunks)
+    return [(s, min(s + size - 1, last)) for s in range(first, last + 1, size)]
+
+
+def mux_video(ffmpeg, frames_dir, job):
+    video_path = job["video_path"]
+    cmd = [ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(job["fps"]),
+           '-start_number', str(job["frame_start"]), '-i', os.path.join(frames_dir, 'frame_%04d.png'),
+           '-frames:v', str(job["frame_end"] - job["frame_start"] + 1),
+           '-c:v', FFMPEG_CODECS.get(job["codec"], 'libx264'), '-g', str(job["gopsize"]), '-pix_fmt', 'yuv420p']
+    if job["crf"] in CRF_VALUES and job["codec"] in ('H264', 'H265'):
+        cmd += ['-crf', str(CRF_VALUES[job["crf"]])]
+    else:
+        cmd += ['-b:v', f"{job['bitrate']}k"]
+    # The container follows the job's ffmpeg.format, not the file extension
+    cmd += ['-f', FFMPEG_FORMATS.get(job["format"], 'mp4')]
+    tmp_path = temp_path(video_path)
+    try:
+        subprocess.run(cmd + [tmp_path], check=True)
+    except subprocess.CalledProcessError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, video_path)
+    outputs = [video_path] + ([job["sidecar"]] if job.get("sidecar") else [])
+    Manifest(job["output_dir"]).record(job["key"], outputs, blend_file=job["blend_file"],
+                                       object=job["object"], view='video', seed=job["seed"])
+
+
+def run_video_farm(blender, script, num_workers, num_chunks, ffmpeg='ffmpeg', max_retries=2, quiet=False,
+                   keep_frames=False):
+    work_dir = tempfile.mkdtemp(prefix='renderbox_video_')
+    plan = make_plan(blender, script, work_dir)
+    chunks = frame_chunks(1, plan["total_frames"], num_chunks)
+    pending = []
+    frames_dirs = {}
+    for i, task in enumerate(plan["tasks"]):
+        frames_dirs[task["blend_file"]] = os.path.join(work_dir, f'video_{i:04d}')
+        pending += [(task["blend_file"], chunk) for chunk in chunks]
+    left = {blend_file: len(chunks) for blend_file in frames_dirs}
+    attempts = {unit: 0 for unit in pending}
+    completed, failed = set(), []
+    gave_up, mux_failed = set(), []
+    running = {}
+    events = queue.Queue()
+    next_id = 0
+    videos = 0
+    start = time.time()
+
+    print(f"🚜 {len(frames_dirs)} videos, {len(chunks)} chunks each, {num_workers} workers")
+    while pending or running:
+        while pending and len(running) < num_workers:
+            blend_file, chunk = unit = pending.pop(0)
+            running[next_id] = unit
+            spawn_worker(blender, script, next_id, ['--blend', blend_file, '--chunk', *map(str, chunk),
+                                                    '--frames-dir', frames_dirs[blend_file]], events, quiet)
+            next_id += 1
+
+        kind, worker_id, payload = events.get()
+        if kind == 'progress':
+            if payload["event"] == 'chunk_done':
+                completed.add(running[worker_id])
+            continue
+
+        unit = running.pop(worker_id)
+        blend_file, chunk = unit
+        if unit not in completed and blend_file not in gave_up:
+            attempts[unit] += 1
+            print(f"❌ [w{worker_id}] {blend_file} frames {chunk[0]}-{chunk[1]} failed (code {payload})")
+            if attempts[unit] <= max_retries:
+                pending.append(unit)
+                continue
+            # Without this chunk the video cannot be muxed: drop its queued chunks and
+            # clean up once the running ones are back
+            failed.append(unit)
+            gave_up.add(blend_file)
+            left[blend_file] -= sum(1 for u in pending if u[0] == blend_file)
+            pending = [u for u in pending if u[0] != blend_file]
+
+        left[blend_file] -= 1
+        if left[blend_file]:
+            continue
+        frames_dir = frames_dirs[blend_file]
+        try:
+            if blend_file not in gave_up:
+                with open(os.path.join(frames_dir, 'video.json')) as f:
+                    job = json.load(f)
+                if not job.get("done"):
+                    mux_video(ffmpeg, frames_dir, job)
+                    videos += 1
+                    print(f"✅ {blend_file} -> {job['video_path']}")
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            # One video failing to mux does not stop the others
+            mux_failed.append((blend_file, e))
+            print(f"❌ {blend_file}: muxing failed: {e}")
+        finally:
+            if keep_frames:
+                print(f"🗂️ Frames of {blend_file} kept in {frames_dir}")
+            else:
+                shutil.rmtree(frames_dir, ignore_errors=True)
+
+    print(f"🎬 Done. Videos: {videos}/{len(frames_dirs)}, Elapsed: {time.time() - start:.0f}s")
+    for blend_file, chunk in failed:
+        print(f"⚠️ Gave up on {blend_file} frames {chunk[0]}-{chunk[1]} after {max_retries} retries")
+    for blend_file, error in mux_failed:
+        print(f"⚠️ Could not mux {blend_file}: {error}")
+    return not failed and not mux_failed
+
+
+# ---------- RESIDENT WORKERS ----------
+def run_daemons(blender, script, num_workers, spool_dir, until_empty=False, max_retries=2, quiet=False):
+    events = queue.Queue()
+    workers = {}
+    next_id = 0
+    jobs = 0
+    start = time.time()
+
+    print(f"🚜 {num_workers} resident workers on {spool_dir}")
+    try:
+        while True:
+            while len(workers) < num_workers:
+                worker_id = f"w{next_id}-{os.getpid()}"
+                workers[worker_id] = spawn_worker(blender, script, worker_id,
+                                                  ['--daemon', spool_dir, '--worker-id', worker_id], events, quiet)
+                next_id += 1
+
+            try:
+                kind, worker_id, payload = events.get(timeout=1.0)
+            except queue.Empty:
+                counts = spool.status(spool_dir)
+                if until_empty and not counts['queue'] and not counts['running']:
+                    break
+                continue
+            if kind == 'progress':
+                if payload["event"] == 'job_done':
+                    jobs += 1
+                    print(f"✅ [{worker_id}] {payload['blend_file']}: {payload['rendered']} images "
+                          f"({jobs} jobs, {jobs / max(time.time() - start, 1e-9) * 3600:.0f} jobs/hour)")
+                continue
+
+            del workers[worker_id]
+            requeued = spool.requeue_orphans(spool_dir, worker_id, max_retries + 1)
+            if payload != 0 or requeued:
+                print(f"❌ [{worker_id}] exited with code {payload}, {requeued} jobs requeued")
+    finally:
+        for proc in workers.values():
+            proc.terminate()
+        for worker_id, proc in workers.items():
+            proc.wait()
+            spool.requeue_orphans(spool_dir, worker_id, max_retries + 1)
+    print(f"🎬 Done. Jobs: {jobs}, Elapsed: {time.time() - start:.0f}s")
+    return not spool.status(spool_dir)['failed']
+
+
+# ---------- SHARED WORK QUEUE ----------
+def run_queue_workers(blender, script, num_workers, queue_dir, quiet=False):
+    """Keep num_workers Blender.py --queue workers running until the queue is finished.
+
+    A crashed worker's unit is reclaimed by lease expiry, here or on any other node.
+    """
+    events = queue.Queue()
+    workers = {}
+    next_id = 0
+    units = 0
+    start = time.time()
+
+    print(f"🚜 {num_workers} queue workers on {socket.gethostname()} -> {queue_dir}")
+    try:
+        while True:
+            while len(workers) < num_workers and not work_queue.finished(queue_dir):
+                worker_id = f"q{next_id}-{os.getpid()}"
+                workers[worker_id] = spawn_worker(blender, script, worker_id,
+                                                  ['--queue', queue_dir, '--worker-id', worker_id], events, quiet)
+                next_id += 1
+            if not workers:
+                break
+
+            kind, worker_id, payload = events.get()
+            if kind == 'progress':
+                if payload["event"] == 'job_done':
+                    units += 1
+                    print(f"✅ [{worker_id}] {payload['blend_file']}: {payload['rendered']} images "
+                          f"({units} units here, {units / max(time.time() - start, 1e-9) * 3600:.0f} units/hour)")
+                continue
+            del workers[worker_id]
+            if payload != 0:
+                print(f"❌ [{worker_id}] exited with code {payload}; its unit returns once the lease expires")
+    finally:
+        for proc in workers.values():
+            proc.terminate()
+        for proc in workers.values():
+            proc.wait()
+    counts = work_queue.status(queue_dir)
+    print(f"🎬 Done. Units here: {units}, Queue: {', '.join(f'{k}: {v}' for k, v in counts.items())}, "
+          f"Elapsed: {time.time() - start:.0f}s")
+    return not counts["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render Blender.py across N headless Blender workers.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--blender', default='blender', help='Blender executable')
+    parser.add_argument('--script', default=None, help='defaults to Blender.py, or Animation_2.py with --video')
+    parser.add_argument('--max-retries', type=int, default=2,
+                        help='times a file is requeued after its worker crashes')
+    parser.add_argument('--quiet', action='store_true', help='hide worker log output')
+    parser.add_argument('--video', action='store_true',
+                        help='render Animation_2.py videos as parallel frame-range chunks and mux them')
+    parser.add_argument('--chunks', type=int, default=None, help='chunks per video (default: --workers)')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg executable used to mux chunks')
+    parser.add_argument('--keep-frames', action='store_true', help='with --video, keep the chunk frames after muxing')
+    parser.add_argument('--daemon', metavar='SPOOL',
+                        help='keep resident Blender.py workers pulling jobs from this spool directory')
+    parser.add_argument('--until-empty', action='store_true', help='with --daemon, stop once the spool is drained')
+    parser.add_argument('--queue', metavar='QUEUE',
+                        help='run Blender.py workers on units of this work_queue.py queue (shared across nodes)')
+    args = parser.parse_args()
+    if args.queue:
+        ok = run_queue_workers(args.blender, args.script or DEFAULT_SCRIPT, args.workers, args.queue, args.quiet)
+    elif args.daemon:
+        ok = run_daemons(args.blender, args.script or DEFAULT_SCRIPT, args.workers, args.daemon,
+                         args.until_empty, args.max_retries, args.quiet)
+    elif args.video:
+        ok = run_video_farm(args.blender, args.script or VIDEO_SCRIPT, args.workers,
+                            args.chunks or args.workers, args.ffmpeg, args.max_retries, args.quiet,
+                            args.keep_frames)
+    else:
+        ok = run_farm(args.blender, args.script or DEFAULT_SCRIPT, args.workers, args.max_retries, args.quiet)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# --- SHARDED TAR OUTPUT (WebDataset layout) ---
+# Samples are streamed as <key>.png / <key>.txt / <key>.json members into
+# size-bounded tar shards, one directory per split. Every shard gets a JSON
+# index with the byte offset of each member, so a reader can seek straight to
+# any sample without unpacking anything. The index is written before the tar
+# is renamed into place, so a shard counts as closed once its .tar exists;
+# readers skip an index whose tar is missing.
+#
+#   python shards.py export path/to/dataset path/to/shards
+#   python shards.py get path/to/shards/train 1234 out_dir
+
+import argparse
+import bisect
+import io
+import json
+import os
+import tarfile
+import time
+import uuid
+
+SHARD_MAX_BYTES = 1 << 30
+BLOCK = tarfile.BLOCKSIZE
+
+
+def index_path(shard_path):
+    return shard_path[:-len('.tar')] + '.idx.json'
+
+
+class ShardWriter:
+    def __init__(self, out_dir, prefix='shard', max_bytes=SHARD_MAX_BYTES):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        # A per-writer token keeps shard names unique, so a shard lost in a crash
+        # is never replaced by a different one under the same name
+        self.prefix = f"{prefix}-{uuid.uuid4().hex[:8]}"
+        self.max_bytes = max_bytes
+        self.count = 0
+        self.tar = None
+
+    def _open(self):
+        self.path = os.path.join(self.out_dir, f"{self.prefix}-{self.count:06d}.tar")
+        self.tar = tarfile.open(self.path + '.partial', 'w', format=tarfile.GNU_FORMAT)
+        self.samples = []
+        self.count += 1
+
+    def write(self, key, members):
+        """Append one sample ({extension: bytes}); returns the path its shard will have."""
+        if self.tar is None:
+            self._open()
+        entry = {"key": key, "members": {}}
+        for ext, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{ext}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.tar.addfile(info, io.BytesIO(data))
+            # The data ends on the block boundary the writer has just reached
+            data_offset = self.tar.offset - -(-info.size // BLOCK) * BLOCK
+            entry["members"][ext] = [data_offset, info.size]
+        self.samples.append(entry)
+
+        path = self.path
+        if self.tar.offset >= self.max_bytes:
+            self.close()
+        return path
+
+    def close(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        with open(index_path(self.path) + '.partial', 'w') as f:
+            json.dump({"shard": os.path.basename(self.path), "samples": self.samples}, f)
+        os.replace(index_path(self.path) + '.partial', index_path(self.path))
+        # The manifest records the .tar path, so this rename is what marks the shard done
+        os.replace(self.path + '.partial', self.path)
+        self.tar = None
+
+
+def closed_indexes(shard_dir):
+    """Index file names of the shards in shard_dir whose tar is in place, sorted."""
+    names = sorted(os.listdir(shard_dir))
+    present = set(names)
+    return [name for name in names
+            if name.endswith('.idx.json') and name[:-len('.idx.json')] + '.tar' in present]
+
+
+class ShardReader:
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self.indexes = []
+        self.starts = []
+        total = 0
+        for name in closed_indexes(shard_dir):
+            with open(os.path.join(shard_dir, name)) as f:
+                index = json.load(f)
+            self.indexes.append(index)
+            self.starts.append(total)
+            total += len(index["samples"])
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.total:
+            raise IndexError(i)
+        s = bisect.bisect_right(self.starts, i) - 1
+        index = self.indexes[s]
+        entry = index["samples"][i - self.starts[s]]
+        sample = {"__key__": entry["key"]}
+        with open(os.path.join(self.shard_dir, index["shard"]), 'rb') as f:
+            for ext, (offset, size) in entry["members"].items():
+                f.seek(offset)
+                sample[ext] = f.read(size)
+        return sample
+
+
+# ---------- EXPORT EXISTING DIRECTORY DATASETS ----------
+def export_directory(dataset_dir, out_dir, max_bytes=SHARD_MAX_BYTES):
+    for split in ['train', 'val']:
+        img_dir = os.path.join(dataset_dir, 'images', split)
+        lbl_dir = os.path.join(dataset_dir, 'labels', split)
+        if not os.path.isdir(img_dir):
+            continue
+        writer = ShardWriter(os.path.join(out_dir, split), max_bytes=max_bytes)
+        exported = 0
+        with os.scandir(img_dir) as entries:
+            names = sorted(e.name for e in entries if e.is_file() and not e.name.endswith('.partial.png'))
+        for name in names:
+            key, ext = os.path.splitext(name)
+            members = {}
+            with open(os.path.join(img_dir, name), 'rb') as f:
+                members[ext[1:]] = f.read()
+            label_path = os.path.join(lbl_dir, key + '.txt')
+            if os.path.exists(label_path):
+                with open(label_path, 'rb') as f:
+                    members['txt'] = f.read()
+            members['json'] = json.dumps({"split": split, "source": name}).encode()
+            writer.write(key, members)
+            exported += 1
+        writer.close()
+        print(f"✅ {split}: {exported} samples -> {writer.count} shards")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write and read tar-sharded datasets.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='convert an images/ + labels/ tree into shards')
+    export.add_argument('dataset_dir')
+    export.add_argument('out_dir')
+    export.add_argument('--max-bytes', type=int, default=SHARD_MAX_BYTES)
+    get = sub.add_parser('get', help='extract one sample by index from a split directory')
+    get.add_argument('shard_dir')
+    get.add_argument('index', type=int)
+    get.add_argument('out_dir')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_directory(args.dataset_dir, args.out_dir, args.max_bytes)
+    else:
+        sample = ShardReader(args.shard_dir)[args.index]
+        os.makedirs(args.out_dir, exist_ok=True)
+        key = sample.pop("__key__")
+        for ext, data in sample.items():
+            with open(os.path.join(args.out_dir, f"{key}.{ext}"), 'wb') as f:
+                f.write(data)
+        print(f"{key}: {', '.join(sorted(sample))}")
+
+
+if __name__ == "__main__":
+    main()
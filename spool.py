@@ -0,0 +1,127 @@
+# --- JOB SPOOL FOR RESIDENT BLENDER WORKERS ---
+# A directory queue: jobs are JSON files that move queue/ -> running/ ->
+# done/ (or failed/) by os.rename, which is atomic, so any number of workers
+# can pull from one spool without a server. A job names a .blend, a view
+# count and a seed.
+#
+#   python spool.py submit path/to/spool model.blend --views 4 --seed 7
+#   python spool.py status path/to/spool
+
+import argparse
+import json
+import os
+import time
+import uuid
+
+STATES = ['queue', 'running', 'done', 'failed']
+
+
+def spool_dirs(spool_dir):
+    dirs = {state: os.path.join(spool_dir, state) for state in STATES + ['tmp']}
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+
+def write_job(path, job):
+    tmp = path + '.partial'
+    with open(tmp, 'w') as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp, path)
+
+
+def submit(spool_dir, blend_file, views, seed, is_train=True):
+    dirs = spool_dirs(spool_dir)
+    name = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}.json"
+    job = {"blend_file": os.path.abspath(blend_file), "views": views, "seed": seed,
+           "is_train": is_train, "attempts": 0}
+    # Written outside queue/ first so a worker never claims a half-written job
+    write_job(os.path.join(dirs['tmp'], name), job)
+    os.replace(os.path.join(dirs['tmp'], name), os.path.join(dirs['queue'], name))
+    return name
+
+
+def claim(spool_dir, worker=None):
+    """Move the oldest queued job to running/; returns (name, job) or None."""
+    dirs = spool_dirs(spool_dir)
+    worker = worker or os.getpid()
+    for name in sorted(os.listdir(dirs['queue'])):
+        if not name.endswith('.json'):
+            continue
+        running = os.path.join(dirs['running'], f"{name}.{worker}")
+        try:
+            os.rename(os.path.join(dirs['queue'], name), running)
+        except FileNotFoundError:
+            continue  # another worker got it first
+        with open(running) as f:
+            return name, json.load(f)
+    return None
+
+
+def _close(spool_dir, name, state, worker=None, **fields):
+    dirs = spool_dirs(spool_dir)
+    running = os.path.join(dirs['running'], f"{name}.{worker or os.getpid()}")
+    with open(running) as f:
+        job = json.load(f)
+    write_job(os.path.join(dirs[state], name), dict(job, **fields))
+    os.remove(running)
+
+
+def finish(spool_dir, name, result, worker=None):
+    _close(spool_dir, name, 'done', worker, result=result)
+
+
+def fail(spool_dir, name, error, worker=None):
+    _close(spool_dir, name, 'failed', worker, error=error)
+
+
+def requeue_orphans(spool_dir, worker, max_attempts=3):
+    """Return the jobs a dead worker was running to the queue; returns how many."""
+    dirs = spool_dirs(spool_dir)
+    suffix = f".{worker}"
+    requeued = 0
+    for entry in os.listdir(dirs['running']):
+        if not entry.endswith(suffix):
+            continue
+        name = entry[:-len(suffix)]
+        with open(os.path.join(dirs['running'], entry)) as f:
+            job = json.load(f)
+        job["attempts"] = job.get("attempts", 0) + 1
+        if job["attempts"] >= max_attempts:
+            write_job(os.path.join(dirs['failed'], name), dict(job, error=f"worker {worker} died"))
+        else:
+            write_job(os.path.join(dirs['queue'], name), job)
+            requeued += 1
+        os.remove(os.path.join(dirs['running'], entry))
+    return requeued
+
+
+def status(spool_dir):
+    dirs = spool_dirs(spool_dir)
+    return {state: sum(n.endswith('.json') or '.json.' in n for n in os.listdir(dirs[state]))
+            for state in STATES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submit jobs to resident Blender.py workers.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('submit', help='queue one .blend')
+    add.add_argument('spool_dir')
+    add.add_argument('blend_files', nargs='+')
+    add.add_argument('--views', type=int, default=40)
+    add.add_argument('--seed', type=int, default=42)
+    add.add_argument('--val', action='store_true', help='write to the val split')
+    show = sub.add_parser('status', help='count jobs per state')
+    show.add_argument('spool_dir')
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        for blend_file in args.blend_files:
+            name = submit(args.spool_dir, blend_file, args.views, args.seed, not args.val)
+            print(f"📥 {blend_file} -> {name}")
+    else:
+        print(", ".join(f"{state}: {n}" for state, n in status(args.spool_dir).items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Checks the vectorized projection in labeling.py against a NumPy port of
+# bpy_extras.object_utils.world_to_camera_view, one vertex at a time, so it
+# runs without Blender. The stub camera has what both read: data.view_frame,
+# data.type and matrix_world.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labeling import (BATCH_MAX_POINTS, camera_view_matrix, clipped_bounds, frame_bounds, frame_boxes,
+                      project_points, spin_world_matrices)
+
+TOLERANCE = 1e-6
+
+
+class Vec:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class Matrix:
+    """The bits of mathutils.Matrix that labeling.py and the reference use."""
+
+    def __init__(self, m):
+        self.m = np.array(m, dtype=np.float64)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.m if dtype is None else self.m.astype(dtype)
+
+    def normalized(self):
+        m = self.m.copy()
+        m[:3, :3] /= np.linalg.norm(m[:3, :3], axis=0)
+        return Matrix(m)
+
+    def inverted(self):
+        return Matrix(np.linalg.inv(self.m))
+
+
+class CameraData:
+    def __init__(self, type, frame):
+        self.type = type
+        self.frame = [Vec(*corner) for corner in frame]
+
+    def view_frame(self, scene=None):
+        return self.frame
+
+
+class Object:
+    """An unparented object at (0.3, -0.2, 0.5), as spin_world_matrices reads it."""
+    parent = None
+    location = (0.3, -0.2, 0.5)
+    scale = (1.2, 0.8, 1.0)
+
+
+class Camera:
+    def __init__(self, type, frame, matrix_world):
+        self.data = CameraData(type, frame)
+        self.matrix_world = Matrix(matrix_world)
+
+
+def world_to_camera_view(scene, obj, coord):
+    """bpy_extras.object_utils.world_to_camera_view for one point."""
+    co_local = np.array(obj.matrix_world.normalized().inverted()) @ np.append(coord, 1.0)
+    z = -co_local[2]
+    frame = [np.array((v.x, v.y, v.z)) for v in obj.data.view_frame(scene=scene)[:3]]
+    if obj.data.type != 'ORTHO':
+        if z == 0.0:
+            return np.array((0.5, 0.5, 0.0))
+        frame = [-(v / (v[2] / z)) for v in frame]
+    min_x, max_x = frame[2][0], frame[1][0]
+    min_y, max_y = frame[1][1], frame[0][1]
+    x = (co_local[0] - min_x) / (max_x - min_x)
+    y = (co_local[1] - min_y) / (max_y - min_y)
+    return np.array((x, y, z))
+
+
+def rotation(rng):
+    q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    return q * np.sign(np.diag(r))
+
+
+def affine(rot, loc, scale=(1.0, 1.0, 1.0)):
+    m = np.identity(4)
+    m[:3, :3] = rot * np.asarray(scale)
+    m[:3, 3] = loc
+    return m
+
+
+# view_frame corners: top right, bottom right, bottom left, top left. The
+# perspective frame is off center, as with a lens shift.
+PERSP_FRAME = [(0.45, 0.3, -1.2), (0.45, -0.5, -1.2), (-0.35, -0.5, -1.2), (-0.35, 0.3, -1.2)]
+ORTHO_FRAME = [(3.0, 2.0, -1.0), (3.0, -2.0, -1.0), (-3.0, -2.0, -1.0), (-3.0, 2.0, -1.0)]
+
+
+def reference_coords(cam, points, matrix_world):
+    world = points @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    return np.array([world_to_camera_view(None, cam, p) for p in world])
+
+
+@pytest.mark.parametrize('cam_type, frame', [('PERSP', PERSP_FRAME), ('ORTHO', ORTHO_FRAME)])
+def test_project_points_matches_world_to_camera_view(cam_type, frame):
+    rng = np.random.default_rng(0)
+    cam_rot = rotation(rng)
+    cam = Camera(cam_type, frame, affine(cam_rot, (1.0, -2.0, 3.0), scale=(2.0, 2.0, 2.0)))
+    obj_matrix = affine(rotation(rng), (0.5, 0.2, -0.3), scale=(1.5, 0.7, 1.1))
+
+    # Points around the camera, half of them behind it
+    points = rng.uniform(-8, 8, size=(2000, 3))
+    coords = project_points(points, obj_matrix, camera_view_matrix(None, cam))
+    expected = reference_coords(cam, points, obj_matrix)
+
+    assert (expected[:, 2] < 0).any() and (expected[:, 2] > 0).any()
+    np.testing.assert_allclose(coords, expected, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('cam_type, frame', [('PERSP', PERSP_FRAME), ('ORTHO', ORTHO_FRAME)])
+def test_points_on_camera_plane(cam_type, frame):
+    # An axis-aligned camera at z = 5 looking down -Z: points with z = 5 lie
+    # exactly on its plane (w == 0 for perspective)
+    cam = Camera(cam_type, frame, affine(np.identity(3), (0.0, 0.0, 5.0)))
+    points = np.array([(0.0, 0.0, 5.0), (1.0, -2.0, 5.0), (0.3, 0.1, 4.0), (-0.2, 0.4, 6.0)])
+    coords = project_points(points, np.identity(4), camera_view_matrix(None, cam))
+    expected = reference_coords(cam, points, np.identity(4))
+
+    assert np.all(np.isfinite(coords))
+    np.testing.assert_allclose(coords, expected, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('cam_type, frame', [('PERSP', PERSP_FRAME), ('ORTHO', ORTHO_FRAME)])
+def test_boxes_match_per_vertex_boxes(cam_type, frame):
+    rng = np.random.default_rng(1)
+    cam = Camera(cam_type, frame, affine(np.identity(3), (0.0, 0.0, 10.0)))
+    for _ in range(20):
+        # Objects in front of, across and behind the camera, some crossing the frame edge
+        obj_matrix = affine(rotation(rng), rng.uniform((-3, -3, 0), (3, 3, 14)))
+        points = rng.uniform(-2, 2, size=(300, 3))
+        coords = project_points(points, obj_matrix, camera_view_matrix(None, cam))
+        expected = reference_coords(cam, points, obj_matrix)
+        for bounds in (frame_bounds, clipped_bounds):
+            box, expected_box = bounds(coords), bounds(expected)
+            if expected_box is None:
+                assert box is None
+            else:
+                np.testing.assert_allclose(box, expected_box, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('n', [200, BATCH_MAX_POINTS + 1])
+@pytest.mark.parametrize('clipped', [False, True])
+def test_frame_boxes_match_per_frame_bounds(n, clipped):
+    # Both code paths: all frames at once and, above BATCH_MAX_POINTS, one frame at a time
+    rng = np.random.default_rng(2)
+    cam = Camera('PERSP', PERSP_FRAME, affine(np.identity(3), (0.0, 0.0, 4.0)))
+    view_proj = camera_view_matrix(None, cam)
+    # A flat blade spinning about Y: it crosses the frame edge in some frames only
+    points = rng.uniform(-1, 1, size=(n, 3)) * (1.2, 0.2, 0.05)
+    matrices = spin_world_matrices(Object(), 1, np.linspace(0, 2 * np.pi, 24))
+    boxes = frame_boxes(points, matrices, view_proj, clipped=clipped)
+
+    bounds = clipped_bounds if clipped else frame_bounds
+    for box, matrix_world in zip(boxes, matrices):
+        expected = bounds(project_points(points, matrix_world, view_proj))
+        if expected is None:
+            assert np.isnan(box).all()
+        else:
+            np.testing.assert_allclose(box, expected, rtol=0, atol=TOLERANCE)
@@ -0,0 +1,103 @@
+# Runs real worker processes against one queue directory under tmp_path, the
+# way separate nodes share one over NFS.
+
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from work_queue import claim, finished, init_queue, load_plan, simulated_worker, unit_id
+
+VIEWS_PER_UNIT = 2
+
+
+def make_queue(queue_dir, num_units, lease_seconds, max_attempts=3):
+    tasks = [{"blend_file": f"file_{i}.blend", "is_train": i % 5 != 0} for i in range(num_units)]
+    return init_queue(str(queue_dir), tasks, 'blend', VIEWS_PER_UNIT, 42, VIEWS_PER_UNIT,
+                      lease_seconds, max_attempts)
+
+
+def counting_worker(queue_dir, worker, log_path):
+    """Claims units until the queue is finished, appending every finished unit to log_path."""
+    plan = load_plan(queue_dir)
+    while True:
+        lease = claim(queue_dir, worker, plan)
+        if lease is None:
+            if finished(queue_dir):
+                return
+            time.sleep(plan["lease_seconds"] / 4)
+            continue
+        time.sleep(0.002)
+        lease.heartbeat(force=True)
+        lease.finish()
+        fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, f"{lease.uid} {worker}\n".encode())
+        finally:
+            os.close(fd)
+
+
+def run(target, *arg_lists):
+    procs = [multiprocessing.Process(target=target, args=args) for args in arg_lists]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+        assert p.exitcode is not None, "worker did not finish"
+    return [p.exitcode for p in procs]
+
+
+def read_states(queue_dir, state):
+    entries = {}
+    for name in os.listdir(os.path.join(queue_dir, state)):
+        with open(os.path.join(queue_dir, state, name)) as f:
+            entries[name[:-len('.json')]] = json.load(f)
+    return entries
+
+
+def test_every_unit_done_exactly_once(tmp_path):
+    plan = make_queue(tmp_path, 40, lease_seconds=2.0)
+    log_path = str(tmp_path / 'finished.log')
+    exit_codes = run(counting_worker, *[(str(tmp_path), f"w{w}", log_path) for w in range(6)])
+
+    assert exit_codes == [0] * 6
+    with open(log_path) as f:
+        counts = collections.Counter(line.split()[0] for line in f)
+    uids = [unit_id(i) for i in range(len(plan["units"]))]
+    assert sorted(counts) == uids
+    assert set(counts.values()) == {1}
+    done = read_states(tmp_path, 'done')
+    assert sorted(done) == uids
+    assert all(done[uid]["is_train"] == unit["is_train"] for uid, unit in zip(uids, plan["units"]))
+    assert not os.listdir(tmp_path / 'failed')
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    make_queue(tmp_path, 1, lease_seconds=0.5)
+    # Dies holding lease 0 of the only unit, without releasing it
+    assert run(simulated_worker, (str(tmp_path), 'crasher', 0.001, 0)) == [1]
+    assert os.listdir(tmp_path / 'leases') == ['000000.0']
+
+    assert run(simulated_worker, (str(tmp_path), 'rescuer', 0.001, None)) == [0]
+    done = read_states(tmp_path, 'done')
+    assert done['000000']["worker"] == 'rescuer'
+    assert done['000000']["lease"] == 1
+    assert not os.listdir(tmp_path / 'leases')
+
+
+def test_unit_fails_after_max_attempts(tmp_path):
+    make_queue(tmp_path, 1, lease_seconds=0.5, max_attempts=2)
+    # Two workers in a row die holding the unit: the second one waits for the
+    # first lease to expire and takes lease 1, which uses up both attempts
+    assert run(simulated_worker, (str(tmp_path), 'crasher0', 0.001, 0)) == [1]
+    assert run(simulated_worker, (str(tmp_path), 'crasher1', 0.001, 0)) == [1]
+    assert sorted(os.listdir(tmp_path / 'leases')) == ['000000.0', '000000.1']
+
+    assert run(simulated_worker, (str(tmp_path), 'healthy', 0.001, None)) == [0]
+    failed = read_states(tmp_path, 'failed')
+    assert list(failed) == ['000000']
+    assert failed['000000']["error"] == "2 leases expired"
+    assert not os.listdir(tmp_path / 'done')
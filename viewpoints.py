@@ -0,0 +1,141 @@
+# --- VIEWPOINT SAMPLING & SO(3) COVERAGE ---
+# Independent random draws leave clusters of near-duplicate views and holes.
+# The samplers here spread N views evenly instead: an object rotation
+# (a unit quaternion, uniform on SO(3)) plus a camera direction on the
+# sphere band the scripts use.
+#
+#   'random'      independent uniform draws (the scripts' own random.uniform path)
+#   'fibonacci'   super-Fibonacci spiral on SO(3) + Fibonacci sphere for the camera
+#   'stratified'  jittered Latin hypercube over the 5 pose dimensions
+#   'sobol'       Sobol sequence (Joe-Kuo direction numbers), random digital shift
+#
+# CoverageTracker measures how much of the pose space the rendered views
+# cover, so a run can stop once a target is reached.
+
+import math
+
+import numpy as np
+
+SAMPLERS = ('random', 'fibonacci', 'stratified', 'sobol')
+BITS = 32
+
+# Joe & Kuo (2008) new-joe-kuo-6.21201, dimensions 2-6: (degree s, coefficients a, initial m)
+JOE_KUO = [(1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3])]
+
+
+def _direction_numbers(dim):
+    if dim == 0:
+        return [1 << (BITS - 1 - i) for i in range(BITS)]
+    s, a, m = JOE_KUO[dim - 1]
+    v = [m[i] << (BITS - 1 - i) for i in range(s)]
+    for i in range(s, BITS):
+        x = v[i - s] ^ (v[i - s] >> s)
+        for k in range(1, s):
+            x ^= ((a >> (s - 1 - k)) & 1) * v[i - k]
+        v.append(x)
+    return v
+
+
+def sobol_points(n, dims, seed=None):
+    """First n points of the dims-dimensional Sobol sequence in [0, 1)."""
+    if dims > len(JOE_KUO) + 1:
+        raise ValueError(f"sobol_points supports up to {len(JOE_KUO) + 1} dimensions")
+    directions = [_direction_numbers(d) for d in range(dims)]
+    # A random digital shift keeps the net structure while decorrelating objects
+    shift = (np.random.default_rng(seed).integers(0, 1 << BITS, dims, dtype=np.uint64)
+             if seed is not None else np.zeros(dims, dtype=np.uint64))
+    points = np.empty((n, dims), dtype=np.uint64)
+    x = [0] * dims
+    for i in range(n):
+        points[i] = x
+        c = (~i & (i + 1)).bit_length() - 1  # lowest zero bit of i (Gray code order)
+        x = [xd ^ directions[d][c] for d, xd in enumerate(x)]
+    return (points ^ shift).astype(np.float64) / float(1 << BITS)
+
+
+def stratified_points(n, dims, seed=None):
+    """Jittered Latin hypercube: each dimension has exactly one point per 1/n stratum."""
+    rng = np.random.default_rng(seed)
+    strata = np.stack([rng.permutation(n) for _ in range(dims)], axis=1)
+    return (strata + rng.random((n, dims))) / n
+
+
+def quaternions_from_unit(u):
+    """Shoemake's map from [0, 1)^3 to uniform unit quaternions (w, x, y, z)."""
+    u = np.asarray(u, dtype=np.float64)
+    r1, r2 = np.sqrt(1 - u[:, 0]), np.sqrt(u[:, 0])
+    a, b = 2 * np.pi * u[:, 1], 2 * np.pi * u[:, 2]
+    return np.stack([r2 * np.cos(b), r1 * np.sin(a), r1 * np.cos(a), r2 * np.sin(b)], axis=1)
+
+
+def super_fibonacci(n):
+    """Alexa (2022) super-Fibonacci spiral: n well-spread unit quaternions."""
+    phi, psi = math.sqrt(2.0), 1.533751168755204288118041
+    s = np.arange(n) + 0.5
+    t = s / n
+    d = 2 * np.pi * s
+    r, big_r = np.sqrt(t), np.sqrt(1 - t)
+    return np.stack([r * np.sin(d / phi), r * np.cos(d / phi), big_r * np.sin(d / psi), big_r * np.cos(d / psi)], axis=1)
+
+
+def sphere_band(u, phi_range):
+    """Map [0, 1)^2 to (theta, phi) uniformly by area between polar angles phi_range."""
+    u = np.asarray(u, dtype=np.float64)
+    z_hi, z_lo = math.cos(phi_range[0]), math.cos(phi_range[1])
+    phi = np.arccos(z_hi + (z_lo - z_hi) * u[:, 1])
+    return 2 * np.pi * u[:, 0], phi
+
+
+def fibonacci_band(n, phi_range):
+    golden = (math.sqrt(5.0) - 1) / 2
+    i = np.arange(n)
+    return sphere_band(np.stack([(i * golden) % 1.0, (i + 0.5) / n], axis=1), phi_range)
+
+
+def camera_directions(sampler, n, seed, phi_range):
+    """(theta, phi) arrays for n cameras looking at the origin."""
+    if sampler == 'fibonacci':
+        return fibonacci_band(n, phi_range)
+    if sampler == 'stratified':
+        return sphere_band(stratified_points(n, 2, seed), phi_range)
+    if sampler == 'sobol':
+        return sphere_band(sobol_points(n, 2, seed), phi_range)
+    raise ValueError(f"unknown viewpoint sampler {sampler!r}")
+
+
+def view_poses(sampler, n, seed, phi_range):
+    """n (quaternion wxyz, theta, phi) poses: object rotation plus camera direction."""
+    if sampler == 'fibonacci':
+        quats = super_fibonacci(n)
+        theta, phi = fibonacci_band(n, phi_range)
+    elif sampler in ('stratified', 'sobol'):
+        u = stratified_points(n, 5, seed) if sampler == 'stratified' else sobol_points(n, 5, seed)
+        quats = quaternions_from_unit(u[:, :3])
+        theta, phi = sphere_band(u[:, 3:], phi_range)
+    else:
+        raise ValueError(f"unknown viewpoint sampler {sampler!r}")
+    return [(tuple(q), t, p) for q, t, p in zip(quats, theta, phi)]
+
+
+# ---------- COVERAGE ----------
+class CoverageTracker:
+    """Fraction of SO(3) within radius_deg (geodesic) of some view added so far.
+
+    Poses are object rotations relative to the camera, so two views that show
+    the object the same way count once however camera and object got there.
+    """
+
+    def __init__(self, radius_deg=45.0, reference=4096):
+        self.reference = super_fibonacci(reference)
+        self.min_cos = math.cos(math.radians(radius_deg) / 2)
+        self.nearest = np.zeros(reference)  # |<q, p>| to the nearest view; 1 = same rotation
+        self.views = 0
+
+    def add(self, quat):
+        q = np.asarray(quat, dtype=np.float64)
+        self.nearest = np.maximum(self.nearest, np.abs(self.reference @ (q / np.linalg.norm(q))))
+        self.views += 1
+
+    @property
+    def coverage(self):
+        return float((self.nearest >= self.min_cos).mean())
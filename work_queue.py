@@ -0,0 +1,343 @@
+# --- LEASE-BASED WORK QUEUE ON SHARED STORAGE (MULTI-NODE) ---
+# Nodes that share one BLEND_DIR/OUTPUT_DIR (e.g. over NFS) pull (blend file,
+# view range) units from a queue directory, with no server:
+#
+#   plan.json      written once by `init`: the units, their train/val split
+#                  (fixed centrally, from Blender.py --plan) and the lease time
+#   leases/U.G     generation G of unit U's lease, created with O_EXCL so that
+#                  exactly one worker wins it; the holder touches it as a
+#                  heartbeat, and once its mtime is older than lease_seconds
+#                  anyone may take generation G+1. A holder that sees G+1 has
+#                  lost the unit.
+#   done/U.json    written by the holder when the unit is finished
+#   failed/U.json  after an error, or once max_attempts leases have expired
+#
+# Expiry is judged against the shared filesystem's own clock (the mtime of a
+# freshly touched file), so clock skew between nodes does not matter. A unit
+# rendered twice after a lost lease writes the same files again: seeds and
+# output paths only depend on the unit.
+#
+#   blender -b --python Blender.py -- --plan plan.json
+#   python work_queue.py init path/to/queue plan.json --views-per-unit 10
+#   blender -b --python Blender.py -- --queue path/to/queue      # on every node, any number of times
+#   python work_queue.py status path/to/queue
+#   python work_queue.py simulate --workers 8 --units 60 --crash 2   # local check with processes
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+import zlib
+
+LEASE_SECONDS = 600.0
+MAX_ATTEMPTS = 3
+STATES = ['leases', 'done', 'failed', 'clocks']
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def queue_dirs(queue_dir):
+    dirs = {state: os.path.join(queue_dir, state) for state in STATES}
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.partial"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------- PLAN ----------
+def make_units(tasks, views, views_per_unit):
+    """Split every task's views into [view_start, view_stop) ranges, in plan order."""
+    return [{"blend_file": task["blend_file"], "is_train": task["is_train"],
+             "view_start": start, "view_stop": min(start + views_per_unit, views)}
+            for task in tasks for start in range(0, views, views_per_unit)]
+
+
+def init_queue(queue_dir, tasks, blend_dir, views, seed, views_per_unit,
+               lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Write plan.json once; initializing an existing queue with a different plan is an error."""
+    queue_dirs(queue_dir)
+    plan = {"blend_dir": blend_dir, "views": views, "seed": seed, "lease_seconds": lease_seconds,
+            "max_attempts": max_attempts, "units": make_units(tasks, views, views_per_unit)}
+    path = os.path.join(queue_dir, 'plan.json')
+    if os.path.exists(path):
+        if load_plan(queue_dir) != plan:
+            raise FileExistsError(f"{path} already holds a different plan")
+        return plan
+    write_json_atomic(path, plan)
+    return plan
+
+
+def load_plan(queue_dir):
+    with open(os.path.join(queue_dir, 'plan.json')) as f:
+        return json.load(f)
+
+
+def unit_id(index):
+    return f"{index:06d}"
+
+
+# ---------- LEASES ----------
+def server_now(queue_dir, worker):
+    """Current time on the shared filesystem: the mtime of a file just touched there."""
+    path = os.path.join(queue_dir, 'clocks', str(worker))
+    with open(path, 'a'):
+        pass
+    os.utime(path)  # no explicit time, so an NFS server stamps its own
+    return os.stat(path).st_mtime
+
+
+def lease_generations(lease_dir):
+    """{unit_id: highest lease generation} from one listing of leases/."""
+    latest = {}
+    for name in os.listdir(lease_dir):
+        uid, _, gen = name.partition('.')
+        if gen.isdigit():
+            latest[uid] = max(latest.get(uid, -1), int(gen))
+    return latest
+
+
+class Lease:
+    def __init__(self, queue_dir, uid, gen, unit, worker, lease_seconds):
+        self.queue_dir = queue_dir
+        self.uid = uid
+        self.gen = gen
+        self.unit = unit
+        self.worker = worker
+        self.path = os.path.join(queue_dir, 'leases', f"{uid}.{gen}")
+        self.interval = lease_seconds / 4
+        self.beat = time.monotonic()
+
+    def lost(self):
+        return os.path.exists(os.path.join(self.queue_dir, 'leases', f"{self.uid}.{self.gen + 1}"))
+
+    def heartbeat(self, force=False):
+        """Refresh the lease (at most every lease_seconds / 4); raises LeaseLost if it was taken over."""
+        if not force and time.monotonic() - self.beat < self.interval:
+            return
+        if self.lost():
+            raise LeaseLost(f"unit {self.uid} was reclaimed from {self.worker}")
+        os.utime(self.path)
+        self.beat = time.monotonic()
+
+    def finish(self, result=None):
+        write_json_atomic(os.path.join(self.queue_dir, 'done', f"{self.uid}.json"),
+                          dict(self.unit, worker=self.worker, lease=self.gen, result=result))
+        self._release()
+
+    def fail(self, error):
+        write_json_atomic(os.path.join(self.queue_dir, 'failed', f"{self.uid}.json"),
+                          dict(self.unit, worker=self.worker, lease=self.gen, error=error))
+        self._release()
+
+    def _release(self):
+        for gen in range(self.gen + 1):
+            try:
+                os.remove(os.path.join(self.queue_dir, 'leases', f"{self.uid}.{gen}"))
+            except FileNotFoundError:
+                pass
+
+
+def try_lease(queue_dir, uid, gen, worker):
+    path = os.path.join(queue_dir, 'leases', f"{uid}.{gen}")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False  # another worker got this generation first
+    try:
+        os.write(fd, json.dumps({"worker": worker, "host": socket.gethostname(), "pid": os.getpid()}).encode())
+    finally:
+        os.close(fd)
+    return True
+
+
+def claim(queue_dir, worker, plan=None):
+    """Lease the next unit that is neither finished nor held; returns a Lease or None."""
+    plan = plan or load_plan(queue_dir)
+    dirs = queue_dirs(queue_dir)
+    closed = {name[:-len('.json')] for state in ('done', 'failed') for name in os.listdir(dirs[state])}
+    latest = lease_generations(dirs['leases'])
+    lease_seconds = plan["lease_seconds"]
+    now = None
+    units = plan["units"]
+    # Workers start at different points of the plan so they rarely race for the same unit
+    offset = zlib.crc32(str(worker).encode()) % max(len(units), 1)
+    for k in range(len(units)):
+        index = (offset + k) % len(units)
+        uid = unit_id(index)
+        if uid in closed:
+            continue
+        gen = latest.get(uid, -1)
+        if gen >= 0:
+            try:
+                mtime = os.stat(os.path.join(dirs['leases'], f"{uid}.{gen}")).st_mtime
+            except FileNotFoundError:
+                continue  # released just now: finished or failed
+            now = now or server_now(queue_dir, worker)
+            if mtime + lease_seconds > now:
+                continue  # held
+            if gen + 1 >= plan["max_attempts"]:
+                write_json_atomic(os.path.join(dirs['failed'], f"{uid}.json"),
+                                  dict(units[index], error=f"{gen + 1} leases expired"))
+                continue
+        if not try_lease(queue_dir, uid, gen + 1, worker):
+            continue
+        lease = Lease(queue_dir, uid, gen + 1, units[index], worker, lease_seconds)
+        if any(os.path.exists(os.path.join(dirs[state], f"{uid}.json")) for state in ('done', 'failed')):
+            lease._release()  # finished or given up on while this worker was listing
+            continue
+        if gen >= 0:
+            print(f"♻️ Reclaiming unit {uid} (lease {gen} expired)")
+        return lease
+    return None
+
+
+def status(queue_dir):
+    plan = load_plan(queue_dir)
+    dirs = queue_dirs(queue_dir)
+    done = {n[:-len('.json')] for n in os.listdir(dirs['done'])}
+    failed = {n[:-len('.json')] for n in os.listdir(dirs['failed'])} - done
+    latest = lease_generations(dirs['leases'])
+    now = server_now(queue_dir, f"status-{os.getpid()}")
+    counts = {"pending": 0, "leased": 0, "expired": 0, "done": len(done), "failed": len(failed)}
+    for index in range(len(plan["units"])):
+        uid = unit_id(index)
+        if uid in done or uid in failed:
+            continue
+        if uid not in latest:
+            counts["pending"] += 1
+            continue
+        try:
+            mtime = os.stat(os.path.join(dirs['leases'], f"{uid}.{latest[uid]}")).st_mtime
+        except FileNotFoundError:
+            continue
+        counts["leased" if mtime + plan["lease_seconds"] > now else "expired"] += 1
+    return counts
+
+
+def finished(queue_dir):
+    counts = status(queue_dir)
+    return not (counts["pending"] or counts["leased"] or counts["expired"])
+
+
+def retry_failed(queue_dir):
+    """Put failed units back in the queue; returns how many."""
+    dirs = queue_dirs(queue_dir)
+    names = os.listdir(dirs['failed'])
+    latest = lease_generations(dirs['leases'])
+    for name in names:
+        uid = name[:-len('.json')]
+        for gen in range(latest.get(uid, -1) + 1):
+            try:
+                os.remove(os.path.join(dirs['leases'], f"{uid}.{gen}"))
+            except FileNotFoundError:
+                pass
+        os.remove(os.path.join(dirs['failed'], name))
+    return len(names)
+
+
+# ---------- LOCAL SIMULATION ----------
+def simulated_worker(queue_dir, worker, work_seconds, crash_after):
+    """Claims units and 'renders' them by sleeping; with crash_after, dies holding its next lease."""
+    plan = load_plan(queue_dir)
+    finished_units = 0
+    while True:
+        lease = claim(queue_dir, worker, plan)
+        if lease is None:
+            if finished(queue_dir):
+                return
+            time.sleep(plan["lease_seconds"] / 4)
+            continue
+        if crash_after is not None and finished_units >= crash_after:
+            os._exit(1)  # no release, no cleanup: its lease has to expire
+        try:
+            for _ in range(lease.unit["view_stop"] - lease.unit["view_start"]):
+                time.sleep(work_seconds)
+                lease.heartbeat()
+        except LeaseLost as e:
+            print(f"⚠️ {e}")
+            continue
+        lease.finish({"rendered": lease.unit["view_stop"] - lease.unit["view_start"]})
+        finished_units += 1
+
+
+def simulate(num_workers, num_units, crash, lease_seconds, work_seconds, views_per_unit=4):
+    queue_dir = tempfile.mkdtemp(prefix='renderbox-queue-')
+    try:
+        tasks = [{"blend_file": f"sim_{i}.blend", "is_train": i % 5 != 0} for i in range(num_units)]
+        plan = init_queue(queue_dir, tasks, 'sim', views_per_unit * 2, 42, views_per_unit, lease_seconds)
+        start = time.time()
+        procs = [multiprocessing.Process(target=simulated_worker,
+                                         args=(queue_dir, f"sim{w}", work_seconds, 1 if w < crash else None))
+                 for w in range(num_workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+        done = {}
+        for name in os.listdir(os.path.join(queue_dir, 'done')):
+            with open(os.path.join(queue_dir, 'done', name)) as f:
+                done[name[:-len('.json')]] = json.load(f)
+        units = plan["units"]
+        complete = all(unit_id(i) in done for i in range(len(units)))
+        splits = all(done[unit_id(i)]["is_train"] == unit["is_train"]
+                     for i, unit in enumerate(units) if unit_id(i) in done)
+        reclaimed = sum(entry["lease"] > 0 for entry in done.values())
+        print(f"{'✅' if complete and splits else '❌'} {len(done)}/{len(units)} units done by {num_workers} "
+              f"processes in {time.time() - start:.1f}s; {reclaimed} reclaimed after {crash} crashes; "
+              f"splits {'match' if splits else 'DO NOT match'} the plan")
+        return complete and splits
+    finally:
+        shutil.rmtree(queue_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-storage work queue for multi-node rendering.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    init = sub.add_parser('init', help='create a queue from a Blender.py --plan file')
+    init.add_argument('queue_dir')
+    init.add_argument('plan', help='JSON written by Blender.py -- --plan')
+    init.add_argument('--views-per-unit', type=int, default=10)
+    init.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS)
+    init.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    show = sub.add_parser('status', help='count units per state')
+    show.add_argument('queue_dir')
+    retry = sub.add_parser('retry', help='put failed units back in the queue')
+    retry.add_argument('queue_dir')
+    sim = sub.add_parser('simulate', help='run local worker processes against a temporary queue')
+    sim.add_argument('--workers', type=int, default=8)
+    sim.add_argument('--units', type=int, default=60)
+    sim.add_argument('--crash', type=int, default=2, help='workers that die while holding a lease')
+    sim.add_argument('--lease-seconds', type=float, default=1.0)
+    sim.add_argument('--work-seconds', type=float, default=0.02, help='per view')
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        with open(args.plan) as f:
+            source = json.load(f)
+        plan = init_queue(args.queue_dir, source["tasks"], source["blend_dir"], source["views"], source["seed"],
+                          args.views_per_unit, args.lease_seconds, args.max_attempts)
+        print(f"📥 {len(plan['units'])} units from {len(source['tasks'])} files -> {args.queue_dir}")
+    elif args.command == 'status':
+        print(", ".join(f"{state}: {n}" for state, n in status(args.queue_dir).items()))
+    elif args.command == 'retry':
+        print(f"📥 {retry_failed(args.queue_dir)} failed units requeued")
+    else:
+        ok = simulate(args.workers, args.units, args.crash, args.lease_seconds, args.work_seconds)
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()